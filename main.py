@@ -4,7 +4,8 @@ import sys
 
 src_path = Path(__file__).resolve().parent / "src"
 sys.path.append(str(src_path))
-from controler import Controller
+
+from src.cellStatus import ENGINES
 
 def main():
     parser = argparse.ArgumentParser( description = 'One Cell Wonder')
@@ -12,6 +13,16 @@ def main():
     parser.add_argument("-x","--X", help="width",type=int,default=100)
     parser.add_argument("-y","--Y", help="height",type=int,default=100)
     parser.add_argument("--death", help="This tag allow a cell to die.", action='store_true', default=False)
+    parser.add_argument("--engine", help="grid implementation (see ENGINES in src/cellStatus.py)",choices=sorted(ENGINES),default="dense")
+    parser.add_argument("--headless", help="run without the pygame interface (see src/runner.py)", action='store_true', default=False)
+    parser.add_argument("-n","--generations", help="number of generations to run when headless",type=int,default=100)
+    parser.add_argument("--every", help="record statistics every N generations when headless",type=int,default=0)
+    parser.add_argument("--out", help="output folder for headless statistics and snapshots",default=None)
+    parser.add_argument("--trajectory", help="store the history in this trajectory file instead of in memory",default=None)
+    parser.add_argument("--no-snapshots", help="only write statistics when headless", action='store_true', default=False)
+    parser.add_argument("--max-period", help="detect fixed points and cycles up to this period when headless (0: off)",type=int,default=0)
+    parser.add_argument("--stop-on-cycle", help="stop the headless run as soon as a cycle is detected", action='store_true', default=False)
+    parser.add_argument("--telemetry", help="write per-generation phase timings of the headless run to this JSONL file",default=None)
 
     args=parser.parse_args()
 
@@ -34,7 +45,14 @@ def main():
         print(f"Error: The following required file(s) are missing: {', '.join(missing_files)}")
         sys.exit(1)
 
-    c = Controller(args.X,args.Y,initial_file, rules_file)#,args.death)
+    if args.headless:
+        # Imported lazily so the headless path never loads pygame.
+        from runner import run_from_args
+        run_from_args(args)
+        return
+
+    from controler import Controller
+    c = Controller(args.X,args.Y,initial_file, rules_file,engine=args.engine,trajectory=args.trajectory)#,args.death)
 
     
 if __name__ == '__main__':
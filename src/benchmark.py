@@ -0,0 +1,367 @@
+"""
+Benchmarks.
+
+Times generations of the shipped confs and of synthetic grids of varying
+size, occupancy, gene count and rule radius, for each engine; engines that
+step with CellGrid.update_grid are also timed per phase (create_alive_cell,
+propagate_genes). The peak memory allocated while stepping is measured
+with tracemalloc in a separate, shorter pass. The convolution paths of
+utils.adaptive_convolution are timed on their own, together with the path
+the cost model picks. Startup cases time, in new processes, the import of
+src.cellStatus (and, within it, the kernel cache key), building a conf
+grid and its first step, first with an empty kernel cache (everything
+compiled) then with the cache it filled.
+
+Results are saved as JSON, with the commit and library versions, so runs
+can be compared across commits:
+
+    python -m src.benchmark --out before.json
+    python -m src.benchmark --out after.json
+    python -m src.benchmark --compare before.json after.json
+    python -m src.benchmark --only startup --engine dense fused
+
+--numba off runs the same cases in a subprocess with NUMBA_DISABLE_JIT=1,
+i.e. the pure Python / numpy paths: keep those runs small (--quick).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+import src.utils as utils
+from src.parse_cells import Cell
+from src.parse_rules import parse_rule_line
+
+ROOT = Path(__file__).resolve().parent.parent
+
+Case = namedtuple("Case", ["name", "kind", "params", "build"])
+Case.__doc__ = """A benchmark: `build(engine)` returns the grid to step
+(step cases) or a zero-argument callable to time (convolution cases)."""
+
+
+def conf_cases(folders, size):
+    """Step cases of conf folders with rules.txt and initial_cell.txt."""
+    X, Y = size
+    cases = []
+    for folder in folders:
+        folder = Path(folder)
+        rules, initial = folder / "rules.txt", folder / "initial_cell.txt"
+        if not (rules.exists() and initial.exists()):
+            continue
+        cases.append(Case(
+            f"conf/{folder.name}/{X}x{Y}", "conf",
+            {"conf": folder.name, "X": X, "Y": Y},
+            lambda engine, rules=rules, initial=initial: cellStatus.initialise_grid(
+                rules, initial, X, Y, engine=engine),
+        ))
+    return cases
+
+
+def synthetic_rules(G, radius):
+    """
+    Gene g is expressed within `radius` of cells with gene g+1 and two
+    neighbours, and next to cells with gene g+2 but not g; cells are born
+    next to two cells with gene 0 or three with gene 1.
+    """
+    genes_rules = []
+    for g in range(G):
+        genes_rules += parse_rule_line(
+            f"[{(g + 1) % G},n(2)]{radius} || [not({g}),{(g + 2) % G}]1", g)
+    alive_rules = parse_rule_line("[0,n(2)] || [1,n(3)]", -1)
+    return genes_rules, alive_rules
+
+
+def synthetic_cells(X, Y, G, occupancy, seed=0):
+    """Cells alive with probability `occupancy`, each gene with probability 0.3."""
+    rng = np.random.default_rng(seed)
+    alive = np.argwhere(rng.random((X, Y)) < occupancy)
+    return [Cell(int(x), int(y), np.flatnonzero(rng.random(G) < 0.3))
+            for x, y in alive]
+
+
+def synthetic_cases(sizes, occupancies, genes, radii):
+    cases = []
+    for size in sizes:
+        for occupancy in occupancies:
+            for G in genes:
+                for radius in radii:
+                    def build(engine, X=size, occupancy=occupancy, G=G, radius=radius):
+                        genes_rules, alive_rules = synthetic_rules(G, radius)
+                        return cellStatus.get_engine(engine)(
+                            X, X, G, genes_rules, alive_rules,
+                            initial_cells=synthetic_cells(X, X, G, occupancy))
+                    cases.append(Case(
+                        f"synthetic/{size}x{size}/p{occupancy}/g{G}/r{radius}", "synthetic",
+                        {"X": size, "Y": size, "occupancy": occupancy, "G": G, "radius": radius},
+                        build,
+                    ))
+    return cases
+
+
+def convolution_cases(sizes, occupancies, radii, methods=("sparse", "dense", "fft", None)):
+    cases = []
+    for size in sizes:
+        for occupancy in occupancies:
+            for radius in radii:
+                for method in methods:
+                    def build(engine, X=size, occupancy=occupancy, radius=radius, method=method):
+                        matrix = (np.random.default_rng(0).random((X, X)) < occupancy).astype(np.int8)
+                        return lambda: utils.adaptive_convolution(matrix, radius, X, X,
+                                                                  method=method)
+                    cases.append(Case(
+                        f"convolution/{method or 'auto'}/{size}x{size}/p{occupancy}/r{radius}",
+                        "convolution",
+                        {"X": size, "Y": size, "occupancy": occupancy, "radius": radius,
+                         "method": method or "auto",
+                         "chosen": utils.choose_convolution(int(occupancy * size * size),
+                                                            radius, size, size)},
+                        build,
+                    ))
+    return cases
+
+
+# Run in a child process by startup cases: prints the latencies as JSON.
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import src.cellStatus as cellStatus
+imported = time.perf_counter()
+grid = cellStatus.initialise_grid(sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]),
+                                  engine=sys.argv[5])
+built = time.perf_counter()
+grid.update_grid()
+stepped = time.perf_counter()
+# The kernel cache key, computed once by the import: timed again on its own.
+import src.utils as utils
+utils.kernel_cache_dir()
+keyed = time.perf_counter()
+print(json.dumps({"import_seconds": imported - start, "init_seconds": built - imported,
+                  "first_step_seconds": stepped - built, "seconds": stepped - start,
+                  "cache_key_seconds": keyed - stepped}))
+"""
+
+
+def startup_cases(folder, size):
+    """Cold and cached startup of a conf folder, each build(engine) timing one."""
+    folder, (X, Y) = Path(folder), size
+    cases = []
+    for cache in ("cold", "cached"):
+        def build(engine, cache=cache):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = {**os.environ, "NUMBA_CACHE_DIR": tmp}
+                args = [sys.executable, "-c", _STARTUP_SCRIPT, str(folder / "rules.txt"),
+                        str(folder / "initial_cell.txt"), str(X), str(Y), engine]
+                for _ in range(2 if cache == "cached" else 1):
+                    child = subprocess.run(args, cwd=ROOT, env=env, capture_output=True, text=True)
+                    if child.returncode != 0:
+                        raise RuntimeError(child.stderr.strip().splitlines()[-1])
+            return json.loads(child.stdout.splitlines()[-1])
+        cases.append(Case(f"startup/{cache}/{folder.name}/{X}x{Y}", "startup",
+                          {"conf": folder.name, "X": X, "Y": Y, "cache": cache}, build))
+    return cases
+
+
+def grid_phases(grid):
+    """(name, callable) of the phases of one generation of `grid`."""
+    if type(grid).update_grid is cellStatus.CellGrid.update_grid:
+        return [("create_alive_cell", grid.create_alive_cell),
+                ("propagate_genes", grid.propagate_genes)]
+    return [("update_grid", grid.update_grid)]
+
+
+def bench_steps(grid, steps, memory_steps=3):
+    """Steps per second, seconds per step of each phase, and peak bytes allocated."""
+    grid.update_grid()   # compile the kernels
+    phases = grid_phases(grid)
+    times = dict.fromkeys((name for name, _ in phases), 0.0)
+    for _ in range(steps):
+        for name, phase in phases:
+            start = time.perf_counter()
+            phase()
+            times[name] += time.perf_counter() - start
+    total = sum(times.values())
+
+    tracemalloc.start()
+    try:
+        for _ in range(memory_steps):
+            grid.update_grid()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"steps": steps,
+            "steps_per_sec": steps / total if total > 0 else float("inf"),
+            "phases": {name: t / steps for name, t in times.items()},
+            "peak_bytes": peak,
+            "alive": int(np.count_nonzero(grid.cell_status))}
+
+
+def bench_call(function, repeat=3):
+    """Best time of one call, over `repeat` runs of an auto-ranged loop."""
+    function()   # compile
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return {"seconds": min(timer.repeat(repeat=repeat, number=number)) / number}
+
+
+def run_case(case, engine, steps):
+    row = {"name": case.name if case.kind == "convolution" else f"{case.name}/{engine}",
+           "kind": case.kind, "engine": engine, "numba": utils.NUMBA_AVAILABLE,
+           "params": case.params, "error": ""}
+    try:
+        if case.kind == "convolution":
+            row.update(bench_call(case.build(engine)))
+        elif case.kind == "startup":
+            row.update(case.build(engine))
+        else:
+            row.update(bench_steps(case.build(engine), steps))
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        import numba
+        numba_version = numba.__version__
+    except ImportError:
+        numba_version = None
+    import scipy
+    return {"commit": commit, "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "scipy": scipy.__version__, "numba": numba_version,
+            "machine": platform.machine(), "processor": platform.processor(),
+            "cpus": os.cpu_count()}
+
+
+def run(cases, engines, steps, callback=None):
+    rows = []
+    for case in cases:
+        for engine in (engines if case.kind != "convolution" else [None]):
+            row = run_case(case, engine, steps)
+            rows.append(row)
+            if callback is not None:
+                callback(row)
+    return rows
+
+
+def compare(before, after):
+    """(name, numba, before, after) of the timings present in both result sets."""
+    def timings(results):
+        return {(row["name"], row["numba"]): row.get("seconds") or 1 / row["steps_per_sec"]
+                for row in results["results"] if not row["error"]}
+    old, new = timings(before), timings(after)
+    return [(name, numba, old[name, numba], new[name, numba])
+            for name, numba in old if (name, numba) in new]
+
+
+def _size(text):
+    X, Y = text.lower().split("x")
+    return int(X), int(Y)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="One Cell Wonder benchmarks")
+    parser.add_argument("--confs", nargs="*", default=sorted(p for p in (ROOT / "confs").iterdir()),
+                        help="conf folders (default: all of confs/)")
+    parser.add_argument("--size", type=_size, default=(100, 100), help="grid size of the confs, XxY")
+    parser.add_argument("--engine", nargs="+", choices=sorted(cellStatus.ENGINES),
+                        default=["dense", "fused"])
+    parser.add_argument("-n", "--steps", type=int, default=20, help="generations timed per case")
+    parser.add_argument("--synthetic-size", nargs="*", type=int, default=[100, 400])
+    parser.add_argument("--occupancy", nargs="*", type=float, default=[0.01, 0.2])
+    parser.add_argument("--genes", nargs="*", type=int, default=[8, 64])
+    parser.add_argument("--radius", nargs="*", type=int, default=[1, 6])
+    parser.add_argument("--only", nargs="+", choices=["conf", "synthetic", "convolution", "startup"],
+                        default=["conf", "synthetic", "convolution"],
+                        help="kinds of cases; startup (new processes compiling cold) is opt-in")
+    parser.add_argument("--quick", action="store_true",
+                        help="small grids and few steps, e.g. for --numba off")
+    parser.add_argument("--numba", choices=["on", "off", "both"], default="on")
+    parser.add_argument("--out", default="benchmark.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        before, after = (json.loads(Path(path).read_text()) for path in args.compare)
+        for name, numba, old, new in compare(before, after):
+            print(f"{name}{'' if numba else ' (no numba)'}: "
+                  f"{old * 1e3:.3f} ms -> {new * 1e3:.3f} ms ({old / new:.2f}x)")
+        return
+
+    if args.quick:
+        args.size, args.steps = (60, 60), 5
+        args.synthetic_size, args.genes, args.occupancy = [60], [8], [0.05]
+
+    results = []
+    if args.numba in ("off", "both"):
+        results += _run_without_numba(argv if argv is not None else sys.argv[1:])
+    if args.numba in ("on", "both"):
+        cases = []
+        if "conf" in args.only:
+            cases += conf_cases(args.confs, args.size)
+        if "synthetic" in args.only:
+            cases += synthetic_cases(args.synthetic_size, args.occupancy, args.genes, args.radius)
+        if "convolution" in args.only:
+            cases += convolution_cases(args.synthetic_size, args.occupancy, args.radius)
+        if "startup" in args.only:
+            cases += startup_cases(ROOT / "confs" / "firework", args.size)
+
+        def report(row):
+            if row["error"]:
+                status = row["error"]
+            elif row["kind"] == "startup":
+                status = (f"import {row['import_seconds']:.3f}s "
+                          f"(cache key {row['cache_key_seconds'] * 1e3:.2f} ms), "
+                          f"init {row['init_seconds']:.3f}s, "
+                          f"first step {row['first_step_seconds']:.3f}s")
+            elif "seconds" in row:
+                status = f"{row['seconds'] * 1e3:.3f} ms (chosen: {row['params']['chosen']})"
+            else:
+                status = (f"{row['steps_per_sec']:.1f} steps/s, "
+                          f"peak {row['peak_bytes'] / 2**20:.1f} MiB")
+            print(f"{row['name']}{'' if row['numba'] else ' (no numba)'}: {status}")
+
+        results += run(cases, args.engine, args.steps, callback=report)
+
+    Path(args.out).write_text(json.dumps({"meta": metadata(), "results": results}, indent=1))
+    print(f"{len(results)} results written to {args.out}")
+
+
+def _run_without_numba(argv):
+    """Run the same benchmarks in a subprocess with NUMBA_DISABLE_JIT=1."""
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "results.json"
+        child = []
+        skip = False
+        for arg in argv:
+            if skip:
+                skip = False
+            elif arg in ("--numba", "--out"):
+                skip = True
+            elif not arg.startswith(("--numba=", "--out=")):
+                child.append(arg)
+        subprocess.run([sys.executable, "-m", "src.benchmark", *child,
+                        "--numba", "on", "--out", str(out)],
+                       cwd=ROOT, env={**os.environ, "NUMBA_DISABLE_JIT": "1"}, check=True)
+        return json.loads(out.read_text())["results"]
+
+
+if __name__ == "__main__":
+    main()
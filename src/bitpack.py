@@ -0,0 +1,50 @@
+"""
+Bit-packed gene storage.
+
+Genes are packed 64 per uint64 word: gene g lives in word g // 64 at bit
+g % 64, so a grid with G genes is stored as a (W, X, Y) uint64 array with
+W = ceil(G / 64) instead of a (G, X, Y) int8 array. A rule's positive and
+negative genes become one bitmask per word (gene_mask), which
+src/rule_program.py checks with two AND/compare ops per word.
+"""
+import numpy as np
+
+WORD_BITS = 64
+
+
+def n_words(G):
+    return max(1, -(-G // WORD_BITS))
+
+
+def pack_genes(gene_content):
+    """(G, ...) array of 0/1 values -> (W, ...) uint64 words."""
+    G = gene_content.shape[0]
+    W = n_words(G)
+    rest = gene_content.shape[1:]
+    packed = np.packbits(gene_content.astype(bool, copy=False), axis=0,
+                         bitorder="little")
+    as_bytes = np.zeros((W * 8,) + rest, dtype=np.uint8)
+    as_bytes[:packed.shape[0]] = packed
+    as_bytes = np.ascontiguousarray(
+        np.moveaxis(as_bytes.reshape((W, 8) + rest), 1, -1)
+    )
+    return as_bytes.view("<u8")[..., 0].astype(np.uint64, copy=False)
+
+
+def unpack_genes(words, G):
+    """(W, ...) uint64 words -> (G, ...) int8 array of 0/1 values."""
+    W = words.shape[0]
+    rest = words.shape[1:]
+    as_bytes = np.ascontiguousarray(words, dtype="<u8")[..., None].view(np.uint8)
+    as_bytes = np.moveaxis(as_bytes, -1, 1).reshape((W * 8,) + rest)
+    return np.unpackbits(as_bytes, axis=0, count=G,
+                         bitorder="little").astype(np.int8)
+
+
+def gene_mask(genes, W):
+    """Bitmask (W,) uint64 with the bits of `genes` set."""
+    mask = np.zeros(W, dtype=np.uint64)
+    for g in genes:
+        mask[g // WORD_BITS] |= np.uint64(1) << np.uint64(g % WORD_BITS)
+    return mask
+
@@ -0,0 +1,183 @@
+"""
+Machine-specific calibration of the convolution cost model.
+
+utils.adaptive_convolution picks the sparse, dense or FFT path from a
+linear cost model (utils.cost_features): per path, a call cost plus
+seconds per cell scanned, per active cell, per mask tap, per FFT point.
+The default coefficients were fitted on one desktop CPU; calibrate() times
+the three paths here, on grids of several sizes, occupancies and radii,
+and refits the coefficients (non-negative least squares on relative
+errors). The model is saved as JSON, separately with and without numba,
+and loaded by utils on first use:
+
+    python -m src.calibration            # calibrate, save, print crossovers
+
+The file is OCW_COST_MODEL if set, else onecellwonder/convolution-model.json
+in the user cache directory. With OCW_AUTOTUNE=1, a process that finds no
+model calibrates and saves one on first use.
+"""
+import argparse
+import json
+import os
+import platform
+import time
+from pathlib import Path
+
+import numpy as np
+
+import src.utils as utils
+
+VERSION = 1
+SIZES = (64, 200, 600)
+RADII = (1, 3, 6, 10)
+OCCUPANCIES = (0.002, 0.02, 0.1, 0.4)
+
+
+def model_path():
+    path = os.environ.get("OCW_COST_MODEL")
+    if path:
+        return Path(path)
+    return utils.user_cache_dir() / "convolution-model.json"
+
+
+def _key():
+    return "numba" if utils.NUMBA_AVAILABLE else "python"
+
+
+def _time(function, min_time=0.01, repeat=3):
+    """Best time of one call, looping calls that are shorter than min_time."""
+    function()   # compile, warm caches
+    best = float("inf")
+    for _ in range(repeat):
+        number, elapsed = 0, 0.0
+        start = time.perf_counter()
+        while elapsed < min_time:
+            function()
+            number += 1
+            elapsed = time.perf_counter() - start
+        best = min(best, elapsed / number)
+    return best
+
+
+def measure(sizes=SIZES, radii=RADII, occupancies=OCCUPANCIES, seed=0):
+    """(path, n_active, n, X, Y, seconds) timings of the convolution paths."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for size in sizes:
+        for n in radii:
+            for occupancy in occupancies:
+                matrix = (rng.random((size, size)) < occupancy).astype(np.int8)
+                n_active = int(np.count_nonzero(matrix))
+                paths = ["sparse"]
+                if occupancy == occupancies[0]:
+                    paths += ["dense", "fft"]   # their cost does not depend on occupancy
+                for path in paths:
+                    seconds = _time(lambda: utils.adaptive_convolution(matrix, n, size, size,
+                                                                       method=path))
+                    rows.append((path, n_active, n, size, size, seconds))
+    return rows
+
+
+def fit(rows):
+    """Coefficients {path: (...)} of utils.cost_features fitted on timings."""
+    # Imported here: loading a saved model, on every startup, does not need scipy.
+    from scipy.optimize import nnls
+    model = {}
+    for path in ("sparse", "dense", "fft"):
+        A, t = [], []
+        for p, n_active, n, X, Y, seconds in rows:
+            if p == path:
+                A.append(utils.cost_features(n_active, n, X, Y)[path])
+                t.append(seconds)
+        A, t = np.array(A, dtype=np.float64), np.array(t)
+        # Relative errors, so that small and large grids weigh the same.
+        coefficients, _ = nnls(A / t[:, None], np.ones(len(t)))
+        model[path] = tuple(coefficients.tolist())
+    return model
+
+
+def calibrate(sizes=SIZES, radii=RADII, occupancies=OCCUPANCIES):
+    return fit(measure(sizes, radii, occupancies))
+
+
+def load_model(path=None):
+    """The saved model for this numba setting, or None."""
+    path = Path(path) if path is not None else model_path()
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != VERSION:
+        return None
+    model = data.get("models", {}).get(_key())
+    if model is None or set(model) != set(utils.DEFAULT_COST_MODEL):
+        return None
+    return {path: tuple(coefficients) for path, coefficients in model.items()}
+
+
+def save_model(model, path=None):
+    path = Path(path) if path is not None else model_path()
+    try:
+        data = json.loads(path.read_text())
+        if data.get("version") != VERSION:
+            data = {}
+    except (OSError, ValueError):
+        data = {}
+    data.setdefault("models", {})[_key()] = {p: list(c) for p, c in model.items()}
+    data.update(version=VERSION, machine=platform.machine(), processor=platform.processor(),
+                date=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=1))
+    os.replace(tmp, path)
+    return path
+
+
+def startup_model():
+    """Model used by utils: saved one, else calibrated now with OCW_AUTOTUNE=1, else None."""
+    model = load_model()
+    if model is None and os.environ.get("OCW_AUTOTUNE") == "1":
+        model = calibrate()
+        save_model(model)
+    return model
+
+
+def crossover(model, n, X, Y):
+    """Occupancy above which sparse is no longer the cheapest path (1 if never)."""
+    previous = utils.cost_model
+    utils.cost_model = model
+    try:
+        for k in range(1, 1001):
+            n_active = int(k / 1000 * X * Y)
+            if utils.choose_convolution(n_active, n, X, Y) != "sparse":
+                return (k - 1) / 1000
+        return 1.0
+    finally:
+        utils.cost_model = previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the convolution cost model")
+    parser.add_argument("--out", default=None, help=f"model file (default: {model_path()})")
+    parser.add_argument("--show", action="store_true", help="print the saved model, do not calibrate")
+    args = parser.parse_args(argv)
+
+    if args.show:
+        model = load_model(args.out)
+        if model is None:
+            parser.error("no saved model")
+    else:
+        start = time.perf_counter()
+        model = calibrate()
+        path = save_model(model, args.out)
+        print(f"calibrated in {time.perf_counter() - start:.1f}s, saved to {path}")
+    for path, coefficients in model.items():
+        print(f"{path:>6}: " + ", ".join(f"{c:.3g}" for c in coefficients))
+    print("sparse/dense crossover occupancy:")
+    print("radius " + "".join(f"{s:>9}" for s in ("100²", "300²", "1000²")))
+    for n in (1, 2, 4, 7, 10):
+        print(f"{n:>6} " + "".join(f"{crossover(model, n, s, s):>9.3f}" for s in (100, 300, 1000)))
+
+
+if __name__ == "__main__":
+    main()
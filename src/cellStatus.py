@@ -1,9 +1,15 @@
+import importlib
+import time
 import numpy as np
+from collections import namedtuple
 from dataclasses import dataclass
 from src.parse_rules import AndRule
 from src.parse_rules import *
 from src.parse_cells import *
 import src.utils as utils
+import src.bitpack as bitpack
+import src.telemetry as telemetry
+from src.rule_program import compile_rules
 
 
 @dataclass
@@ -13,13 +19,43 @@ class Cell:
     active_genes: np.array
 
 
-def initialise_grid(name_file_rules, name_file_cell, X=20, Y=50, G=100):
+Window = namedtuple("Window", ["x0", "x1", "y0", "y1", "background"])
+Window.__doc__ = """Rows x0:x1 and columns y0:y1 a CellGrid generation computes.
+Every cell outside is dead with the packed gene words `background` (None
+when the window is the whole grid)."""
+
+
+# Alternative grid implementations, imported on demand so that optional
+# backends cost nothing unless they are selected.
+ENGINES = {
+    "dense": None,
+    "packed": ("src.packedGrid", "PackedCellGrid"),
+    "fused": ("src.fused", "FusedCellGrid"),
+    "parallel": ("src.parallel", "ParallelCellGrid"),
+    "incremental": ("src.incremental", "IncrementalCellGrid"),
+    "hashlife": ("src.hashlife", "HashlifeCellGrid"),
+    "chunked": ("src.chunked", "ChunkedCellGrid"),
+}
+
+
+def get_engine(name):
+    """Return the CellGrid class registered under `name` in ENGINES."""
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine '{name}', expected one of {sorted(ENGINES)}")
+    if ENGINES[name] is None:
+        return CellGrid
+    module, cls = ENGINES[name]
+    return getattr(importlib.import_module(module), cls)
+
+
+def initialise_grid(name_file_rules, name_file_cell, X=20, Y=50, G=100,
+                    engine="dense"):
     genes_rules, alive_rules, ngene = read_rules_file(name_file_rules)
     initial_cells = parse_cell_conf(name_file_cell)
-    return CellGrid(X, Y, ngene,
-                    genes_rules=genes_rules,
-                    alive_rules=alive_rules,
-                    initial_cells=initial_cells)
+    return get_engine(engine)(X, Y, ngene,
+                              genes_rules=genes_rules,
+                              alive_rules=alive_rules,
+                              initial_cells=initial_cells)
 
 
 class CellGrid:
@@ -32,11 +68,13 @@ class CellGrid:
         self.genes_rules = genes_rules
         self.alive_rules = alive_rules
 
-        self.cell_status = np.zeros((X, Y), dtype=np.int8)
+        # Rules compiled once: deduplicated conditions checked in one batched
+        # pass, alternatives with the same target and radius share a convolution.
+        self.gene_program = compile_rules(genes_rules, G)
+        self.alive_program = compile_rules(alive_rules, G)
 
-        # gene_content: (G, X, Y) int8 array.
-        # Gene g is at gene_content[g] — a 2D (X, Y) slice.
-        self.gene_content = np.zeros((G, X, Y), dtype=np.int8)
+        self.cell_status = np.zeros((X, Y), dtype=np.int8)
+        self._allocate_genes()
 
         if gene_names is None:
             self.gene_names = [f"gene_{i}" for i in range(G)]
@@ -50,17 +88,74 @@ class CellGrid:
                 x, y = cell.x, cell.y
                 if self._in_bounds(x, y):
                     self.cell_status[x, y] = 1
-                for gene in cell.active_genes:
-                    self.gene_content[gene, x, y] = 1
+                self._seed_genes(cell.active_genes, x, y)
 
         self.propagate_genes()
 
+    def _allocate_genes(self):
+        # gene_content: (G, X, Y) int8 array.
+        # Gene g is at gene_content[g] — a 2D (X, Y) slice.
+        self.gene_content = np.zeros((self.G, self.X, self.Y), dtype=np.int8)
+
+    def _seed_genes(self, genes, x, y):
+        for gene in genes:
+            self.gene_content[gene, x, y] = 1
+
+    def _express(self, gene, extent, window=np.s_[:, :]):
+        self.gene_content[gene][window] |= extent
+
+    def _gene_planes(self):
+        """Gene array compared cell by cell to find the active window."""
+        return self.gene_content
+
+    def _gene_words(self, xs, ys):
+        """Bit-packed genes (W, K) of the cells (xs[k], ys[k])."""
+        return bitpack.pack_genes(self.gene_content[:, xs, ys])
+
     def getCellStatus(self):
         return self.cell_status
 
     def _in_bounds(self, x, y):
         return 0 <= x < self.X and 0 <= y < self.Y
 
+    # ------------------------------------------------------------------
+    # Active window
+    # ------------------------------------------------------------------
+
+    def active_window(self):
+        """
+        Window of the cells that can change or act on others this generation:
+        the bounding box of the cells alive or with other genes than cell
+        (0, 0), grown by the largest propagation radius + 2. The cells
+        outside, alike and out of reach of every rule, evolve alike, so a
+        generation only computes the window and the genes outside.
+        """
+        corner = np.zeros(1, dtype=np.intp)
+        background = self._gene_words(corner, corner)
+        # Background cells being born would fill the grid.
+        if any(True for _ in self.alive_program.evaluate(
+                background, np.zeros(1, dtype=np.int64), np.zeros(1, dtype=bool))):
+            return Window(0, self.X, 0, self.Y, None)
+        planes = self._gene_planes()
+        box = utils.active_box(self.cell_status, planes, planes[:, 0, 0].copy())
+        x0, x1, y0, y1 = box if box is not None else (0, 1, 0, 1)
+        margin = self.gene_program.max_propagation + 2
+        # Even first column, so that columns keep their parity in the window.
+        return Window(max(0, x0 - margin), min(self.X, x1 + margin),
+                      max(0, y0 - margin) & ~1, min(self.Y, y1 + margin),
+                      background[:, 0])
+
+    def _express_outside(self, window):
+        """Give the cells outside the window the genes the background expresses."""
+        if window.background is None:
+            return
+        genes = {group.active_gene for group, _ in self.gene_program.evaluate(
+            window.background[:, None], np.zeros(1, dtype=np.int64), np.zeros(1, dtype=bool))}
+        x0, x1, y0, y1, _ = window
+        for gene in sorted(genes):
+            for strip in (np.s_[:x0, :], np.s_[x1:, :], np.s_[x0:x1, :y0], np.s_[x0:x1, y1:]):
+                self._express(gene, True, strip)
+
     # ------------------------------------------------------------------
     # Convolution — all delegated to utils
     # ------------------------------------------------------------------
@@ -76,12 +171,15 @@ class CellGrid:
 
     def neigboor_mask(self, applicable, n, candidate_coords=None):
         """Boolean mask: True where at least one neighbour within n is nonzero."""
-        neighbors = utils.adaptive_convolution(
-            applicable, n, self.X, self.Y,
-            include_center=True,
-            candidate_coords=candidate_coords
-        )
-        return neighbors.astype(bool)
+        return utils.dilate(applicable, n, include_center=True,
+                            candidate_coords=candidate_coords)
+
+    def source_distance(self, applicable, n, candidate_coords=None):
+        """
+        Hex distance to the nearest source, capped at n + 1. Sources are the
+        nonzero cells of applicable among candidate_coords, as in neigboor_mask.
+        """
+        return utils.hex_distance(applicable, n, candidate_coords=candidate_coords)
 
     def inclusive_neigboor_mask(self, applicable, n, candidate_coords=None):
         """Boolean mask including the source cells themselves."""
@@ -119,70 +217,127 @@ class CellGrid:
     # Gene propagation
     # ------------------------------------------------------------------
 
-    def propagate_genes(self):
-        # Mask neighbour count by cell_status: dead cells report 0 neighbours.
-        neighboor_grid = self.get_neighbors() * self.cell_status
-
-        # expressed_genes: one vectorised reduction over (G, X, Y).
-        expressed_genes = set(np.where(self.gene_content.any(axis=(1, 2)))[0])
-
-        # Computed ONCE — applicable is always a subset of cell_status.
-        alive_coords = np.argwhere(self.cell_status != 0)
-
-        new_genes = np.zeros((self.G, self.X, self.Y), dtype=np.int8)
+    def propagate_genes(self, window=None):
+        with telemetry.phase("propagate_genes"):
+            self._propagate_genes(window if window is not None else self.active_window())
 
-        for rule in self.genes_rules:
-            if len(rule.positive_genes) > 0 and not all(
-                g in expressed_genes for g in rule.positive_genes
-            ):
-                continue
+    def _propagate_genes(self, window):
+        x0, x1, y0, y1, _ = window
+        X, Y = x1 - x0, y1 - y0
+        status = self.cell_status[x0:x1, y0:y1]
 
-            applicable = self.validate_rule(
-                rule.positive_genes, rule.negative_genes,
-                neighboor_grid=neighboor_grid,
-                potential_cell=self.cell_status,
-                n_neighboor=rule.n_neighboor
-            )
-
-            extent = self.inclusive_neigboor_mask(
-                applicable.astype(np.int8), rule.propagation,
-                candidate_coords=alive_coords
-            )
-
-            new_genes[rule.active_gene] |= extent
-
-        self.gene_content = new_genes
+        # Mask neighbour count by cell_status: dead cells report 0 neighbours.
+        with telemetry.phase("neighbours"):
+            neighboor_grid = utils.adaptive_convolution(
+                status, 1, X, Y, include_center=False) * status
+
+        # Computed ONCE — sources are always taken among alive cells.
+        with telemetry.phase("argwhere"):
+            alive_coords = np.argwhere(status != 0)
+
+        # Rules are only evaluated where they can apply: alive cells, plus
+        # dead cells when a rule asks for n(0).
+        with telemetry.phase("match"):
+            if self.gene_program.needs_isolated:
+                xs, ys = np.indices((X, Y)).reshape(2, -1)
+            else:
+                xs, ys = alive_coords[:, 0], alive_coords[:, 1]
+            hits = list(self.gene_program.evaluate(
+                self._gene_words(xs + x0, ys + y0),
+                neighboor_grid[xs, ys],
+                status[xs, ys]
+            ))
+
+        self._allocate_genes()
+        self._express_outside(window)
+
+        # Groups hitting the same cells share one dilation, or with several
+        # radii one distance field thresholded at each group's radius.
+        by_sources = {}
+        for group, hit in hits:
+            by_sources.setdefault(hit.tobytes(), (hit, []))[1].append(group)
+
+        recording = telemetry.recorder is not None
+        for hit, groups in by_sources.values():
+            if recording:
+                start = time.perf_counter()
+            with telemetry.phase("distance"):
+                if self.gene_program.needs_isolated:
+                    # Every cell was evaluated, in row-major order.
+                    applicable = hit.reshape(X, Y).view(np.int8)
+                else:
+                    applicable = np.zeros((X, Y), dtype=np.int8)
+                    applicable[xs[hit], ys[hit]] = 1
+
+                radius = max(group.propagation for group in groups)
+                if all(group.propagation == radius for group in groups):
+                    # One radius: stamp the masks. Dead sources are not in
+                    # alive_coords, they only mark themselves.
+                    reach = self.inclusive_neigboor_mask(applicable, radius,
+                                                         candidate_coords=alive_coords)
+                else:
+                    reach = None
+                    distance = self.source_distance(applicable, radius,
+                                                    candidate_coords=alive_coords)
+                    if self.gene_program.needs_isolated:
+                        distance[applicable.view(bool)] = 0
+            if recording:
+                distance_seconds = time.perf_counter() - start
+            for group in groups:
+                if recording:
+                    start = time.perf_counter()
+                with telemetry.phase("express"):
+                    extent = reach if reach is not None else distance <= group.propagation
+                    self._express(group.active_gene, extent, np.s_[x0:x1, y0:y1])
+                if recording:
+                    telemetry.rule(gene=int(group.active_gene), radius=int(group.propagation),
+                                   sources=int(np.count_nonzero(hit)),
+                                   distance_seconds=distance_seconds,
+                                   express_seconds=time.perf_counter() - start)
 
     # ------------------------------------------------------------------
     # Cell creation
     # ------------------------------------------------------------------
 
-    def create_alive_cell(self):
+    def create_alive_cell(self, window=None):
         if len(self.alive_rules) == 0:
             return
-
-        neighboor_grid = self.get_neighbors()
-        potential_cell = self.inclusive_neigboor_mask(self.cell_status.copy(), 1)
-
-        rule = self.alive_rules[0]
-        new_alive = self.validate_rule(
-            rule.positive_genes, rule.negative_genes,
-            neighboor_grid=neighboor_grid,
-            potential_cell=potential_cell,
-            n_neighboor=rule.n_neighboor
-        )
-
-        for rule in self.alive_rules[1:]:
-            new_alive |= self.validate_rule(
-                rule.positive_genes, rule.negative_genes,
-                neighboor_grid=neighboor_grid,
-                potential_cell=potential_cell,
-                n_neighboor=rule.n_neighboor
-            )
-
-        new_alive = new_alive & ~self.cell_status.astype(bool)
-        self.cell_status = (self.cell_status | new_alive).astype(np.int8)
-
+        with telemetry.phase("create_alive_cell"):
+            self._create_alive_cell(window if window is not None else self.active_window())
+
+    def _create_alive_cell(self, window):
+        x0, x1, y0, y1, _ = window
+        status = self.cell_status[x0:x1, y0:y1]
+        with telemetry.phase("neighbours"):
+            neighboor_grid = utils.adaptive_convolution(
+                status, 1, x1 - x0, y1 - y0, include_center=False)
+        dead = status == 0
+
+        # Only dead cells can be born. Without an n(0) rule they must also
+        # touch an alive cell (potential cell), i.e. have a neighbour.
+        with telemetry.phase("candidates"):
+            if self.alive_program.needs_isolated:
+                xs, ys = np.nonzero(dead)
+            else:
+                xs, ys = np.nonzero(dead & (neighboor_grid > 0))
+        neighbours = neighboor_grid[xs, ys]
+        xs, ys = xs + x0, ys + y0
+
+        with telemetry.phase("match"):
+            born = np.zeros(len(xs), dtype=bool)
+            for _, hit in self.alive_program.evaluate(
+                    self._gene_words(xs, ys), neighbours, neighbours > 0):
+                born |= hit
+
+        self.cell_status = self.cell_status.copy()
+        self.cell_status[xs[born], ys[born]] = 1
+        telemetry.count("births", int(np.count_nonzero(born)))
+
+    @telemetry.instrumented
     def update_grid(self):
-        self.create_alive_cell()
-        self.propagate_genes()
\ No newline at end of file
+        # Births stay within one cell of the alive cells, well inside the
+        # window, so both phases use the window of the current generation.
+        with telemetry.phase("window"):
+            window = self.active_window()
+        self.create_alive_cell(window)
+        self.propagate_genes(window)
@@ -0,0 +1,334 @@
+"""
+Unbounded chunked engine.
+
+ChunkedCellGrid has no borders: the world is a hash map from chunk
+coordinates (cx, cy) to C x C chunks of cells (x, y) = (cx * C + i,
+cy * C + j), each one (G + 1, C, C) int8 array holding cell_status then the
+genes. Only chunks holding an alive cell or a gene are stored; chunks are
+allocated as colonies grow into them and freed when they empty.
+
+A generation runs the fused kernels (src/fused.py) chunk by chunk, on the
+chunk padded with a halo gathered from its eight neighbours, in two phases
+so that every chunk sees the same global state:
+
+- births, on the chunks around alive cells, with a halo of 2 cells;
+- gene propagation, on the chunks around the new alive cells, with a halo
+  of R + 1 cells (R the largest propagation radius), rounded up to even.
+
+C and the halos are even, so the column parity of the hex layout is the
+same in chunks, padded blocks and the world. Cells outside the stored
+chunks are all in the same background state, zero at first, which evolves
+like an infinite uniform world: with a rule such as [n(0)]1 every empty
+cell gets gene 1. A chunk is stored when it differs from the background.
+
+X and Y only set the window, cells 0 <= x < X, 0 <= y < Y, that
+cell_status and gene_content show (and that the viewer, trajectories and
+statistics see); `region()` reads any other part of the world and
+`bounds()` tells where it is. The window arrays are rebuilt after each
+step; assign them, or call `reset()` after editing them in place.
+"""
+import numpy as np
+
+from src.cellStatus import CellGrid
+from src.fused import (_count_rows, _birth_rows, _propagate_rows,
+                       _condition_arrays, _group_arrays, check_rule_genes)
+from src.utils import makeMask_int8
+import src.telemetry as telemetry
+
+NEIGHBOURS = [(di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1)]
+
+
+def _even(n):
+    return n + n % 2
+
+
+class ChunkedCellGrid(CellGrid):
+    """
+    CellGrid over an unbounded world of chunks allocated on demand.
+
+    chunk_size : side of the chunks, even (raised to the propagation halo
+                 if smaller).
+    """
+
+    def __init__(self, X, Y, G, genes_rules, alive_rules,
+                 initial_cells=None, gene_names=None, chunk_size=64):
+        check_rule_genes(list(genes_rules) + list(alive_rules), G)
+        if chunk_size < 2 or chunk_size % 2:
+            raise ValueError("chunk_size must be even, at least 2")
+        self._chunks = {}
+        self._background = np.zeros(G + 1, dtype=np.int8)   # status, genes
+        self.chunk_size = chunk_size
+        self._window = None
+        self._dirty = False
+        self._ready = False
+        # The base class sets up the rules and an empty window.
+        super().__init__(X, Y, G, genes_rules, alive_rules, gene_names=gene_names)
+        self._window, self._dirty = None, False
+
+        self._a_pos, self._a_neg, self._a_n = _condition_arrays(self.alive_program)
+        self._g_pos, self._g_neg, self._g_n = _condition_arrays(self.gene_program)
+        (self._g_start, self._g_conds, self._g_gene,
+         self._g_radius, self._masks, self._center) = _group_arrays(self.gene_program)
+        self._nb_masks = np.stack([makeMask_int8(False, 1, include_center=False),
+                                   makeMask_int8(True, 1, include_center=False)]
+                                  ).astype(np.int32)
+        self._ok = np.zeros(max(1, len(self.gene_program)), dtype=np.bool_)
+
+        self.birth_halo = 2
+        self.gene_halo = _even(self.gene_program.max_propagation + 1)
+        self.chunk_size = C = max(chunk_size, self.gene_halo)
+        self._buffers = {h: (np.zeros((G + 1, C + 2 * h, C + 2 * h), dtype=np.int8),
+                             np.zeros((C + 2 * h, C + 2 * h), dtype=np.int8),
+                             np.zeros((G, C + 2 * h, C + 2 * h), dtype=np.int8),
+                             np.zeros((C + 2 * h, C + 2 * h), dtype=np.int32))
+                         for h in (self.birth_halo, self.gene_halo)}
+        self._ready = True
+
+        if initial_cells is not None:
+            for cell in initial_cells:
+                channels = self._chunk_for(cell.x, cell.y)
+                i, j = cell.x % C, cell.y % C
+                channels[0, i, j] = 1
+                for gene in cell.active_genes:
+                    channels[1 + gene, i, j] = 1
+        self.propagate_genes()
+
+    # ------------------------------------------------------------------
+    # Window views of the world
+    # ------------------------------------------------------------------
+
+    @property
+    def cell_status(self):
+        if self._window is None:
+            self._window = self.region(0, 0, self.X, self.Y)
+        return self._window[0]
+
+    @cell_status.setter
+    def cell_status(self, value):
+        self._set_window(cell_status=value)
+
+    @property
+    def gene_content(self):
+        if self._window is None:
+            self._window = self.region(0, 0, self.X, self.Y)
+        return self._window[1]
+
+    @gene_content.setter
+    def gene_content(self, value):
+        self._set_window(gene_content=value)
+
+    def _set_window(self, cell_status=None, gene_content=None):
+        status = self.cell_status if cell_status is None else cell_status
+        genes = self.gene_content if gene_content is None else gene_content
+        self._window = (status, genes)
+        self._dirty = True
+
+    def reset(self):
+        """Write the window arrays, edited in place, back into the world."""
+        self._dirty = True
+        self._flush()
+
+    def _flush(self):
+        if not self._dirty:
+            return
+        status, genes = self._window
+        self._write(0, 0, np.asarray(status, dtype=np.int8), np.asarray(genes, dtype=np.int8))
+        self._dirty = False
+
+    # ------------------------------------------------------------------
+    # Chunks
+    # ------------------------------------------------------------------
+
+    @property
+    def n_chunks(self):
+        self._flush()
+        return len(self._chunks)
+
+    def _chunk_for(self, x, y):
+        C = self.chunk_size
+        key = (x // C, y // C)
+        channels = self._chunks.get(key)
+        if channels is None:
+            channels = np.empty((self.G + 1, C, C), dtype=np.int8)
+            channels[:] = self._background[:, None, None]
+            self._chunks[key] = channels
+        return channels
+
+    def _is_background(self, cells, channels=slice(None)):
+        background = self._background[channels]
+        if np.ndim(background):
+            background = background[:, None, None]
+        return bool((cells == background).all())
+
+    def _spans(self, x0, x1, C):
+        """(chunk index, slice in chunk, slice in [x0, x1)) covering x0:x1."""
+        spans = []
+        for c in range(x0 // C, -(-x1 // C)):
+            lo, hi = max(x0, c * C), min(x1, (c + 1) * C)
+            spans.append((c, slice(lo - c * C, hi - c * C), slice(lo - x0, hi - x0)))
+        return spans
+
+    def region(self, x0, y0, x1, y1):
+        """(cell_status, gene_content) of the cells x0 <= x < x1, y0 <= y < y1."""
+        self._flush()
+        status = np.full((x1 - x0, y1 - y0), self._background[0], dtype=np.int8)
+        genes = np.empty((self.G, x1 - x0, y1 - y0), dtype=np.int8)
+        genes[:] = self._background[1:, None, None]
+        C = self.chunk_size
+        for cx, ci, ri in self._spans(x0, x1, C):
+            for cy, cj, rj in self._spans(y0, y1, C):
+                channels = self._chunks.get((cx, cy))
+                if channels is not None:
+                    status[ri, rj] = channels[0, ci, cj]
+                    genes[:, ri, rj] = channels[1:, ci, cj]
+        return status, genes
+
+    def _write(self, x0, y0, status, genes):
+        C = self.chunk_size
+        X, Y = status.shape
+        for cx, ci, ri in self._spans(x0, x0 + X, C):
+            for cy, cj, rj in self._spans(y0, y0 + Y, C):
+                channels = self._chunks.get((cx, cy))
+                if channels is None:
+                    if (self._is_background(status[ri, rj], 0)
+                            and self._is_background(genes[:, ri, rj], slice(1, None))):
+                        continue
+                    channels = self._chunk_for(cx * C, cy * C)
+                channels[0, ci, cj] = status[ri, rj]
+                channels[1:, ci, cj] = genes[:, ri, rj]
+                if self._is_background(channels):
+                    del self._chunks[(cx, cy)]
+
+    def bounds(self):
+        """(x0, y0, x1, y1) of the stored chunks, None if there are none."""
+        self._flush()
+        if not self._chunks:
+            return None
+        keys = np.array(list(self._chunks))
+        C = self.chunk_size
+        (cx0, cy0), (cx1, cy1) = keys.min(axis=0), keys.max(axis=0) + 1
+        return int(cx0 * C), int(cy0 * C), int(cx1 * C), int(cy1 * C)
+
+    @property
+    def background(self):
+        """(cell_status, genes) of every cell outside the stored chunks."""
+        return int(self._background[0]), self._background[1:].copy()
+
+    def world_key(self):
+        """Bytes identifying the whole world, window included."""
+        self._flush()
+        keys = sorted(self._chunks)
+        return b"".join([self._background.tobytes(), np.array(keys, dtype=np.int64).tobytes()]
+                        + [self._chunks[key].tobytes() for key in keys])
+
+    def _gather(self, chunks, key, h, fill, out):
+        """
+        Chunk `key` of `chunks` padded with h cells of its neighbours, missing
+        chunks being uniformly `fill`.
+        """
+        C = self.chunk_size
+        cx, cy = key
+        parts = {-1: (slice(C - h, C), slice(0, h)),
+                 0: (slice(0, C), slice(h, h + C)),
+                 1: (slice(0, h), slice(h + C, C + 2 * h))}
+        out[:] = fill[:, None, None]
+        for di, dj in NEIGHBOURS:
+            channels = chunks.get((cx + di, cy + dj))
+            if channels is not None:
+                (si, oi), (sj, oj) = parts[di], parts[dj]
+                out[:, oi, oj] = channels[:, si, sj]
+        return out
+
+    @staticmethod
+    def _around(keys):
+        return {(cx + di, cy + dj) for cx, cy in keys for di, dj in NEIGHBOURS}
+
+    # ------------------------------------------------------------------
+    # Evolution
+    # ------------------------------------------------------------------
+
+    def _birth_chunk(self, chunks, key, fill):
+        """New cell_status of a chunk (a view of a reused buffer)."""
+        h, C = self.birth_halo, self.chunk_size
+        block, new_status, _, nb = self._buffers[h]
+        self._gather(chunks, key, h, fill, block)
+        _count_rows(block[0], nb, self._nb_masks, h, h + C)
+        _birth_rows(block[0], block[1:], nb, new_status,
+                    self._a_pos, self._a_neg, self._a_n,
+                    self.alive_program.needs_isolated, h, h + C)
+        return new_status[h:h + C, h:h + C]
+
+    def _gene_chunk(self, chunks, key, fill, n_alive):
+        """Channels of a chunk with the genes propagated from `chunks`."""
+        h, C, R = self.gene_halo, self.chunk_size, self._center
+        block, _, new_genes, nb = self._buffers[h]
+        self._gather(chunks, key, h, fill, block)
+        _count_rows(block[0], nb, self._nb_masks, h - R, h + C + R)
+        _propagate_rows(block[0], block[1:], nb, new_genes, self._ok, n_alive,
+                        self._g_pos, self._g_neg, self._g_n,
+                        self.gene_program.needs_isolated,
+                        self._g_start, self._g_conds, self._g_gene,
+                        self._g_radius, self._masks, R, h, h + C)
+        channels = np.empty((self.G + 1, C, C), dtype=np.int8)
+        channels[0] = block[0, h:h + C, h:h + C]
+        channels[1:] = new_genes[:, h:h + C, h:h + C]
+        return channels
+
+    def _births(self):
+        """
+        New cell_status of the chunks that can differ from the background,
+        the new background status and the alive count (1 for infinitely many).
+        """
+        background = self._birth_chunk({}, (0, 0), self._background)[0, 0]
+        statuses, n_alive = {}, 0
+        # Births only read neighbours: only chunks next to stored ones can change.
+        for key in self._around(self._chunks):
+            status = self._birth_chunk(self._chunks, key, self._background)
+            if not (status == background).all():
+                statuses[key] = status.copy()
+                n_alive += int(np.count_nonzero(status))
+        return statuses, background, 1 if background else n_alive
+
+    def _propagate(self, statuses, background, n_alive):
+        """Replace the world by the statuses, with the genes they propagate."""
+        # New statuses with the current genes.
+        C = self.chunk_size
+        fill = self._background.copy()
+        fill[0] = background
+        sources = {}
+        for key in set(self._chunks) | set(statuses):
+            channels = np.empty((self.G + 1, C, C), dtype=np.int8)
+            channels[0] = statuses.get(key, background)
+            if key in self._chunks:
+                channels[1:] = self._chunks[key][1:]
+            else:
+                channels[1:] = fill[1:, None, None]
+            sources[key] = channels
+
+        self._background = self._gene_chunk({}, (0, 0), fill, n_alive)[:, 0, 0].copy()
+        world = {}
+        for key in self._around(sources):
+            channels = self._gene_chunk(sources, key, fill, n_alive)
+            if not self._is_background(channels):
+                world[key] = channels
+        self._chunks = world
+        self._window = None
+
+    def propagate_genes(self):
+        if not self._ready:
+            return
+        self._flush()
+        with telemetry.phase("propagate_genes"):
+            background = self._background[0]
+            statuses = {key: channels[0].copy() for key, channels in self._chunks.items()}
+            n_alive = 1 if background else sum(int(np.count_nonzero(s)) for s in statuses.values())
+            self._propagate(statuses, background, n_alive)
+
+    @telemetry.instrumented
+    def update_grid(self):
+        self._flush()
+        with telemetry.phase("births"):
+            statuses, background, n_alive = self._births()
+        with telemetry.phase("propagate_genes"):
+            self._propagate(statuses, background, n_alive)
+        telemetry.count("chunks", len(self._chunks))
@@ -1,14 +1,20 @@
-import cellStatus
+import src.cellStatus as cellStatus
 import numpy as np
 import interface
+from src.trajectory import TrajectoryHistory
 
 class Controller:
-    def __init__(self,x:int,y:int,configFile:str,rulesFile:str):
+    def __init__(self,x:int,y:int,configFile:str,rulesFile:str,engine:str="dense",trajectory:str=None):
         self.shape = (x,y)
         self.configFile = configFile
         self.rulesFile = rulesFile
         self.show = -1
-        self.cellGrid = cellStatus.initialise_grid(self.rulesFile,self.configFile,x,y)
+        self.engine = engine
+        self.cellGrid = cellStatus.initialise_grid(self.rulesFile,self.configFile,x,y,engine=engine)
+        self.history = None
+        if trajectory is not None:
+            g = self.cellGrid
+            self.history = TrajectoryHistory(trajectory,g.X,g.Y,g.G)
         self.interfce = interface.Interface((800,800),self)
     
     def update(self):
@@ -18,9 +24,9 @@ class Controller:
         if self.show == -1:
             return self.cellGrid.getCellStatus().astype(int)
         if self.show == 0:
-            return (self.cellGrid.gene_content[:,:,1]).astype(int)
+            return (self.cellGrid.gene_content[1]).astype(int)
         if self.show == 1:
-            return (self.cellGrid.gene_content[:,:,2]).astype(int)
+            return (self.cellGrid.gene_content[2]).astype(int)
 
 if __name__ == "__main__":
     c = Controller(100,100,"../confs/periodic/exempleCellConfig.txt","../confs/periodic/rules.txt")
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Fixed point and cycle detection.
+
+The dynamics are deterministic: once a generation repeats an earlier one,
+the run is periodic from there on. CycleDetector hashes the bit-packed state
+(cell_status then gene_content, as in src/trajectory.py) of each generation
+and keeps the states of the last `max_period` generations, so it finds any
+cycle of period <= max_period at the first generation that closes it.
+A hash match is confirmed by comparing the packed states, so collisions
+cannot report a false cycle.
+
+Once a cycle is found, the state of any later generation is known without
+stepping the grid (`state_at`), which lets runs stop early.
+"""
+import hashlib
+from collections import deque, namedtuple
+
+import numpy as np
+
+from src.trajectory import pack_state, unpack_state
+
+Cycle = namedtuple("Cycle", ["start", "period"])
+Cycle.__doc__ = """Generations start, start + period, ... are equal; start is
+the transient length, period 1 is a fixed point."""
+
+
+def state_digest(packed):
+    return hashlib.blake2b(packed.tobytes(), digest_size=16).digest()
+
+
+def _same(a, b):
+    if isinstance(a, tuple) != isinstance(b, tuple):
+        return False
+    if isinstance(a, tuple):
+        return all(x.shape == y.shape and (x == y).all() for x, y in zip(a, b))
+    return bool((a == b).all())
+
+
+class CycleDetector:
+    """
+    Feed it every generation in order, starting with generation 0:
+
+        detector = CycleDetector(max_period=16)
+        detector.observe_grid(grid)
+        while detector.cycle is None:
+            grid.update_grid()
+            detector.observe_grid(grid)
+    """
+
+    def __init__(self, max_period=16):
+        if max_period < 1:
+            raise ValueError("max_period must be at least 1")
+        self.max_period = max_period
+        self.generation = -1
+        self.cycle = None
+        self._shape = None
+        self._recent = deque()   # (generation, digest, packed), oldest first
+        self._seen = {}          # digest -> latest generation in _recent
+
+    def observe(self, cell_status, gene_content, world=b""):
+        """
+        Record the next generation; returns the Cycle once one is found.
+        `world` identifies any state beyond the arrays (see observe_grid).
+        """
+        if self.cycle is not None:
+            self.generation += 1
+            return self.cycle
+        G, X, Y = gene_content.shape
+        self._shape = (X, Y, G)
+        self.generation += 1
+        packed = pack_state(cell_status, gene_content)
+        if world:
+            packed = (packed, np.frombuffer(world, dtype=np.uint8))
+            digest = state_digest(np.concatenate(packed))
+        else:
+            digest = state_digest(packed)
+
+        previous = self._seen.get(digest)
+        if previous is not None:
+            _, _, previous_packed = self._recent[previous - self._recent[0][0]]
+            if _same(previous_packed, packed):
+                self.cycle = Cycle(previous, self.generation - previous)
+                # Keep one period of states for state_at.
+                while self._recent[0][0] < previous:
+                    self._recent.popleft()
+                return self.cycle
+
+        self._recent.append((self.generation, digest, packed))
+        self._seen[digest] = self.generation
+        if len(self._recent) > self.max_period:
+            old_generation, old_digest, _ = self._recent.popleft()
+            if self._seen.get(old_digest) == old_generation:
+                del self._seen[old_digest]
+        return None
+
+    def observe_grid(self, grid):
+        """Observe a grid; unbounded grids (world_key) are compared as a whole."""
+        world = grid.world_key() if hasattr(grid, "world_key") else b""
+        return self.observe(grid.cell_status, grid.gene_content, world)
+
+    def state_at(self, generation):
+        """(cell_status, gene_content) of any generation >= cycle.start."""
+        if self.cycle is None:
+            raise ValueError("no cycle detected yet")
+        start, period = self.cycle
+        if generation < start:
+            raise ValueError(f"generation {generation} is before the cycle (start {start})")
+        _, _, packed = self._recent[(generation - start) % period]
+        if isinstance(packed, tuple):
+            packed = packed[0]
+        return unpack_state(packed, *self._shape)
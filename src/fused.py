@@ -0,0 +1,278 @@
+"""
+Fused step engine.
+
+FusedCellGrid runs a whole generation (neighbour counting, cell birth and
+gene propagation) in one compiled call, stamping hex masks from each source
+cell the same way `utils._sparse_kernel` scatters them. All arrays are
+allocated once: cell_status and gene_content alternate between two buffers,
+so callers that keep a generation around must copy it.
+
+Propagation marks cells with an OR, as CellGrid's dilations and distance
+fields do, so the results are the same at any radius.
+"""
+import numpy as np
+
+from src.cellStatus import CellGrid
+from src.utils import njit, makeMask_int8
+import src.bitpack as bitpack
+import src.telemetry as telemetry
+
+
+# ---------------------------------------------------------------------------
+# Compiled kernels
+#
+# A generation is three phases, each restricted to the rows x0:x1 it writes
+# so that row tiles can run them concurrently (see src/parallel.py). Inside
+# a phase everything is written inline: calling a helper or taking a view of
+# an array costs a refcount round-trip, which dominates when every cell of
+# the grid is visited.
+# ---------------------------------------------------------------------------
+
+@njit(nogil=True)
+def _count_rows(status, nb, nb_masks, x0, x1):
+    """Alive neighbour counts of rows x0:x1, from sources in rows x0-1:x1+1."""
+    X = status.shape[0]
+    Y = status.shape[1]
+    nb[x0:x1, :] = 0
+    for x in range(max(0, x0 - 1), min(X, x1 + 1)):
+        for y in range(Y):
+            if status[x, y] == 0:
+                continue
+            p = y % 2
+            for i in range(-1, 2):
+                xi = x + i
+                if xi < x0 or xi >= x1:
+                    continue
+                for j in range(-1, 2):
+                    yj = y + j
+                    if 0 <= yj < Y:
+                        nb[xi, yj] += nb_masks[p, 1 + i, 1 + j]
+
+
+@njit(nogil=True)
+def _birth_rows(status, genes, nb, new_status, a_pos, a_neg, a_n, a_isolated,
+                x0, x1):
+    """Birth in rows x0:x1 from the current genes. Returns the alive count."""
+    Y = status.shape[1]
+    n_alive = 0
+    for x in range(x0, x1):
+        for y in range(Y):
+            new_status[x, y] = status[x, y]
+            if status[x, y] != 0:
+                n_alive += 1
+                continue
+            potential = nb[x, y] > 0
+            if not potential and not a_isolated:
+                continue
+            for c in range(a_n.shape[0]):
+                ok_c = True
+                for m in range(a_pos.shape[1]):
+                    g = a_pos[c, m]
+                    if g < 0:
+                        break
+                    if genes[g, x, y] == 0:
+                        ok_c = False
+                        break
+                if ok_c:
+                    for m in range(a_neg.shape[1]):
+                        g = a_neg[c, m]
+                        if g < 0:
+                            break
+                        if genes[g, x, y] != 0:
+                            ok_c = False
+                            break
+                if ok_c:
+                    ok_c = nb[x, y] == a_n[c] if a_n[c] >= 0 else potential
+                if ok_c:
+                    new_status[x, y] = 1
+                    n_alive += 1
+                    break
+    return n_alive
+
+
+@njit(nogil=True)
+def _propagate_rows(new_status, genes, nb, new_genes, ok, n_alive,
+                    g_pos, g_neg, g_n, g_isolated,
+                    g_start, g_conds, g_gene, g_radius, masks, center, x0, x1):
+    """
+    Genes of rows x0:x1. Sources are read from rows x0-R:x1+R (R the largest
+    radius), so nb must hold the counts of the new status on those rows.
+    """
+    X = new_status.shape[0]
+    Y = new_status.shape[1]
+    new_genes[:, x0:x1, :] = 0
+    for x in range(max(0, x0 - center), min(X, x1 + center)):
+        for y in range(Y):
+            alive = new_status[x, y] != 0
+            if not alive and not g_isolated:
+                continue
+            neighbours = nb[x, y] if alive else 0
+            for c in range(g_n.shape[0]):
+                ok_c = True
+                for m in range(g_pos.shape[1]):
+                    g = g_pos[c, m]
+                    if g < 0:
+                        break
+                    if genes[g, x, y] == 0:
+                        ok_c = False
+                        break
+                if ok_c:
+                    for m in range(g_neg.shape[1]):
+                        g = g_neg[c, m]
+                        if g < 0:
+                            break
+                        if genes[g, x, y] != 0:
+                            ok_c = False
+                            break
+                if ok_c:
+                    ok_c = neighbours == g_n[c] if g_n[c] >= 0 else alive
+                ok[c] = ok_c
+            for k in range(g_gene.shape[0]):
+                hit = False
+                for m in range(g_start[k], g_start[k + 1]):
+                    if ok[g_conds[m]]:
+                        hit = True
+                        break
+                if not hit:
+                    continue
+                gene = g_gene[k]
+                # Dead sources only mark themselves, unless no cell is alive.
+                if not alive and n_alive > 0:
+                    if x0 <= x < x1:
+                        new_genes[gene, x, y] = 1
+                    continue
+                r = g_radius[k]
+                p = y % 2
+                for i in range(-r, r + 1):
+                    xi = x + i
+                    if xi < x0 or xi >= x1:
+                        continue
+                    for j in range(-r, r + 1):
+                        yj = y + j
+                        if 0 <= yj < Y and masks[k, p, center + i, center + j] != 0:
+                            new_genes[gene, xi, yj] = 1
+
+
+@njit
+def _fused_step(status, genes, new_status, new_genes, nb, ok,
+                nb_masks,
+                a_pos, a_neg, a_n, a_isolated,
+                g_pos, g_neg, g_n, g_isolated,
+                g_start, g_conds, g_gene, g_radius, masks, center):
+    X = status.shape[0]
+    _count_rows(status, nb, nb_masks, 0, X)
+    n_alive = _birth_rows(status, genes, nb, new_status,
+                          a_pos, a_neg, a_n, a_isolated, 0, X)
+    _count_rows(new_status, nb, nb_masks, 0, X)
+    _propagate_rows(new_status, genes, nb, new_genes, ok, n_alive,
+                    g_pos, g_neg, g_n, g_isolated,
+                    g_start, g_conds, g_gene, g_radius, masks, center, 0, X)
+
+
+# ---------------------------------------------------------------------------
+# Program flattening
+# ---------------------------------------------------------------------------
+
+def _condition_arrays(program):
+    """Positive/negative gene indices (C, P) padded with -1, and n_neighboor."""
+    C = len(program)
+    pos = bitpack.unpack_genes(program.positive.T.copy(), program.G).T
+    neg = bitpack.unpack_genes(program.negative.T.copy(), program.G).T
+    width = max(1, int(pos.sum(axis=1).max(initial=0)),
+                int(neg.sum(axis=1).max(initial=0)))
+    pos_idx = np.full((C, width), -1, dtype=np.int64)
+    neg_idx = np.full((C, width), -1, dtype=np.int64)
+    for c in range(C):
+        p = np.flatnonzero(pos[c]); pos_idx[c, :len(p)] = p
+        n = np.flatnonzero(neg[c]); neg_idx[c, :len(n)] = n
+    # A gene both required and forbidden: never satisfiable.
+    n_req = program.n_neighboor.copy()
+    impossible = (program.positive & program.negative).any(axis=1)
+    pos_idx[impossible] = -1
+    neg_idx[impossible] = -1
+    n_req[impossible] = np.iinfo(np.int64).max
+    return pos_idx, neg_idx, n_req
+
+
+def check_rule_genes(rules, G):
+    """Compiled kernels do not bounds-check: reject genes outside 0..G-1."""
+    for rule in rules:
+        used = list(rule.positive_genes) + list(rule.negative_genes)
+        if rule.active_gene >= 0:
+            used.append(rule.active_gene)
+        if any(g >= G or g < 0 for g in used):
+            raise ValueError(f"Rule {rule} refers to a gene outside 0..{G - 1}")
+
+
+def _group_arrays(program):
+    groups = program.groups
+    start = np.zeros(len(groups) + 1, dtype=np.int64)
+    for k, group in enumerate(groups):
+        start[k + 1] = start[k] + len(group.conditions)
+    conds = np.zeros(max(1, start[-1]), dtype=np.int64)
+    for k, group in enumerate(groups):
+        conds[start[k]:start[k + 1]] = group.conditions
+    gene = np.array([g.active_gene for g in groups], dtype=np.int64)
+    radius = np.array([g.propagation for g in groups], dtype=np.int64)
+
+    center = program.max_propagation
+    size = 2 * center + 1
+    masks = np.zeros((max(1, len(groups)), 2, size, size), dtype=np.int8)
+    for k, group in enumerate(groups):
+        n = group.propagation
+        iseven = n % 2 == 0
+        window = slice(center - n, center + n + 1)
+        masks[k, 0, window, window] = makeMask_int8(iseven, n, include_center=True)
+        masks[k, 1, window, window] = makeMask_int8(not iseven, n, include_center=True)
+    return start, conds, gene, radius, masks, center
+
+
+class FusedCellGrid(CellGrid):
+    """
+    CellGrid whose update_grid is a single compiled kernel over
+    preallocated double buffers.
+    """
+
+    def __init__(self, X, Y, G, genes_rules, alive_rules,
+                 initial_cells=None, gene_names=None):
+        check_rule_genes(list(genes_rules) + list(alive_rules), G)
+        super().__init__(X, Y, G, genes_rules, alive_rules,
+                         initial_cells=initial_cells, gene_names=gene_names)
+
+        self._a_pos, self._a_neg, self._a_n = _condition_arrays(self.alive_program)
+        self._g_pos, self._g_neg, self._g_n = _condition_arrays(self.gene_program)
+        (self._g_start, self._g_conds, self._g_gene,
+         self._g_radius, self._masks, self._center) = _group_arrays(self.gene_program)
+        self._nb_masks = np.stack([makeMask_int8(False, 1, include_center=False),
+                                   makeMask_int8(True, 1, include_center=False)]
+                                  ).astype(np.int32)
+
+        self._status_buffers = (np.zeros((X, Y), dtype=np.int8),
+                                np.zeros((X, Y), dtype=np.int8))
+        self._gene_buffers = (np.zeros((G, X, Y), dtype=np.int8),
+                              np.zeros((G, X, Y), dtype=np.int8))
+        self._nb = np.zeros((X, Y), dtype=np.int32)
+        self._ok = np.zeros(max(1, len(self.gene_program)), dtype=np.bool_)
+
+    @staticmethod
+    def _other(buffers, current):
+        return buffers[1] if current is buffers[0] else buffers[0]
+
+    @telemetry.instrumented
+    def update_grid(self):
+        status = np.ascontiguousarray(self.cell_status, dtype=np.int8)
+        genes = np.ascontiguousarray(self.gene_content, dtype=np.int8)
+        new_status = self._other(self._status_buffers, status)
+        new_genes = self._other(self._gene_buffers, genes)
+
+        _fused_step(status, genes, new_status, new_genes, self._nb, self._ok,
+                    self._nb_masks,
+                    self._a_pos, self._a_neg, self._a_n,
+                    self.alive_program.needs_isolated,
+                    self._g_pos, self._g_neg, self._g_n,
+                    self.gene_program.needs_isolated,
+                    self._g_start, self._g_conds, self._g_gene,
+                    self._g_radius, self._masks, self._center)
+
+        self.cell_status = new_status
+        self.gene_content = new_genes
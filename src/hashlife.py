@@ -0,0 +1,405 @@
+"""
+Memoized (hashlife-style) engine.
+
+One generation only depends on the previous one within a fixed distance
+r = R + 2 (R the largest propagation radius: births read neighbours at
+distance 1, and a source's neighbour count is taken after births). So the
+centre of a block of cells, advanced t generations with r * t no more than
+a quarter of the block, is a function of the block content alone, and can
+be cached by content.
+
+HashlifeCellGrid stores the grid in a quadtree whose nodes are hash-consed
+(identical blocks are one node). Leaves are L x L blocks holding
+cell_status, an "inside the grid" flag and the genes. `_step(node, t)`
+returns the centre half of a node advanced t generations:
+
+- on nodes of two leaves by two leaves, by running the fused kernels;
+- above, with the hashlife recursion: nine overlapping sub-nodes advanced
+  part of the way, reassembled into four nodes advanced the rest of the way.
+
+Results are kept in an LRU cache keyed by (node, t), so regions, or whole
+histories, that repeat are computed once and big jumps (`advance(n)`) cost
+about as much as single generations. The grid sits in the middle of a
+universe of cells outside the grid, which are never born nor get genes,
+as beyond the edges of a CellGrid.
+
+This relies on cells never dying: while no cell is alive, dead sources
+spread over their whole mask, which is not local, and those generations are
+run by CellGrid.update_grid.
+
+cell_status and gene_content are rebuilt from the tree when read after a
+step; call `reset()` after editing them in place.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from src.cellStatus import CellGrid
+from src.fused import (_count_rows, _birth_rows, _propagate_rows,
+                       _condition_arrays, _group_arrays, check_rule_genes)
+from src.utils import njit, makeMask_int8
+import src.telemetry as telemetry
+
+STATUS, INSIDE = 0, 1   # leaf channels, genes follow
+
+
+@njit
+def _advance_block(status, genes, inside, t, new_status, new_genes, nb, ok,
+                   nb_masks,
+                   a_pos, a_neg, a_n, a_isolated,
+                   g_pos, g_neg, g_n, g_isolated,
+                   g_start, g_conds, g_gene, g_radius, masks, center):
+    """
+    t generations of a block, as if at least one cell of the grid is alive.
+    Cells with inside == 0 are never born and never get genes.
+    """
+    X = status.shape[0]
+    Y = status.shape[1]
+    for _ in range(t):
+        _count_rows(status, nb, nb_masks, 0, X)
+        _birth_rows(status, genes, nb, new_status,
+                    a_pos, a_neg, a_n, a_isolated, 0, X)
+        for x in range(X):
+            for y in range(Y):
+                if inside[x, y] == 0:
+                    new_status[x, y] = 0
+        _count_rows(new_status, nb, nb_masks, 0, X)
+        _propagate_rows(new_status, genes, nb, new_genes, ok, 1,
+                        g_pos, g_neg, g_n, g_isolated,
+                        g_start, g_conds, g_gene, g_radius, masks, center, 0, X)
+        for g in range(new_genes.shape[0]):
+            for x in range(X):
+                for y in range(Y):
+                    if inside[x, y] == 0:
+                        new_genes[g, x, y] = 0
+        status, new_status = new_status, status
+        genes, new_genes = new_genes, genes
+    return status, genes
+
+
+class _Node:
+    """
+    Hash-consed quadtree node. A leaf holds its (G + 2, L, L) channels as
+    bytes; other nodes hold four children, indexed [x half][y half].
+    """
+    __slots__ = ("level", "id", "data", "c00", "c01", "c10", "c11")
+
+    def __init__(self, level, id, data=None, children=(None, None, None, None)):
+        self.level = level
+        self.id = id
+        self.data = data
+        self.c00, self.c01, self.c10, self.c11 = children
+
+
+class HashlifeCellGrid(CellGrid):
+    """
+    CellGrid advanced with memoized block evolution. `advance(n)` jumps n
+    generations; update_grid is advance(1).
+
+    leaf_size   : side of the leaf blocks (power of two), chosen from the
+                  rule radius when None.
+    cache_size  : number of (node, t) results kept (least recently used
+                  ones are evicted).
+    max_nodes   : when more nodes than this are interned, every node not
+                  reachable from the current grid is dropped.
+    """
+
+    def __init__(self, X, Y, G, genes_rules, alive_rules,
+                 initial_cells=None, gene_names=None,
+                 leaf_size=None, cache_size=200_000, max_nodes=1_000_000):
+        check_rule_genes(list(genes_rules) + list(alive_rules), G)
+        self._root = None
+        self._arrays = None
+        super().__init__(X, Y, G, genes_rules, alive_rules,
+                         initial_cells=initial_cells, gene_names=gene_names)
+
+        self._a_pos, self._a_neg, self._a_n = _condition_arrays(self.alive_program)
+        self._g_pos, self._g_neg, self._g_n = _condition_arrays(self.gene_program)
+        (self._g_start, self._g_conds, self._g_gene,
+         self._g_radius, self._masks, self._center) = _group_arrays(self.gene_program)
+        self._nb_masks = np.stack([makeMask_int8(False, 1, include_center=False),
+                                   makeMask_int8(True, 1, include_center=False)]
+                                  ).astype(np.int32)
+
+        self.radius = self.gene_program.max_propagation + 2
+        if leaf_size is None:
+            leaf_size = 8
+            while leaf_size < 4 * self.radius:
+                leaf_size *= 2
+        if leaf_size & (leaf_size - 1) or leaf_size < 4:
+            raise ValueError("leaf_size must be a power of two, at least 4")
+        self.leaf_size = L = leaf_size
+        self.leaf_level = L.bit_length() - 1
+        # Generations a node of 2 x 2 leaves can advance its centre.
+        self._base_steps = L // (2 * self.radius)
+        if self._base_steps < 1:
+            raise ValueError(f"leaf_size {L} is too small for a rule radius of {self.radius}")
+
+        # Universe holding the grid in the top-left corner of its centre half.
+        size = 4 * L
+        while size < 2 * max(X, Y):
+            size *= 2
+        self._size = size
+        self._offset = size // 4
+
+        self.cache_size = cache_size
+        self.max_nodes = max_nodes
+        self._results = OrderedDict()
+        self._next_id = 0
+        self._clear_nodes()
+
+        block = 2 * L
+        self._block_status = np.zeros((2, block, block), dtype=np.int8)
+        self._block_genes = np.zeros((2, G, block, block), dtype=np.int8)
+        self._nb = np.zeros((block, block), dtype=np.int32)
+        self._ok = np.zeros(max(1, len(self.gene_program)), dtype=np.bool_)
+        self.reset()
+
+    # ------------------------------------------------------------------
+    # Array views of the tree
+    # ------------------------------------------------------------------
+
+    @property
+    def cell_status(self):
+        if self._arrays is None:
+            self._arrays = self._flatten()
+        return self._arrays[0]
+
+    @cell_status.setter
+    def cell_status(self, value):
+        self._set_arrays(cell_status=value)
+
+    @property
+    def gene_content(self):
+        if self._arrays is None:
+            self._arrays = self._flatten()
+        return self._arrays[1]
+
+    @gene_content.setter
+    def gene_content(self, value):
+        self._set_arrays(gene_content=value)
+
+    def _set_arrays(self, cell_status=None, gene_content=None):
+        if self._arrays is None and self._root is not None:
+            self._arrays = self._flatten()
+        status, genes = self._arrays if self._arrays is not None else (None, None)
+        self._arrays = (status if cell_status is None else cell_status,
+                        genes if gene_content is None else gene_content)
+        self._root = None
+
+    def reset(self):
+        """Rebuild the tree from cell_status and gene_content."""
+        status, genes = self.cell_status, self.gene_content
+        self._n_alive = int(np.count_nonzero(status))
+        self._root = None
+        if self._n_alive > 0:
+            self._root = self._build(status, genes)
+
+    # ------------------------------------------------------------------
+    # Nodes
+    # ------------------------------------------------------------------
+
+    def _clear_nodes(self):
+        self._leaves = {}
+        self._nodes = {}
+        self._empty = {}
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def _leaf(self, channels):
+        data = np.ascontiguousarray(channels, dtype=np.int8).tobytes()
+        node = self._leaves.get(data)
+        if node is None:
+            node = _Node(self.leaf_level, self._new_id(), data=data)
+            self._leaves[data] = node
+        return node
+
+    def _leaf_array(self, node):
+        L = self.leaf_size
+        return np.frombuffer(node.data, dtype=np.int8).reshape(self.G + 2, L, L)
+
+    def _join(self, c00, c01, c10, c11):
+        key = (c00.id, c01.id, c10.id, c11.id)
+        node = self._nodes.get(key)
+        if node is None:
+            node = _Node(c00.level + 1, self._new_id(), children=(c00, c01, c10, c11))
+            self._nodes[key] = node
+        return node
+
+    def _empty_node(self, level):
+        """Node of cells outside the grid."""
+        node = self._empty.get(level)
+        if node is None:
+            if level == self.leaf_level:
+                L = self.leaf_size
+                node = self._leaf(np.zeros((self.G + 2, L, L), dtype=np.int8))
+            else:
+                child = self._empty_node(level - 1)
+                node = self._join(child, child, child, child)
+            self._empty[level] = node
+        return node
+
+    def _build(self, status, genes):
+        L, size, o = self.leaf_size, self._size, self._offset
+        universe = np.zeros((self.G + 2, size, size), dtype=np.int8)
+        universe[STATUS, o:o + self.X, o:o + self.Y] = status
+        universe[INSIDE, o:o + self.X, o:o + self.Y] = 1
+        universe[2:, o:o + self.X, o:o + self.Y] = genes
+        n = size // L
+        nodes = [[self._leaf(universe[:, i * L:(i + 1) * L, j * L:(j + 1) * L])
+                  for j in range(n)] for i in range(n)]
+        while n > 1:
+            n //= 2
+            nodes = [[self._join(nodes[2 * i][2 * j], nodes[2 * i][2 * j + 1],
+                                 nodes[2 * i + 1][2 * j], nodes[2 * i + 1][2 * j + 1])
+                      for j in range(n)] for i in range(n)]
+        return nodes[0][0]
+
+    def _flatten(self):
+        channels = np.zeros((self.G + 2, self._size, self._size), dtype=np.int8)
+
+        def write(node, x, y):
+            if node.level == self.leaf_level:
+                L = self.leaf_size
+                channels[:, x:x + L, y:y + L] = self._leaf_array(node)
+                return
+            half = 1 << (node.level - 1)
+            write(node.c00, x, y)
+            write(node.c01, x, y + half)
+            write(node.c10, x + half, y)
+            write(node.c11, x + half, y + half)
+
+        write(self._root, 0, 0)
+        o = self._offset
+        return (channels[STATUS, o:o + self.X, o:o + self.Y].copy(),
+                channels[2:, o:o + self.X, o:o + self.Y].copy())
+
+    def _centre(self, node):
+        """Centre half of a node (level - 1), not advanced."""
+        if node.level == self.leaf_level + 1:
+            L, h = self.leaf_size, self.leaf_size // 2
+            quarters = [self._leaf_array(c) for c in (node.c00, node.c01, node.c10, node.c11)]
+            block = np.empty((self.G + 2, L, L), dtype=np.int8)
+            block[:, :h, :h] = quarters[0][:, h:, h:]
+            block[:, :h, h:] = quarters[1][:, h:, :h]
+            block[:, h:, :h] = quarters[2][:, :h, h:]
+            block[:, h:, h:] = quarters[3][:, :h, :h]
+            return self._leaf(block)
+        return self._join(node.c00.c11, node.c01.c10, node.c10.c01, node.c11.c00)
+
+    # ------------------------------------------------------------------
+    # Evolution
+    # ------------------------------------------------------------------
+
+    def max_steps(self, level):
+        """Generations _step can advance a node of this level at once."""
+        return self._base_steps << (level - self.leaf_level - 1)
+
+    def _step(self, node, t):
+        """Centre half of node advanced t generations (t <= max_steps)."""
+        key = (node.id, t)
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+            return result
+
+        if node.level == self.leaf_level + 1:
+            result = self._step_block(node, t)
+        else:
+            # Nine overlapping sub-nodes, a quarter of the node apart.
+            c00, c01, c10, c11 = node.c00, node.c01, node.c10, node.c11
+            j = self._join
+            n = [[c00,
+                  j(c00.c01, c01.c00, c00.c11, c01.c10),
+                  c01],
+                 [j(c00.c10, c00.c11, c10.c00, c10.c01),
+                  j(c00.c11, c01.c10, c10.c01, c11.c00),
+                  j(c01.c10, c01.c11, c11.c00, c11.c01)],
+                 [c10,
+                  j(c10.c01, c11.c00, c10.c11, c11.c10),
+                  c11]]
+            t2 = min(t, self.max_steps(node.level - 1))
+            t1 = t - t2
+            r = [[self._step(n[a][b], t1) if t1 else self._centre(n[a][b])
+                  for b in range(3)] for a in range(3)]
+            result = j(
+                self._step(j(r[0][0], r[0][1], r[1][0], r[1][1]), t2),
+                self._step(j(r[0][1], r[0][2], r[1][1], r[1][2]), t2),
+                self._step(j(r[1][0], r[1][1], r[2][0], r[2][1]), t2),
+                self._step(j(r[1][1], r[1][2], r[2][1], r[2][2]), t2))
+
+        self._results[key] = result
+        if len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+        return result
+
+    def _step_block(self, node, t):
+        L = self.leaf_size
+        channels = np.empty((self.G + 2, 2 * L, 2 * L), dtype=np.int8)
+        channels[:, :L, :L] = self._leaf_array(node.c00)
+        channels[:, :L, L:] = self._leaf_array(node.c01)
+        channels[:, L:, :L] = self._leaf_array(node.c10)
+        channels[:, L:, L:] = self._leaf_array(node.c11)
+        status, new_status = self._block_status
+        genes, new_genes = self._block_genes
+        status[:] = channels[STATUS]
+        genes[:] = channels[2:]
+        status, genes = _advance_block(
+            status, genes, channels[INSIDE], t, new_status, new_genes,
+            self._nb, self._ok, self._nb_masks,
+            self._a_pos, self._a_neg, self._a_n,
+            self.alive_program.needs_isolated,
+            self._g_pos, self._g_neg, self._g_n,
+            self.gene_program.needs_isolated,
+            self._g_start, self._g_conds, self._g_gene,
+            self._g_radius, self._masks, self._center)
+        h = L // 2
+        channels[STATUS] = status
+        channels[2:] = genes
+        return self._leaf(channels[:, h:h + L, h:h + L])
+
+    def _pad(self, node):
+        """Node one level up with `node` as its centre."""
+        e = self._empty_node(node.level - 1)
+        j = self._join
+        return j(j(e, e, e, node.c00), j(e, e, node.c01, e),
+                 j(e, node.c10, e, e), j(node.c11, e, e, e))
+
+    def advance(self, generations):
+        """Advance `generations` generations, in as few jumps as possible."""
+        while generations > 0:
+            if self._root is None:
+                self.reset()
+            if self._root is None:
+                # No alive cell: not local, see the module docstring.
+                super().update_grid()
+                self.reset()
+                generations -= 1
+                continue
+            top = self._root
+            while self.max_steps(top.level) < generations and top.level < self._root.level + 8:
+                top = self._pad(top)
+            t = min(generations, self.max_steps(top.level))
+            result = self._step(top, t)
+            while result.level > self._root.level:
+                result = self._centre(result)
+            if result.level < self._root.level:
+                result = self._pad(result)
+            self._root = result
+            self._arrays = None
+            generations -= t
+            if len(self._nodes) + len(self._leaves) > self.max_nodes:
+                self._collect()
+
+    @telemetry.instrumented
+    def update_grid(self):
+        self.advance(1)
+
+    def _collect(self):
+        """Drop every node and cached result not reachable from the grid."""
+        status, genes = self.cell_status, self.gene_content
+        self._results.clear()
+        self._clear_nodes()
+        self._root = self._build(status, genes)
@@ -0,0 +1,148 @@
+"""
+Bounded in-memory history of a run, for the interactive viewer.
+
+Like a trajectory file (src/trajectory.py), every `keyframe_interval`
+generations the bit-packed state is stored as a keyframe and the
+generations in between as the XOR of their packed state with it, all
+zlib-compressed. When the stored bytes exceed `budget`, history is dropped
+oldest first: first the deltas of the oldest block, then keyframes, taken
+so the remaining ones stay evenly spread. The first and latest keyframes
+are always kept.
+
+A generation that is no longer stored is recomputed: the dynamics are
+deterministic, so a replica of the grid (same rules, `engine`) is reset to
+the closest earlier keyframe and stepped forward with update_grid. The
+replayed generations are kept in a small window, so scrubbing back through
+a dropped stretch replays it once.
+"""
+import bisect
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+import src.utils as utils
+from src.trajectory import pack_state, unpack_state
+
+
+class History:
+    """
+    List-like [cell_status, gene_content, neighbours] history of `grid`,
+    usable as Interface.matrix_history. Appended entries only need
+    cell_status and gene_content; neighbour counts are computed when read.
+    """
+
+    def __init__(self, grid, budget=256 * 2**20, keyframe_interval=64,
+                 engine="dense", window=64, level=1):
+        self.X, self.Y, self.G = grid.X, grid.Y, grid.G
+        self.budget = budget
+        self.keyframe_interval = keyframe_interval
+        self.window = window
+        self.level = level
+        self.nbytes = 0              # compressed bytes stored
+        self._length = 0
+        self._keyframes = {}         # generation -> compressed packed state
+        self._keys = []              # sorted generations of _keyframes
+        self._deltas = {}            # block keyframe -> [compressed XOR, ...]
+        self._last_keyframe = None   # packed state of the newest keyframe
+        self._decoded = OrderedDict()  # generation -> packed, recently read
+        self._replica = None
+        self._last = (None, None)
+        self._make_replica = lambda: cellStatus.get_engine(engine)(
+            self.X, self.Y, self.G, grid.genes_rules, grid.alive_rules,
+            gene_names=grid.gene_names)
+
+    def __len__(self):
+        return self._length
+
+    def append(self, entry):
+        """Store the next generation from [cell_status, gene_content, ...]."""
+        packed = pack_state(entry[0], entry[1])
+        generation = self._length
+        if generation % self.keyframe_interval == 0:
+            data = zlib.compress(packed.tobytes(), self.level)
+            self._keyframes[generation] = data
+            self._keys.append(generation)
+            self._deltas[generation] = []
+            self._last_keyframe = packed
+        else:
+            data = zlib.compress((packed ^ self._last_keyframe).tobytes(), self.level)
+            self._deltas[self._keys[-1]].append(data)
+        self.nbytes += len(data)
+        self._length += 1
+        self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.budget:
+            old_blocks = [key for key in self._keys[:-1] if self._deltas[key]]
+            if old_blocks:
+                deltas = self._deltas[old_blocks[0]]
+                self.nbytes -= sum(len(data) for data in deltas)
+                deltas.clear()
+                continue
+            if len(self._keys) <= 2:
+                return
+            # Drop the keyframe whose neighbours are closest together.
+            gaps = [self._keys[k + 1] - self._keys[k - 1] for k in range(1, len(self._keys) - 1)]
+            k = 1 + gaps.index(min(gaps))
+            key = self._keys.pop(k)
+            self.nbytes -= len(self._keyframes.pop(key))
+            del self._deltas[key]
+
+    def read_packed(self, generation):
+        if generation < 0:
+            generation += len(self)
+        if not 0 <= generation < len(self):
+            raise IndexError(f"generation {generation} out of range (0..{len(self) - 1})")
+        if generation in self._decoded:
+            self._decoded.move_to_end(generation)
+            return self._decoded[generation]
+
+        key = self._keys[bisect.bisect_right(self._keys, generation) - 1]
+        keyframe = self._decompress(self._keyframes[key])
+        deltas = self._deltas[key]
+        if generation == key:
+            packed = keyframe
+        elif generation - key <= len(deltas):
+            packed = keyframe ^ self._decompress(deltas[generation - key - 1])
+        else:
+            packed = self._replay(key, keyframe, generation)
+        self._remember(generation, packed)
+        return packed
+
+    def _decompress(self, data):
+        return np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+
+    def _remember(self, generation, packed):
+        self._decoded[generation] = packed
+        self._decoded.move_to_end(generation)
+        while len(self._decoded) > self.window:
+            self._decoded.popitem(last=False)
+
+    def _replay(self, start, packed, generation):
+        """Step a replica from generation `start` to `generation`."""
+        if self._replica is None:
+            self._replica = self._make_replica()
+        grid = self._replica
+        grid.cell_status, grid.gene_content = unpack_state(packed, self.X, self.Y, self.G)
+        if hasattr(grid, "reset"):
+            grid.reset()
+        for g in range(start + 1, generation + 1):
+            grid.update_grid()
+            packed = pack_state(grid.cell_status, grid.gene_content)
+            if g > generation - self.window:
+                self._remember(g, packed)
+        return packed
+
+    def __getitem__(self, generation):
+        if generation < 0:
+            generation += len(self)
+        if self._last[0] != generation:
+            cell_status, gene_content = unpack_state(self.read_packed(generation),
+                                                     self.X, self.Y, self.G)
+            neighbours = utils.adaptive_convolution(
+                cell_status, 1, self.X, self.Y, include_center=False
+            )
+            self._last = (generation, [cell_status, gene_content, neighbours])
+        return self._last[1]
@@ -0,0 +1,300 @@
+"""
+Incremental engine.
+
+A generation only depends on the previous one through fixed-radius
+neighbourhoods, so a cell can only change if something changed close to it
+in the previous generation. IncrementalCellGrid keeps the list of cells
+whose status or genes changed (the dirty set) and re-evaluates:
+
+- births only on the dirty set dilated by one cell;
+- rule sources only around dirty and newborn cells;
+- genes only where the coverage of a changed source ends or starts.
+
+To do so it maintains, between generations, the neighbour counts (updated
+by each newborn), the source kind of every rule group at every cell
+(0: none, 1: dead source marking itself, 2: alive source stamping its hex
+mask) and, per group, how many sources cover each cell. Step cost is
+proportional to activity instead of grid area.
+
+The state is rebuilt from scratch on the first step, and whenever
+`reset()` is called after cell_status or gene_content were edited.
+"""
+import numpy as np
+
+from src.cellStatus import CellGrid
+from src.fused import _condition_arrays, _group_arrays
+from src.utils import njit, makeMask_int8
+import src.telemetry as telemetry
+
+NONE, SELF, BALL = 0, 1, 2
+
+
+@njit(inline="always")
+def _cover(cover, mark, tag, touched, n_touched, k, x, y, kind, delta,
+           masks, center, radius, X, Y):
+    """Add delta to group k's coverage of a source; collect cells crossing 0."""
+    if kind == SELF:
+        before = cover[k, x, y]
+        cover[k, x, y] = before + delta
+        if (before == 0) != (before + delta == 0) and mark[x, y] != tag:
+            mark[x, y] = tag
+            touched[n_touched] = x * Y + y
+            n_touched += 1
+        return n_touched
+    p = y % 2
+    for i in range(-radius, radius + 1):
+        xi = x + i
+        if xi < 0 or xi >= X:
+            continue
+        for j in range(-radius, radius + 1):
+            yj = y + j
+            if yj < 0 or yj >= Y or masks[k, p, center + i, center + j] == 0:
+                continue
+            before = cover[k, xi, yj]
+            cover[k, xi, yj] = before + delta
+            if (before == 0) != (before + delta == 0) and mark[xi, yj] != tag:
+                mark[xi, yj] = tag
+                touched[n_touched] = xi * Y + yj
+                n_touched += 1
+    return n_touched
+
+
+@njit
+def _incremental_step(status, genes, nb, src, cover, mark, epoch,
+                      dirty, n_dirty, next_dirty, born, touched, expressed, ok,
+                      nb_masks,
+                      a_pos, a_neg, a_n, a_isolated,
+                      g_pos, g_neg, g_n, g_isolated,
+                      g_start, g_conds, g_gene, g_radius, masks, center, full):
+    """
+    Advance one generation in place. dirty[:n_dirty] holds the flat indices
+    (x * Y + y) of the cells changed by the previous generation; the cells
+    changed by this one are written to next_dirty.
+    Returns (number of births, number of next dirty cells).
+    """
+    X = status.shape[0]
+    Y = status.shape[1]
+
+    # 1. Births, around the dirty cells only, from the current genes.
+    tag = epoch + 1
+    n_born = 0
+    for d in range(n_dirty):
+        dx = dirty[d] // Y
+        dy = dirty[d] % Y
+        for x in range(max(0, dx - 1), min(X, dx + 2)):
+            for y in range(max(0, dy - 1), min(Y, dy + 2)):
+                if mark[0, x, y] == tag:
+                    continue
+                mark[0, x, y] = tag
+                if status[x, y] != 0:
+                    continue
+                potential = nb[x, y] > 0
+                if not potential and not a_isolated:
+                    continue
+                for c in range(a_n.shape[0]):
+                    ok_c = True
+                    for m in range(a_pos.shape[1]):
+                        g = a_pos[c, m]
+                        if g < 0:
+                            break
+                        if genes[g, x, y] == 0:
+                            ok_c = False
+                            break
+                    if ok_c:
+                        for m in range(a_neg.shape[1]):
+                            g = a_neg[c, m]
+                            if g < 0:
+                                break
+                            if genes[g, x, y] != 0:
+                                ok_c = False
+                                break
+                    if ok_c:
+                        ok_c = nb[x, y] == a_n[c] if a_n[c] >= 0 else potential
+                    if ok_c:
+                        born[n_born] = x * Y + y
+                        n_born += 1
+                        break
+
+    # 2. Apply births; newborns update the neighbour counts.
+    for b in range(n_born):
+        x = born[b] // Y
+        y = born[b] % Y
+        status[x, y] = 1
+        p = y % 2
+        for i in range(-1, 2):
+            xi = x + i
+            if xi < 0 or xi >= X:
+                continue
+            for j in range(-1, 2):
+                yj = y + j
+                if 0 <= yj < Y:
+                    nb[xi, yj] += nb_masks[p, 1 + i, 1 + j]
+
+    # 3. Sources whose inputs may have changed: around dirty and newborn cells.
+    tag = epoch + 2
+    cover_tag = epoch + 3
+    n_touched = 0
+    for source in range(2):
+        cells = dirty if source == 0 else born
+        n_cells = n_dirty if source == 0 else n_born
+        for d in range(n_cells):
+            dx = cells[d] // Y
+            dy = cells[d] % Y
+            for x in range(max(0, dx - 1), min(X, dx + 2)):
+                for y in range(max(0, dy - 1), min(Y, dy + 2)):
+                    if mark[0, x, y] == tag:
+                        continue
+                    mark[0, x, y] = tag
+                    alive = status[x, y] != 0
+                    neighbours = nb[x, y] if alive else 0
+                    for c in range(g_n.shape[0]):
+                        ok_c = alive or g_isolated
+                        if ok_c:
+                            for m in range(g_pos.shape[1]):
+                                g = g_pos[c, m]
+                                if g < 0:
+                                    break
+                                if genes[g, x, y] == 0:
+                                    ok_c = False
+                                    break
+                        if ok_c:
+                            for m in range(g_neg.shape[1]):
+                                g = g_neg[c, m]
+                                if g < 0:
+                                    break
+                                if genes[g, x, y] != 0:
+                                    ok_c = False
+                                    break
+                        if ok_c:
+                            ok_c = neighbours == g_n[c] if g_n[c] >= 0 else alive
+                        ok[c] = ok_c
+                    for k in range(g_gene.shape[0]):
+                        hit = False
+                        for m in range(g_start[k], g_start[k + 1]):
+                            if ok[g_conds[m]]:
+                                hit = True
+                                break
+                        kind = NONE
+                        if hit:
+                            kind = BALL if alive else SELF
+                        old = src[k, x, y]
+                        if kind == old:
+                            continue
+                        src[k, x, y] = kind
+                        if old != NONE:
+                            n_touched = _cover(cover, mark[1], cover_tag, touched,
+                                               n_touched, k, x, y, old, -1,
+                                               masks, center, g_radius[k], X, Y)
+                        if kind != NONE:
+                            n_touched = _cover(cover, mark[1], cover_tag, touched,
+                                               n_touched, k, x, y, kind, 1,
+                                               masks, center, g_radius[k], X, Y)
+
+    # 4. Genes of the cells whose coverage crossed zero (every cell if full).
+    tag = epoch + 4
+    n_next = 0
+    n_targets = X * Y if full else n_touched
+    for t in range(n_targets):
+        index = t if full else touched[t]
+        x = index // Y
+        y = index % Y
+        expressed[:] = 0
+        for k in range(g_gene.shape[0]):
+            if cover[k, x, y] > 0:
+                expressed[g_gene[k]] = 1
+        changed = False
+        for g in range(genes.shape[0]):
+            if genes[g, x, y] != expressed[g]:
+                genes[g, x, y] = expressed[g]
+                changed = True
+        if changed and mark[0, x, y] != tag:
+            mark[0, x, y] = tag
+            next_dirty[n_next] = index
+            n_next += 1
+    for b in range(n_born):
+        x = born[b] // Y
+        y = born[b] % Y
+        if mark[0, x, y] != tag:
+            mark[0, x, y] = tag
+            next_dirty[n_next] = born[b]
+            n_next += 1
+
+    return n_born, n_next
+
+
+class IncrementalCellGrid(CellGrid):
+    """
+    CellGrid updating only the neighbourhood of the cells changed by the
+    previous generation. cell_status and gene_content are updated in place.
+    """
+
+    def __init__(self, X, Y, G, genes_rules, alive_rules,
+                 initial_cells=None, gene_names=None):
+        super().__init__(X, Y, G, genes_rules, alive_rules,
+                         initial_cells=initial_cells, gene_names=gene_names)
+
+        self._a_pos, self._a_neg, self._a_n = _condition_arrays(self.alive_program)
+        self._g_pos, self._g_neg, self._g_n = _condition_arrays(self.gene_program)
+        (self._g_start, self._g_conds, self._g_gene,
+         self._g_radius, self._masks, self._center) = _group_arrays(self.gene_program)
+        self._nb_masks = np.stack([makeMask_int8(False, 1, include_center=False),
+                                   makeMask_int8(True, 1, include_center=False)]
+                                  ).astype(np.int32)
+
+        n_groups = max(1, len(self.gene_program.groups))
+        self._src = np.zeros((n_groups, X, Y), dtype=np.int8)
+        self._cover = np.zeros((n_groups, X, Y), dtype=np.int32)
+        self._mark = np.zeros((2, X, Y), dtype=np.int64)
+        self._epoch = 0
+        self._dirty = np.zeros(X * Y, dtype=np.int64)
+        self._next_dirty = np.zeros(X * Y, dtype=np.int64)
+        self._born = np.zeros(X * Y, dtype=np.int64)
+        self._touched = np.zeros(X * Y, dtype=np.int64)
+        self._expressed = np.zeros(G, dtype=np.int8)
+        self._ok = np.zeros(max(1, len(self.gene_program)), dtype=np.bool_)
+        self.reset()
+
+    def reset(self):
+        """Rebuild the incremental state from cell_status and gene_content."""
+        self.cell_status = np.ascontiguousarray(self.cell_status, dtype=np.int8)
+        self.gene_content = np.ascontiguousarray(self.gene_content, dtype=np.int8)
+        self._nb = np.ascontiguousarray(self.get_neighbors(), dtype=np.int32)
+        self._src[:] = NONE
+        self._cover[:] = 0
+        self._dirty[:] = np.arange(self.X * self.Y)
+        self._n_dirty = self.X * self.Y
+        self._n_alive = int(np.count_nonzero(self.cell_status))
+        self._full = True
+
+    @property
+    def n_dirty(self):
+        """Number of cells changed by the last generation."""
+        return self._n_dirty
+
+    @telemetry.instrumented
+    def update_grid(self):
+        if self._n_alive == 0:
+            # With no alive cell, dead sources spread over their whole mask;
+            # let the reference implementation handle this rare case.
+            super().update_grid()
+            self.reset()
+            return
+
+        n_born, n_next = _incremental_step(
+            self.cell_status, self.gene_content, self._nb,
+            self._src, self._cover, self._mark, self._epoch,
+            self._dirty, self._n_dirty, self._next_dirty,
+            self._born, self._touched, self._expressed, self._ok,
+            self._nb_masks,
+            self._a_pos, self._a_neg, self._a_n,
+            self.alive_program.needs_isolated,
+            self._g_pos, self._g_neg, self._g_n,
+            self.gene_program.needs_isolated,
+            self._g_start, self._g_conds, self._g_gene,
+            self._g_radius, self._masks, self._center, self._full)
+
+        self._epoch += 4
+        self._full = False
+        self._n_alive += n_born
+        self._dirty, self._next_dirty = self._next_dirty, self._dirty
+        self._n_dirty = n_next
@@ -3,18 +3,13 @@ import numpy as np
 import math
 import random
 import copy
+from history import History
+from simulation import Simulation
+from renderer import HexRenderer, pixel_to_cell, point_in_polygon, polygon_points, palette_indices
 windows_size = (150, 150)
 class Interface:
     def polygon_points(self ,center , size):
-        height = size
-        width = math.sqrt(3) * size
-        n0 = (center[0] - height, center[1] + width)
-        n1 = (center[0] + height, center[1] + width)
-        n2 = (center[0] + 2 * height, center[1])
-        n3 = (center[0] + height, center[1] - width)
-        n4 = (center[0] - height, center[1] - width)
-        n5 = (center[0] - 2 * height, center[1])
-        return [n0, n1, n2, n3, n4, n5]
+        return polygon_points(center, size)
 
     def gene_to_color(self, i, j, cell_status, gene_content):
         """Convert gene content to a color. Cache results for consistency."""
@@ -22,8 +17,9 @@ class Interface:
             return (0, 0, 0)
 
         # gene_content is now a (G, X, Y) array — extract gene vector for cell (i,j)
-        gene_tuple = tuple(gene_content[:, i, j].tolist())
+        return self.vector_to_color(tuple(gene_content[:, i, j].tolist()))
 
+    def vector_to_color(self, gene_tuple):
         if gene_tuple in self.gene_color_cache:
             return self.gene_color_cache[gene_tuple]
 
@@ -42,50 +38,13 @@ class Interface:
 
     def point_in_polygon(self, point, polygon):
         """Check if a point is inside a polygon using ray casting algorithm"""
-        x, y = point
-        n = len(polygon)
-        inside = False
-        p1x, p1y = polygon[0]
-        for i in range(n + 1):
-            p2x, p2y = polygon[i % n]
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                        if p1x == p2x or x <= xinters:
-                            inside = not inside
-            p1x, p1y = p2x, p2y
-        return inside
+        return point_in_polygon(point, polygon)
 
     def get_cell_at_mouse(self, mouse_pos):
         """Find which cell the mouse is hovering over"""
-        width = math.sqrt(3) * self.cell_size
-        height = self.cell_size
-        initial_center = [2*self.cell_size, 2*self.cell_size]
-        center = initial_center.copy()
-        
-        for i in range(self.matrix.shape[0]):
-            j = 0
-            polygon = self.polygon_points(center, self.cell_size)
-            if self.point_in_polygon(mouse_pos, polygon):
-                return (i, j)
-            
-            for j in range(self.matrix.shape[1]-1):
-                if j % 2 == 0:
-                    center[0] += 3 * height
-                    center[1] += width
-                else:
-                    center[0] += 3 * height
-                    center[1] -= width
-                
-                polygon = self.polygon_points(center, self.cell_size)
-                if self.point_in_polygon(mouse_pos, polygon):
-                    return (i, j)
-            
-            center[0] = initial_center[0]
-            center[1] = i * 2 * width + initial_center[1]
-        
+        i, j = pixel_to_cell(mouse_pos[0], mouse_pos[1], self.cell_size)
+        if 0 <= i < self.matrix.shape[0] and 0 <= j < self.matrix.shape[1]:
+            return (int(i), int(j))
         return None
 
 
@@ -138,33 +97,26 @@ class Interface:
             width=1
         )
 
+    def cell_colors(self, cell_status, gene_content):
+        """(X, Y, 3) colours: one per distinct gene vector, or the gene view."""
+        if 0 <= self.controler.show < len(gene_content) - 1:
+            # Gene view: alive cells with / without the selected gene.
+            gene = gene_content[self.controler.show + 1] != 0
+            palette = np.array([(0, 0, 0), (90, 90, 90), (255, 255, 100)], dtype=np.uint8)
+            return palette[(cell_status != 0) * (1 + gene)]
+        indices, vectors = palette_indices(cell_status, gene_content)
+        palette = np.array([self.vector_to_color(tuple(v.tolist())) for v in vectors]
+                           + [(0, 0, 0)], dtype=np.uint8).reshape(-1, 3)
+        return palette[indices]   # -1, dead cells, is the last entry
+
     def draw_grid(self):
-        self.screen.fill((20, 20, 20))
-        width = math.sqrt(3) * self.cell_size
-        height = self.cell_size
-        initial_center = [2*self.cell_size,2*self.cell_size]
-        center = initial_center.copy()
-        for i in range(self.matrix.shape[0]):
-            j=0
-            # Get color based on cell status and gene content
-            # = self.gene_to_color(i, j)
-            #self.draw_polygon(center, cell_color)
-            
-            for j in range(self.matrix.shape[1]-1):
-                if j % 2 == 0:
-                    center[0] += 3 * height
-                    center[1] += width
-                else:
-                    center[0] += 3 * height
-                    center[1] -= width
-                
-                # Get color based on cell status and gene content
-                cell_color = self.gene_to_color(i, j,self.matrix_history[self.iteration_counter-1][0],self.matrix_history[self.iteration_counter-1][1]) 
-                self.draw_polygon([center[0], center[1]], cell_color)
-                
-            center[0] = initial_center[0]
-            center[1] = i * 2 * width + initial_center[1]
-        
+        key = (self.iteration_counter, self.controler.show)
+        if key != self._drawn:
+            cell_status, gene_content = self.matrix_history[self.iteration_counter-1][:2]
+            self.renderer.render(self.cell_colors(cell_status, gene_content))
+            self._drawn = key
+        self.screen.blit(self.renderer.surface, (0, 0))
+
         # Draw iteration counter
         text = self.font.render(f'Iteration {self.iteration_counter}', True, (255,255,255))
         textRect = text.get_rect()
@@ -183,12 +135,11 @@ class Interface:
             pass  # Running with
 
     def save_status(self):
-        # gene_content is already a dict {g: 2D array} — store as-is.
-        # No format change needed; draw_tooltip and gene_to_color read it correctly.
+        # Copies: the fused engine reuses its arrays between generations.
+        # Neighbour counts are computed by the history when read.
         return [
-            self.controler.cellGrid.getCellStatus(),
-            self.controler.cellGrid.gene_content,   # dict of 2D arrays
-            self.controler.cellGrid.get_neighbors()
+            self.controler.cellGrid.getCellStatus().copy(),
+            self.controler.cellGrid.gene_content.copy(),
         ]
 
     def __init__(self,windows_size, controler):
@@ -205,9 +156,18 @@ class Interface:
         running = False
         self.color = [(0,0,0), (255, 255, 255)]
         self.cell_size = ((windows_size[1]) / (3.5 * self.matrix.shape[0]))*0.98
+        self.renderer = HexRenderer(self.matrix.shape[0], self.matrix.shape[1],
+                                    self.cell_size, windows_size)
+        self._drawn = None
         clock = pygame.time.Clock()
         self.iteration_counter = 0
-        self.matrix_history = []
+        # Bounded in memory by default (see src/history.py), or a trajectory
+        # file (see src/trajectory.py)
+        history = getattr(self.controler, "history", None)
+        if history is None:
+            history = History(self.controler.cellGrid,
+                              engine=getattr(self.controler, "engine", "dense"))
+        self.matrix_history = history
         self.font = pygame.font.Font('freesansbold.ttf', 24)
         self.small_font = pygame.font.Font('freesansbold.ttf', 18)  # For tooltip
 
@@ -234,12 +194,19 @@ class Interface:
 
         self.matrix_history.append(self.save_status())
         self.iteration_counter = 1
+        # Generation asked for with RIGHT / play, shown once it is simulated.
+        self.wanted = 1
+        # Generations are stepped in the background (see src/simulation.py)
+        self.simulation = Simulation(self.controler.update, self.save_status).start()
 
         # Main loop
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT: #close
+                    self.simulation.stop()
                     pygame.quit()
+                    if hasattr(self.matrix_history, "close"):
+                        self.matrix_history.close()
                     return
                 if event.type == pygame.KEYDOWN:
                     print(self.iteration_counter,len(self.matrix_history))
@@ -247,31 +214,29 @@ class Interface:
                     if event.key == pygame.K_SPACE: # Start/ stop
                         running = not running
                     elif event.key == pygame.K_RIGHT:
-                        self.matrix = self.controler.getGrid()
-                        self.iteration_counter += 1
-                        if len(self.matrix_history)< self.iteration_counter:
-                            self.controler.update()
-                            self.matrix_history.append(self.save_status())
+                        self.wanted += 1
                     elif event.key == pygame.K_LEFT:
-                        self.iteration_counter -= 1
-                        if self.iteration_counter==0:
-                            self.iteration_counter =1
+                        self.wanted = max(self.iteration_counter - 1, 1)
 
-                    elif event.key == pygame.K_a: # Clear the board
+                    elif event.key == pygame.K_a: # Show gene 1
                         self.controler.show = 0
-                        self.matrix = self.controler.getGrid()
-                    elif event.key == pygame.K_z: # Clear the board
+                    elif event.key == pygame.K_z: # Show gene 2
                         self.controler.show = 1
-                        self.matrix = self.controler.getGrid()
-                    elif event.key == pygame.K_r: # Clear the board
+                    elif event.key == pygame.K_r: # Show gene vectors
                         self.controler.show = -1
-                        self.matrix = self.controler.getGrid()
-            
-            if running:
-                self.controler.update()
-                self.iteration_counter += 1
-                if len(self.matrix_history)< self.iteration_counter:
-                    self.matrix_history.append(self.save_status())
-            
+
+            if running and self.iteration_counter == self.wanted:
+                self.wanted += 1
+            self.collect()
+            self.iteration_counter = min(self.wanted, len(self.matrix_history))
+
             self.draw_grid()
-            clock.tick(60)
\ No newline at end of file
+            clock.tick(60)
+
+    def collect(self):
+        """Move simulated generations to the history, up to the one wanted."""
+        while len(self.matrix_history) < self.wanted:
+            state = self.simulation.get(timeout=0)
+            if state is None:
+                break
+            self.matrix_history.append(state)
@@ -0,0 +1,53 @@
+"""
+Bit-packed CellGrid backend.
+
+Genes are stored 64 per uint64 word (see src/bitpack.py), which divides
+the gene memory by 8 and lets rule conditions read packed words directly.
+"""
+import numpy as np
+
+from src.cellStatus import CellGrid
+from src.bitpack import WORD_BITS, n_words, pack_genes, unpack_genes, gene_mask
+
+
+class PackedCellGrid(CellGrid):
+    """
+    CellGrid storing genes bit-packed in `gene_bits`, a (W, X, Y) uint64
+    array. `gene_content` is still available as a (G, X, Y) int8 array but
+    is unpacked on every access, so the engine itself never reads it. The
+    unpacked copy is read-only: edit `gene_bits`, or assign a whole array
+    to `gene_content`, which packs it.
+    """
+
+    def __init__(self, X, Y, G, genes_rules, alive_rules,
+                 initial_cells=None, gene_names=None):
+        self.W = n_words(G)
+        super().__init__(X, Y, G, genes_rules, alive_rules,
+                         initial_cells=initial_cells, gene_names=gene_names)
+
+    def _allocate_genes(self):
+        self.gene_bits = np.zeros((self.W, self.X, self.Y), dtype=np.uint64)
+
+    def _seed_genes(self, genes, x, y):
+        self.gene_bits[:, x, y] |= gene_mask(genes, self.W)
+
+    @property
+    def gene_content(self):
+        genes = unpack_genes(self.gene_bits, self.G)
+        # Edits of this copy would be lost: make them raise.
+        genes.flags.writeable = False
+        return genes
+
+    @gene_content.setter
+    def gene_content(self, value):
+        self.gene_bits = pack_genes(value)
+
+    def _express(self, gene, extent, window=np.s_[:, :]):
+        word, bit = divmod(gene, WORD_BITS)
+        self.gene_bits[word][window] |= np.asarray(extent).astype(np.uint64) << np.uint64(bit)
+
+    def _gene_planes(self):
+        return self.gene_bits
+
+    def _gene_words(self, xs, ys):
+        return self.gene_bits[:, xs, ys]
@@ -0,0 +1,99 @@
+"""
+Multi-core engine with row-tile domain decomposition.
+
+The grid is split into horizontal bands of rows. Each phase of a generation
+(see src/fused.py) runs on all bands at once with numba's prange, and every
+band only writes its own rows. Bands read their halo directly from the
+shared arrays of the previous phase: one row for neighbour counts and
+birth, and the largest rule `propagation` radius for gene propagation, so
+the end of each phase acts as the halo exchange.
+"""
+import numpy as np
+
+from src.fused import (FusedCellGrid, _count_rows, _birth_rows,
+                       _propagate_rows)
+from src.utils import njit, prange, NUMBA_AVAILABLE
+import src.telemetry as telemetry
+
+if NUMBA_AVAILABLE:
+    import numba
+
+
+@njit(parallel=True)
+def _parallel_step(status, genes, new_status, new_genes, nb, ok, alive, bounds,
+                   nb_masks,
+                   a_pos, a_neg, a_n, a_isolated,
+                   g_pos, g_neg, g_n, g_isolated,
+                   g_start, g_conds, g_gene, g_radius, masks, center):
+    T = bounds.shape[0] - 1
+
+    for t in prange(T):
+        _count_rows(status, nb, nb_masks, bounds[t], bounds[t + 1])
+        alive[t] = _birth_rows(status, genes, nb, new_status,
+                               a_pos, a_neg, a_n, a_isolated,
+                               bounds[t], bounds[t + 1])
+    n_alive = alive.sum()
+
+    for t in prange(T):
+        _count_rows(new_status, nb, nb_masks, bounds[t], bounds[t + 1])
+
+    for t in prange(T):
+        _propagate_rows(new_status, genes, nb, new_genes, ok[t], n_alive,
+                        g_pos, g_neg, g_n, g_isolated,
+                        g_start, g_conds, g_gene, g_radius, masks, center,
+                        bounds[t], bounds[t + 1])
+
+
+def tile_bounds(X, n_tiles):
+    """Row boundaries of n_tiles bands of (almost) equal height."""
+    n_tiles = max(1, min(n_tiles, X))
+    return np.linspace(0, X, n_tiles + 1).round().astype(np.int64)
+
+
+class ParallelCellGrid(FusedCellGrid):
+    """
+    FusedCellGrid stepping row tiles on numba's thread pool.
+
+    n_threads : threads used by numba (default: all cores).
+    n_tiles   : number of row bands (default: 2 per thread, bands being kept
+                at least 4 propagation radii high so halos stay a small
+                fraction of the work).
+    """
+
+    def __init__(self, X, Y, G, genes_rules, alive_rules,
+                 initial_cells=None, gene_names=None,
+                 n_threads=None, n_tiles=None):
+        super().__init__(X, Y, G, genes_rules, alive_rules,
+                         initial_cells=initial_cells, gene_names=gene_names)
+        self.n_threads = n_threads
+        if n_tiles is None:
+            threads = n_threads or (numba.get_num_threads() if NUMBA_AVAILABLE else 1)
+            min_height = max(8, 4 * self.gene_program.max_propagation)
+            n_tiles = max(1, min(2 * threads, X // min_height))
+        self.bounds = tile_bounds(X, n_tiles)
+
+        T = len(self.bounds) - 1
+        self._ok = np.zeros((T, max(1, len(self.gene_program))), dtype=np.bool_)
+        self._alive = np.zeros(T, dtype=np.int64)
+
+    @telemetry.instrumented
+    def update_grid(self):
+        status = np.ascontiguousarray(self.cell_status, dtype=np.int8)
+        genes = np.ascontiguousarray(self.gene_content, dtype=np.int8)
+        new_status = self._other(self._status_buffers, status)
+        new_genes = self._other(self._gene_buffers, genes)
+
+        if NUMBA_AVAILABLE and self.n_threads is not None:
+            numba.set_num_threads(self.n_threads)
+        _parallel_step(status, genes, new_status, new_genes,
+                       self._nb, self._ok, self._alive, self.bounds,
+                       self._nb_masks,
+                       self._a_pos, self._a_neg, self._a_n,
+                       self.alive_program.needs_isolated,
+                       self._g_pos, self._g_neg, self._g_n,
+                       self.gene_program.needs_isolated,
+                       self._g_start, self._g_conds, self._g_gene,
+                       self._g_radius, self._masks, self._center)
+
+        self.cell_status = new_status
+        self.gene_content = new_genes
@@ -0,0 +1,176 @@
+"""
+Vectorized hex grid rendering for the pygame interface.
+
+The hexagons are rasterized once, with the same pygame polygons and the
+same drawing order as before, into a label image giving for every pixel
+the cell it belongs to (or background / outline). A frame is then a gather
+of per-cell colours through that image, written with surfarray; only the
+pixels of cells whose colour changed since the last frame are rewritten.
+
+Cell colours come from palette indices: the gene vectors of the alive
+cells are bit-packed and made unique in one numpy call, so the colour
+lookup runs once per distinct gene vector instead of once per cell.
+"""
+import math
+
+import numpy as np
+import pygame
+
+import src.bitpack as bitpack
+
+BACKGROUND, OUTLINE = -1, -2
+
+
+def hex_center(i, j, cell_size):
+    """
+    Pixel centre (x, y) of cell (i, j): columns j go right, 3 * cell_size
+    apart, rows i go down; even columns are shifted half a row down, which
+    matches the neighbourhood of the automaton (see utils.hex_offsets).
+    Works on arrays of indices.
+    """
+    width = math.sqrt(3) * cell_size
+    x = 2 * cell_size + 3 * cell_size * (np.asarray(j) + 1)
+    y = 2 * cell_size + 2 * width * np.asarray(i) + width * (np.asarray(j) % 2 == 0)
+    return x, y
+
+
+def pixel_to_cell(x, y, cell_size):
+    """
+    Cell (i, j) whose hexagon contains pixel (x, y), the inverse of
+    hex_center; works on arrays. The hexagons tile the plane, so this is
+    constant time: convert to fractional axial coordinates around the
+    centre of cell (0, 0), round in cube coordinates, then convert to
+    rows. Indices are not bounds-checked.
+    """
+    radius = 2 * cell_size
+    width = math.sqrt(3) * cell_size
+    px = np.asarray(x, dtype=np.float64) - 5 * cell_size
+    py = np.asarray(y, dtype=np.float64) - (2 * cell_size + width)
+    q = 2 / 3 * px / radius
+    r = (-px / 3 + math.sqrt(3) / 3 * py) / radius
+    s = -q - r
+    rq, rr, rs = np.rint(q), np.rint(r), np.rint(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    j = rq.astype(np.int64)
+    i = rr.astype(np.int64) + (j + (j & 1)) // 2
+    return i, j
+
+
+def polygon_points(center, size):
+    """Corners of the flat-topped hexagon drawn around center."""
+    height = size
+    width = math.sqrt(3) * size
+    return [(center[0] - height, center[1] + width),
+            (center[0] + height, center[1] + width),
+            (center[0] + 2 * height, center[1]),
+            (center[0] + height, center[1] - width),
+            (center[0] - height, center[1] - width),
+            (center[0] - 2 * height, center[1])]
+
+
+def point_in_polygon(point, polygon):
+    """Check if a point is inside a polygon using ray casting algorithm"""
+    x, y = point
+    n = len(polygon)
+    inside = False
+    p1x, p1y = polygon[0]
+    for i in range(n + 1):
+        p2x, p2y = polygon[i % n]
+        if y > min(p1y, p2y):
+            if y <= max(p1y, p2y):
+                if x <= max(p1x, p2x):
+                    if p1y != p2y:
+                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+                    if p1x == p2x or x <= xinters:
+                        inside = not inside
+        p1x, p1y = p2x, p2y
+    return inside
+
+
+def palette_indices(cell_status, gene_content):
+    """
+    Index of the gene vector of every cell in `vectors` (K, G), the distinct
+    gene vectors of the alive cells; dead cells get -1.
+    """
+    G = gene_content.shape[0]
+    alive = np.flatnonzero(cell_status)
+    words = bitpack.pack_genes(gene_content).reshape(-1, cell_status.size)[:, alive]
+    unique, inverse = np.unique(words.T, axis=0, return_inverse=True)
+    indices = np.full(cell_status.shape, -1, dtype=np.int64)
+    indices.flat[alive] = inverse.reshape(-1)
+    return indices, bitpack.unpack_genes(unique.T, G).T
+
+
+class HexRenderer:
+    """
+    Draws an X by Y hex grid on a surface of the given size from a (X, Y, 3)
+    array of cell colours.
+    """
+
+    def __init__(self, X, Y, cell_size, size,
+                 background=(20, 20, 20), outline=(255, 255, 255)):
+        if X * Y >= 0xFFFFFF:
+            raise ValueError("grid too large for the label image")
+        self.X, self.Y = X, Y
+        self.cell_size = cell_size
+        self.surface = pygame.Surface(size)
+
+        labels = self._rasterize(size)
+        self._labels = labels.reshape(-1)
+        self._pixels = np.empty(labels.shape + (3,), dtype=np.uint8)
+        flat = self._pixels.reshape(-1, 3)
+        flat[self._labels == BACKGROUND] = background
+        flat[self._labels == OUTLINE] = outline
+
+        # Pixels grouped by cell, for redrawing a few cells at once.
+        order = np.argsort(self._labels, kind="stable")
+        first_cell = np.searchsorted(self._labels[order], 0)
+        self._cell_pixels = order[first_cell:]
+        counts = np.bincount(self._labels[self._cell_pixels], minlength=X * Y)
+        self._counts = counts
+        self._starts = np.cumsum(counts) - counts
+        self._colors = None
+
+    def _rasterize(self, size):
+        """Label image (width, height): cell index i * Y + j, or BACKGROUND / OUTLINE."""
+        canvas = pygame.Surface(size)
+        canvas.fill((0, 0, 0))
+        outline_code = (255, 255, 255)
+        for i in range(self.X):
+            centers = zip(*hex_center(i, np.arange(self.Y), self.cell_size))
+            for j, center in enumerate(centers):
+                code = i * self.Y + j + 1
+                points = polygon_points(center, self.cell_size)
+                pygame.draw.polygon(canvas, (code >> 16, (code >> 8) & 255, code & 255), points)
+                pygame.draw.polygon(canvas, outline_code, points, width=1)
+        rgb = pygame.surfarray.array3d(canvas).astype(np.int64)
+        codes = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+        labels = codes - 1
+        labels[codes == 0xFFFFFF] = OUTLINE
+        return labels.astype(np.int64)
+
+    def render(self, colors):
+        """Update the surface with the (X, Y, 3) colours; returns it."""
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        flat = self._pixels.reshape(-1, 3)
+        if self._colors is None:
+            dirty = None
+        else:
+            dirty = np.flatnonzero((colors != self._colors).any(axis=1))
+            if len(dirty) == 0:
+                return self.surface
+        if dirty is None or len(dirty) > len(colors) // 4:
+            pixels = self._cell_pixels
+            flat[pixels] = colors[self._labels[pixels]]
+        else:
+            lengths = self._counts[dirty]
+            offsets = np.cumsum(lengths) - lengths
+            ranks = np.arange(lengths.sum()) + np.repeat(self._starts[dirty] - offsets, lengths)
+            flat[self._cell_pixels[ranks]] = np.repeat(colors[dirty], lengths, axis=0)
+        self._colors = colors.copy()
+        pygame.surfarray.blit_array(self.surface, self._pixels)
+        return self.surface
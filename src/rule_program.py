@@ -0,0 +1,121 @@
+"""
+Compiled rule program.
+
+read_rules_file returns one AndRule per `||` alternative. A RuleProgram
+compiles such a list once into arrays so that a generation evaluates every
+rule in a few batched operations:
+
+- identical conditions (positive genes, negative genes, n_neighboor) are
+  deduplicated and checked together against bit-packed gene words, one
+  broadcast AND/compare per 64-gene word for all conditions at once;
+- rules sharing a target gene and a propagation radius form a group whose
+  source cells are OR-ed, so each group needs a single convolution.
+"""
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+import src.bitpack as bitpack
+
+NO_NEIGHBOOR = -1
+
+
+@dataclass
+class RuleGroup:
+    active_gene: int
+    propagation: int
+    conditions: np.ndarray   # indices into RuleProgram condition arrays
+
+
+@dataclass
+class RuleProgram:
+    G: int
+    W: int
+    positive: np.ndarray     # (C, W) uint64, one row per unique condition
+    negative: np.ndarray     # (C, W) uint64
+    n_neighboor: np.ndarray  # (C,) int64, NO_NEIGHBOOR when unconstrained
+    groups: List[RuleGroup]
+
+    def __len__(self):
+        return len(self.n_neighboor)
+
+    @property
+    def needs_isolated(self):
+        """True if some condition matches cells with zero neighbours."""
+        return bool(np.any(self.n_neighboor == 0))
+
+    @property
+    def max_propagation(self):
+        return max((group.propagation for group in self.groups), default=0)
+
+    def match(self, words, neighbours, potential):
+        """
+        Evaluate every condition on K cells at once.
+
+        words      : (W, K) uint64 packed genes of the cells
+        neighbours : (K,) neighbour counts
+        potential  : (K,) bool, used by conditions without n(...)
+        Returns a (C, K) boolean array.
+        """
+        K = words.shape[1]
+        ok = np.ones((len(self), K), dtype=bool)
+        # A gene both required and forbidden can never be satisfied.
+        ok[(self.positive & self.negative).any(axis=1)] = False
+        care = self.positive | self.negative
+        for w in range(self.W):
+            if not care[:, w].any():
+                continue
+            ok &= (words[w][None, :] & care[:, w, None]) == self.positive[:, w, None]
+
+        constrained = self.n_neighboor != NO_NEIGHBOOR
+        if constrained.any():
+            ok[constrained] &= neighbours[None, :] == self.n_neighboor[constrained, None]
+        if not constrained.all():
+            ok[~constrained] &= np.asarray(potential, dtype=bool)[None, :]
+        return ok
+
+    def evaluate(self, words, neighbours, potential):
+        """
+        Yields (group, hit) with hit a (K,) boolean array of the cells where
+        at least one rule of the group applies. Groups with no hit are skipped.
+        """
+        if len(self) == 0:
+            return
+        ok = self.match(words, neighbours, potential)
+        for group in self.groups:
+            hit = ok[group.conditions].any(axis=0)
+            if hit.any():
+                yield group, hit
+
+
+def compile_rules(rules, G) -> RuleProgram:
+    """Compile a list of AndRule sharing G genes into a RuleProgram."""
+    W = bitpack.n_words(G)
+    conditions = {}
+    grouped = {}
+    for rule in rules:
+        key = (tuple(sorted(int(g) for g in rule.positive_genes)),
+               tuple(sorted(int(g) for g in rule.negative_genes)),
+               NO_NEIGHBOOR if rule.n_neighboor is None else int(rule.n_neighboor))
+        index = conditions.setdefault(key, len(conditions))
+        target = (int(rule.active_gene), int(rule.propagation))
+        members = grouped.setdefault(target, [])
+        if index not in members:
+            members.append(index)
+
+    keys: List[Tuple] = list(conditions)
+    positive = np.zeros((len(keys), W), dtype=np.uint64)
+    negative = np.zeros((len(keys), W), dtype=np.uint64)
+    for i, (pos, neg, _) in enumerate(keys):
+        positive[i] = bitpack.gene_mask(pos, W)
+        negative[i] = bitpack.gene_mask(neg, W)
+
+    return RuleProgram(
+        G=G, W=W,
+        positive=positive,
+        negative=negative,
+        n_neighboor=np.array([k[2] for k in keys], dtype=np.int64),
+        groups=[RuleGroup(gene, radius, np.array(members, dtype=np.intp))
+                for (gene, radius), members in grouped.items()],
+    )
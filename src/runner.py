@@ -0,0 +1,212 @@
+"""
+Headless batch runner.
+
+Steps a CellGrid as fast as possible without the pygame interface, so that
+simulations can run on machines with no display. Nothing on this path
+imports pygame.
+
+    python -m src.runner confs/firework -x 200 -y 200 -n 500 --every 50 --out runs/firework
+"""
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+import src.telemetry as telemetry
+from src.cycles import CycleDetector
+from src.trajectory import TrajectoryWriter
+
+
+def load_folder(folder, X=100, Y=100, engine="dense"):
+    """Build a CellGrid from a conf folder holding rules.txt and initial_cell.txt."""
+    folder = Path(folder)
+    rules_file = folder / "rules.txt"
+    initial_file = folder / "initial_cell.txt"
+    missing_files = [f.name for f in (rules_file, initial_file) if not f.exists()]
+    if missing_files:
+        raise FileNotFoundError(
+            f"The following required file(s) are missing in '{folder}': "
+            f"{', '.join(missing_files)}"
+        )
+    return cellStatus.initialise_grid(rules_file, initial_file, X, Y,
+                                      engine=engine)
+
+
+def grid_statistics(grid):
+    """Alive-cell count and number of cells expressing each gene."""
+    return {
+        "alive": int(np.count_nonzero(grid.cell_status)),
+        "genes": np.count_nonzero(grid.gene_content, axis=(1, 2)).tolist(),
+    }
+
+
+def save_snapshot(grid, path):
+    np.savez_compressed(path,
+                        cell_status=grid.cell_status,
+                        gene_content=grid.gene_content)
+
+
+class Runner:
+    """
+    Advance a grid for a fixed number of generations.
+
+    Every `every` generations (and on the first and last one) a statistics
+    row is recorded and, when `out_dir` is given, written to stats.csv
+    together with a compressed snapshot of the grid. every=0 only records
+    the first and last generations.
+
+    When `trajectory` is given, every generation is also appended to that
+    trajectory file (see src/trajectory.py).
+
+    With max_period > 0, every generation is checked for a fixed point or a
+    cycle of period <= max_period (see src/cycles.py); the result is kept in
+    `cycle`. If stop_on_cycle is set, run() then returns early, after
+    recording the generation that closed the cycle.
+    """
+
+    def __init__(self, grid, out_dir=None, every=0, snapshots=True,
+                 trajectory=None, max_period=0, stop_on_cycle=False):
+        self.grid = grid
+        self.detector = CycleDetector(max_period) if max_period > 0 else None
+        self.stop_on_cycle = stop_on_cycle
+        self.trajectory = None
+        if trajectory is not None:
+            self.trajectory = TrajectoryWriter(trajectory, grid.X, grid.Y, grid.G)
+        self.every = every
+        self.snapshots = snapshots
+        self.out_dir = None if out_dir is None else Path(out_dir)
+        self.generation = 0
+        self.history = []
+        self._csv = None
+        self._writer = None
+
+    @property
+    def cycle(self):
+        return None if self.detector is None else self.detector.cycle
+
+    def _should_record(self, generation, last):
+        if generation == 0 or generation == last:
+            return True
+        return self.every > 0 and generation % self.every == 0
+
+    def _open(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        if self.snapshots:
+            (self.out_dir / "snapshots").mkdir(exist_ok=True)
+        self._csv = open(self.out_dir / "stats.csv", "w", newline="")
+        self._writer = csv.writer(self._csv)
+        self._writer.writerow(
+            ["generation", "elapsed", "alive"] + list(self.grid.gene_names)
+        )
+
+    def _record(self, elapsed):
+        stats = grid_statistics(self.grid)
+        row = {"generation": self.generation, "elapsed": elapsed, **stats}
+        self.history.append(row)
+        if self._writer is not None:
+            self._writer.writerow(
+                [self.generation, f"{elapsed:.6f}", stats["alive"]] + stats["genes"]
+            )
+            self._csv.flush()
+            if self.snapshots:
+                save_snapshot(self.grid, self.out_dir / "snapshots"
+                              / f"gen_{self.generation:06d}.npz")
+        return row
+
+    def run(self, generations):
+        last = self.generation + generations
+        if self.out_dir is not None and self._writer is None:
+            self._open()
+        start = time.perf_counter()
+        if not self.history:
+            self._record(0.0)
+            if self.trajectory is not None:
+                self.trajectory.append_grid(self.grid)
+            if self.detector is not None:
+                self.detector.observe_grid(self.grid)
+        try:
+            while self.generation < last:
+                if self.stop_on_cycle and self.cycle is not None:
+                    break
+                self.grid.update_grid()
+                self.generation += 1
+                if self.trajectory is not None:
+                    self.trajectory.append_grid(self.grid)
+                found = False
+                if self.detector is not None and self.detector.cycle is None:
+                    found = self.detector.observe_grid(self.grid) is not None
+                if self._should_record(self.generation, last) or (found and self.stop_on_cycle):
+                    self._record(time.perf_counter() - start)
+        finally:
+            if self._csv is not None:
+                self._csv.flush()
+        return self.history
+
+    def close(self):
+        if self.trajectory is not None:
+            self.trajectory.close()
+        if self._csv is not None:
+            self._csv.close()
+            self._csv = None
+            self._writer = None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="One Cell Wonder (headless)")
+    parser.add_argument("folderpath", help="path to the folder with: rules.txt and initial_cell.txt")
+    parser.add_argument("-x", "--X", help="width", type=int, default=100)
+    parser.add_argument("-y", "--Y", help="height", type=int, default=100)
+    parser.add_argument("--engine", help="grid implementation", choices=sorted(cellStatus.ENGINES), default="dense")
+    parser.add_argument("-n", "--generations", help="number of generations to run", type=int, default=100)
+    parser.add_argument("--every", help="record statistics every N generations (0: first and last only)", type=int, default=0)
+    parser.add_argument("--out", help="output folder for stats.csv and snapshots", default=None)
+    parser.add_argument("--no-snapshots", help="only write statistics", action="store_true", default=False)
+    parser.add_argument("--trajectory", help="write every generation to this trajectory file", default=None)
+    parser.add_argument("--max-period", help="detect fixed points and cycles up to this period (0: off)", type=int, default=0)
+    parser.add_argument("--stop-on-cycle", help="stop as soon as a cycle is detected", action="store_true", default=False)
+    parser.add_argument("--telemetry", help="write per-generation phase timings to this JSONL file (see src/telemetry.py)", default=None)
+    return parser
+
+
+def run_from_args(args):
+    try:
+        grid = load_folder(args.folderpath, args.X, args.Y, engine=args.engine)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    runner = Runner(grid, out_dir=args.out, every=args.every,
+                    snapshots=not args.no_snapshots,
+                    trajectory=args.trajectory,
+                    max_period=args.max_period,
+                    stop_on_cycle=args.stop_on_cycle)
+    if getattr(args, "telemetry", None):
+        telemetry.start(args.telemetry)
+    try:
+        history = runner.run(args.generations)
+    finally:
+        telemetry.stop()
+        runner.close()
+
+    last = history[-1]
+    rate = last["generation"] / last["elapsed"] if last["elapsed"] > 0 else float("inf")
+    print(f"{last['generation']} generations in {last['elapsed']:.3f}s "
+          f"({rate:.1f} gen/s), {last['alive']} alive cells")
+    if runner.cycle is not None:
+        start, period = runner.cycle
+        kind = "fixed point" if period == 1 else f"cycle of period {period}"
+        print(f"{kind} reached at generation {start}")
+    return history
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    run_from_args(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Background stepping for the interactive viewer.
+
+Simulation runs `step` then `snapshot` in a worker thread and queues the
+snapshots in a bounded ring buffer; the viewer takes them out at its own
+frame rate. The worker runs ahead of the viewer by at most `capacity`
+generations, then waits until one is taken, so a paused viewer does not
+let it run away. The compiled engine kernels release the GIL, so stepping
+and drawing overlap.
+
+    simulation = Simulation(grid.update_grid, lambda: grid.cell_status.copy())
+    simulation.start()
+    state = simulation.get(timeout=1.0)   # None if not ready in time
+    simulation.stop()
+
+An exception raised by `step` or `snapshot` stops the worker and is raised
+again by the next `get` once the generations produced before it are taken.
+"""
+import threading
+from collections import deque
+
+
+class Simulation:
+
+    def __init__(self, step, snapshot, capacity=32):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.step = step
+        self.snapshot = snapshot
+        self.capacity = capacity
+        self.produced = 0        # generations stepped so far
+        self.error = None
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while len(self._buffer) >= self.capacity and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+            try:
+                self.step()
+                state = self.snapshot()
+            except BaseException as e:
+                with self._condition:
+                    self.error = e
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self._buffer.append(state)
+                self.produced += 1
+                self._condition.notify_all()
+
+    def ready(self):
+        """Number of generations waiting in the buffer."""
+        with self._condition:
+            return len(self._buffer)
+
+    def get(self, timeout=None):
+        """
+        Oldest generation not yet taken. Waits for it up to `timeout`
+        seconds (forever if None, not at all if 0) and returns None if it
+        is not ready by then.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._buffer or self.error is not None
+                                            or not self._thread.is_alive(), timeout):
+                return None
+            if self._buffer:
+                state = self._buffer.popleft()
+                self._condition.notify_all()
+                return state
+            if self.error is not None:
+                raise self.error
+            return None
+
+    def stop(self):
+        """Stop the worker after its current step and wait for it."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,249 @@
+"""
+Parameter sweeps.
+
+Runs many headless simulations, one per combination of rules file, initial
+cells file and grid size, on a process pool. Each worker warms up the
+engine kernels when it starts (src/warmup.py): it loads them from the
+on-disk kernel cache, or compiles them once, so runs do not pay the JIT.
+Summary metrics are appended to a CSV table as soon as each run finishes;
+rerunning the same sweep on the same table skips the runs already in it.
+A run is identified by its parameters and the contents of its rules and
+initial cells files, so editing a file reruns its runs; runs that failed
+are retried, their new row appended after the failed one. max_period is
+not part of the identity: it does not change the final state of a run,
+only whether its transient and period get filled in.
+
+Runs stop stepping once they reach a fixed point or a cycle of period
+<= max_period (src/cycles.py): the final generation is then read from the
+cycle, so the table is the same as without early stopping.
+
+    python -m src.sweep --folder confs/firework confs/2CT --size 100x100 200x200 \\
+        -n 200 --engine fused -j 8 --out sweep.csv
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+from src.cycles import CycleDetector
+from src.trajectory import pack_state
+from src.warmup import warm_up_all
+
+FIELDS = ["run_id", "rules", "initial", "X", "Y", "generations", "engine",
+          "alive", "genes", "state_hash", "transient", "period", "stepped",
+          "elapsed", "error"]
+
+
+@dataclass(frozen=True)
+class RunSpec:
+    rules: str
+    initial: str
+    X: int
+    Y: int
+    generations: int
+    engine: str = "dense"
+
+    @cached_property
+    def run_id(self):
+        contents = [file_digest(self.rules), file_digest(self.initial)]
+        key = json.dumps({**asdict(self), "contents": contents}, sort_keys=True).encode()
+        return hashlib.sha1(key).hexdigest()[:16]
+
+
+def file_digest(path):
+    """sha1 of a file's contents, None if it cannot be read."""
+    try:
+        return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def expand(rules_files, initial_files, sizes, generations, engine="dense"):
+    """Every combination of rules file, initial cells file and (X, Y) size."""
+    return [RunSpec(str(rules), str(initial), X, Y, generations, engine)
+            for rules, initial, (X, Y) in itertools.product(rules_files, initial_files, sizes)]
+
+
+def folder_specs(folders, sizes, generations, engine="dense"):
+    """Runs of conf folders, each with its own rules.txt and initial_cell.txt."""
+    return [spec
+            for folder in folders
+            for spec in expand([Path(folder) / "rules.txt"],
+                               [Path(folder) / "initial_cell.txt"],
+                               sizes, generations, engine)]
+
+
+def state_hash(cell_status, gene_content):
+    """Hash of the bit-packed cell_status and gene_content."""
+    return hashlib.sha1(pack_state(cell_status, gene_content).tobytes()).hexdigest()
+
+
+def run_one(spec, max_period=16):
+    """
+    Run one simulation and return its row of the result table. With
+    max_period > 0 it stops stepping at the first fixed point or cycle of
+    period <= max_period; transient and period are left empty otherwise.
+    """
+    row = {"run_id": spec.run_id, **asdict(spec),
+           "alive": "", "genes": "", "state_hash": "", "transient": "", "period": "",
+           "stepped": "", "elapsed": "", "error": ""}
+    start = time.perf_counter()
+    try:
+        grid = cellStatus.initialise_grid(spec.rules, spec.initial, spec.X, spec.Y,
+                                          engine=spec.engine)
+        detector = CycleDetector(max_period) if max_period > 0 else None
+        if detector is not None:
+            detector.observe_grid(grid)
+        stepped = 0
+        while stepped < spec.generations:
+            if detector is not None and detector.cycle is not None:
+                break
+            grid.update_grid()
+            stepped += 1
+            if detector is not None:
+                detector.observe_grid(grid)
+        if detector is not None and detector.cycle is not None:
+            cell_status, gene_content = detector.state_at(spec.generations)
+            row["transient"], row["period"] = detector.cycle
+        else:
+            cell_status, gene_content = grid.cell_status, grid.gene_content
+        row["alive"] = int(np.count_nonzero(cell_status))
+        row["genes"] = json.dumps(np.count_nonzero(gene_content, axis=(1, 2)).tolist())
+        row["state_hash"] = state_hash(cell_status, gene_content)
+        row["stepped"] = stepped
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["elapsed"] = f"{time.perf_counter() - start:.6f}"
+    return row
+
+
+def completed_runs(path):
+    """run_id of the rows of a result table that did not fail."""
+    path = Path(path)
+    if not path.exists():
+        return set()
+    with open(path, newline="") as f:
+        return {row["run_id"] for row in csv.DictReader(f) if not row["error"]}
+
+
+def upgrade_table(path):
+    """
+    Make the header of an existing result table FIELDS before rows are
+    appended to it. Tables of earlier versions, whose columns are all in
+    FIELDS, are rewritten with the new columns empty; any other header
+    raises ValueError rather than misaligning the appended rows.
+    """
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames or []
+        if header == FIELDS:
+            return
+        unknown = [name for name in header if name not in FIELDS]
+        if unknown:
+            raise ValueError(f"{path} is not a sweep result table: unknown columns {unknown}")
+        rows = list(reader)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+    tmp.replace(path)
+
+
+def sweep(specs, out, workers=None, callback=None, max_period=16):
+    """
+    Run every spec not yet in the `out` CSV table and append its row there
+    as soon as it finishes. Returns the rows produced by this call.
+    """
+    out = Path(out)
+    upgrade_table(out)
+    done = completed_runs(out)
+    todo = [spec for spec in dict.fromkeys(specs) if spec.run_id not in done]
+    engines = sorted({spec.engine for spec in todo})
+    rows = []
+    if not todo:
+        return rows
+
+    new_file = not out.exists() or out.stat().st_size == 0
+    with open(out, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if new_file:
+            writer.writeheader()
+            f.flush()
+        # Workers are spawned, not forked: forking a process whose Numba
+        # thread pool is already running (parallel engine, batches) can hang.
+        with ProcessPoolExecutor(max_workers=workers, initializer=_warm_up_all,
+                                 initargs=(engines,),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(run_one, spec, max_period) for spec in todo]
+            for future in as_completed(futures):
+                row = future.result()
+                writer.writerow(row)
+                f.flush()
+                rows.append(row)
+                if callback is not None:
+                    callback(row)
+    return rows
+
+
+def _warm_up_all(engines):
+    warm_up_all(engines)
+
+
+def _size(text):
+    X, Y = text.lower().split("x")
+    return int(X), int(Y)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="One Cell Wonder parameter sweep")
+    parser.add_argument("--folder", nargs="*", default=[], help="conf folders with rules.txt and initial_cell.txt")
+    parser.add_argument("--rules", nargs="*", default=[], help="rules files, combined with every --initial file")
+    parser.add_argument("--initial", nargs="*", default=[], help="initial cells files")
+    parser.add_argument("--size", nargs="+", type=_size, default=[(100, 100)], help="grid sizes as XxY")
+    parser.add_argument("-n", "--generations", type=int, default=100)
+    parser.add_argument("--engine", choices=sorted(cellStatus.ENGINES), default="dense")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--out", default="sweep.csv", help="result table, also used to resume")
+    parser.add_argument("--max-period", type=int, default=16,
+                        help="stop runs on cycles up to this period (0: always run every generation)")
+    args = parser.parse_args(argv)
+
+    specs = folder_specs(args.folder, args.size, args.generations, args.engine)
+    specs += expand(args.rules, args.initial, args.size, args.generations, args.engine)
+    if not specs:
+        parser.error("nothing to run: give --folder or --rules and --initial")
+
+    try:
+        upgrade_table(args.out)
+    except ValueError as e:
+        parser.error(str(e))
+    total = len(specs)
+    skipped = len({s.run_id for s in specs} & completed_runs(args.out))
+
+    def report(row):
+        status = row["error"] or f"{row['alive']} alive"
+        if row["period"] != "":
+            status += f", period {row['period']} from generation {row['transient']}"
+        print(f"{row['rules']} {row['initial']} {row['X']}x{row['Y']}: {status} ({float(row['elapsed']):.2f}s)")
+
+    rows = sweep(specs, args.out, workers=args.workers, callback=report,
+                 max_period=args.max_period)
+    print(f"{len(rows)} runs done, {skipped} already in {args.out}, {total} in the sweep")
+
+
+if __name__ == "__main__":
+    main()
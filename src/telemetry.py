@@ -0,0 +1,231 @@
+"""
+Step telemetry.
+
+While recording, every generation stepped by an engine produces one event,
+a JSON-compatible dict:
+
+    {"event": "generation", "engine": "CellGrid", "generation": 3,
+     "seconds": 0.0012, "alive": 250, "births": 12,
+     "phases": {"create_alive_cell": ..., "create_alive_cell.neighbours": ...,
+                "propagate_genes.distance": ..., ...},
+     "rules": [{"gene": 1, "radius": 4, "sources": 80,
+                "distance_seconds": ..., "express_seconds": ...}, ...],
+     "convolutions": [{"method": "sparse", "reason": "cost model",
+                       "costs": {"sparse": ..., "dense": ..., "fft": ...},
+                       "n": 1, "X": 100, "Y": 100, "active": 250,
+                       "scanned": 10000, "seconds": ...}, ...],
+     "peak_bytes": ...}
+
+Phase times are in seconds, nested phases are named "outer.inner".
+"rules" has one entry per rule group (same expressed gene and radius) of
+the CellGrid engines; groups applying on the same cells share one
+distance field, whose time is repeated in each of their entries.
+"convolutions" lists the utils.adaptive_convolution calls with the path
+taken and why ("forced", "threshold" or "cost model", with the modelled
+costs). "peak_bytes" is only there when recording allocations
+(tracemalloc, slow). Convolutions outside a generation are events of their
+own ({"event": "convolution", ...}).
+
+    with telemetry.recording("steps.jsonl"):      # or any callable
+        for _ in range(100):
+            grid.update_grid()
+
+When nothing is recording, the hooks cost one global lookup each.
+"""
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+recorder = None
+_local = threading.local()
+
+
+class _Null:
+    """Context manager doing nothing, returned by the hooks when not recording."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _Null()
+
+
+class JsonlWriter:
+    """Event sink appending one JSON line per event to a file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "a")
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class Recorder:
+    """Collects the hooks of the current generation and emits events to `sink`."""
+
+    def __init__(self, sink, allocations=False):
+        self.sink = sink
+        self.allocations = allocations
+        self._generations = {}   # id(grid) -> generations recorded
+
+    def emit(self, event):
+        self.sink(event)
+
+
+class _Generation:
+
+    def __init__(self, rec, grid):
+        self.rec = rec
+        self.grid = grid
+
+    def __enter__(self):
+        self.event = {"event": "generation", "engine": type(self.grid).__name__,
+                      "generation": self.rec._generations.get(id(self.grid), 0) + 1,
+                      "phases": {}, "rules": [], "convolutions": []}
+        self.rec._generations[id(self.grid)] = self.event["generation"]
+        self.stack = []
+        _local.generation = self
+        if self.rec.allocations:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.event["seconds"] = time.perf_counter() - self.start
+        if self.rec.allocations:
+            self.event["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        _local.generation = None
+        if exc[0] is None:
+            self.event["alive"] = int((self.grid.cell_status != 0).sum())
+            self.rec.emit(self.event)
+        return False
+
+
+class _Phase:
+
+    def __init__(self, generation, name):
+        self.generation = generation
+        self.name = name
+
+    def __enter__(self):
+        stack = self.generation.stack
+        stack.append(self.name)
+        self.key = ".".join(stack)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        phases = self.generation.event["phases"]
+        phases[self.key] = phases.get(self.key, 0.0) + elapsed
+        self.generation.stack.pop()
+        return False
+
+
+def _current():
+    return getattr(_local, "generation", None)
+
+
+def generation(grid):
+    """Context of one generation of `grid`; nested generations are ignored."""
+    rec = recorder
+    if rec is None or _current() is not None:
+        return _NULL
+    return _Generation(rec, grid)
+
+
+def instrumented(update_grid):
+    """Decorator recording each call of an engine's update_grid as a generation."""
+    @functools.wraps(update_grid)
+    def wrapper(self):
+        if recorder is None:
+            return update_grid(self)
+        with generation(self):
+            return update_grid(self)
+    return wrapper
+
+
+def phase(name):
+    """Context timing a phase of the current generation."""
+    if recorder is None:
+        return _NULL
+    current = _current()
+    if current is None:
+        return _NULL
+    return _Phase(current, name)
+
+
+def rule(**fields):
+    """Add a rule group entry to the current generation."""
+    current = _current() if recorder is not None else None
+    if current is not None:
+        current.event["rules"].append(fields)
+
+
+def convolution(**fields):
+    """Add a convolution entry to the current generation, or emit it."""
+    rec = recorder
+    if rec is None:
+        return
+    current = _current()
+    if current is None:
+        rec.emit({"event": "convolution", **fields})
+    else:
+        current.event["convolutions"].append(fields)
+
+
+def count(key, n):
+    """Set a count of the current generation, e.g. births."""
+    current = _current() if recorder is not None else None
+    if current is not None:
+        current.event[key] = n
+
+
+def start(sink, allocations=False):
+    """
+    Start recording to `sink`, a callable taking each event or a path of a
+    JSONL file. Returns the Recorder.
+    """
+    global recorder
+    if not callable(sink):
+        sink = JsonlWriter(sink)
+    recorder = Recorder(sink, allocations=allocations)
+    return recorder
+
+
+def stop():
+    """Stop recording; closes the JSONL file started by `start`."""
+    global recorder
+    rec, recorder = recorder, None
+    if rec is not None and isinstance(rec.sink, JsonlWriter):
+        rec.sink.close()
+    return rec
+
+
+class recording:
+    """`with recording(sink):` records the generations stepped in the block."""
+
+    def __init__(self, sink, allocations=False):
+        self.sink = sink
+        self.allocations = allocations
+
+    def __enter__(self):
+        return start(self.sink, allocations=self.allocations)
+
+    def __exit__(self, *exc):
+        stop()
+        return False
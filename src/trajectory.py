@@ -0,0 +1,240 @@
+"""
+Compressed on-disk trajectories.
+
+A trajectory file stores one record per generation. Every
+`keyframe_interval` generations the bit-packed state (cell_status then
+gene_content, one bit per value) is stored as a keyframe; the generations
+in between store the XOR of their packed state with that keyframe. Records
+are zlib-compressed. Since deltas are taken against the keyframe rather
+than the previous generation, loading any generation reads at most two
+records.
+
+Layout:
+    header  : MAGIC, uint32 length, JSON {"X", "Y", "G", "keyframe_interval"}
+    records : RECORD, uint8 kind, uint64 size, zlib payload
+    index   : (n, 3) uint64 array of (offset, size, kind), written on close
+    footer  : uint64 index offset, uint64 n, END
+
+A file that was not closed (no footer) is still readable: the index is
+rebuilt by scanning the record headers.
+"""
+import json
+import struct
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+import src.utils as utils
+
+MAGIC = b"OCWTRAJ1"
+RECORD = b"RC"
+END = b"OCWTEND1"
+KEYFRAME, DELTA = 0, 1
+
+_RECORD_HEADER = struct.Struct("<2sBQ")
+_FOOTER = struct.Struct("<QQ8s")
+
+
+def pack_state(cell_status, gene_content):
+    """Bit-pack a generation into a flat uint8 array."""
+    return np.concatenate([
+        np.packbits(np.asarray(cell_status).astype(bool, copy=False).ravel()),
+        np.packbits(np.asarray(gene_content).astype(bool, copy=False).ravel()),
+    ])
+
+
+def unpack_state(packed, X, Y, G):
+    n_status = -(-X * Y // 8)
+    cell_status = np.unpackbits(packed[:n_status], count=X * Y)
+    gene_content = np.unpackbits(packed[n_status:], count=G * X * Y)
+    return (cell_status.reshape(X, Y).astype(np.int8),
+            gene_content.reshape(G, X, Y).astype(np.int8))
+
+
+class _TrajectoryFile:
+    """Index handling and random access shared by the writer and reader."""
+
+    def __init__(self):
+        self._index = []
+        self._cache = (None, None)   # last keyframe read: (generation, packed)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _read_record(self, generation):
+        offset, size, kind = self._index[generation]
+        self._file.seek(offset + _RECORD_HEADER.size)
+        payload = zlib.decompress(self._file.read(size))
+        return kind, np.frombuffer(payload, dtype=np.uint8)
+
+    def _keyframe(self, generation):
+        if self._cache[0] != generation:
+            kind, packed = self._read_record(generation)
+            if kind != KEYFRAME:
+                raise ValueError(f"Corrupted trajectory: generation {generation} is not a keyframe")
+            self._cache = (generation, packed)
+        return self._cache[1]
+
+    def read_packed(self, generation):
+        if generation < 0:
+            generation += len(self)
+        if not 0 <= generation < len(self):
+            raise IndexError(f"generation {generation} out of range (0..{len(self) - 1})")
+        key = generation - generation % self.keyframe_interval
+        keyframe = self._keyframe(key)
+        if key == generation:
+            return keyframe
+        _, delta = self._read_record(generation)
+        return keyframe ^ delta
+
+    def __getitem__(self, generation):
+        """(cell_status, gene_content) of a generation."""
+        return unpack_state(self.read_packed(generation), self.X, self.Y, self.G)
+
+
+class TrajectoryWriter(_TrajectoryFile):
+    """
+    Append generations to a new trajectory file. Generations already written
+    can be read back while writing, e.g. to navigate history.
+    """
+
+    def __init__(self, path, X, Y, G, keyframe_interval=64, level=6):
+        super().__init__()
+        self.path = Path(path)
+        self.X, self.Y, self.G = X, Y, G
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self._file = open(self.path, "w+b")
+        header = json.dumps({"X": X, "Y": Y, "G": G,
+                             "keyframe_interval": keyframe_interval}).encode()
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self._last_keyframe = None
+
+    def append(self, cell_status, gene_content):
+        """Write the next generation; returns its index."""
+        packed = pack_state(cell_status, gene_content)
+        generation = len(self._index)
+        if generation % self.keyframe_interval == 0:
+            kind, payload = KEYFRAME, packed
+            self._last_keyframe = packed
+        else:
+            kind, payload = DELTA, packed ^ self._last_keyframe
+        data = zlib.compress(payload.tobytes(), self.level)
+
+        self._file.seek(0, 2)
+        offset = self._file.tell()
+        self._file.write(_RECORD_HEADER.pack(RECORD, kind, len(data)) + data)
+        self._index.append((offset, len(data), kind))
+        return generation
+
+    def append_grid(self, grid):
+        return self.append(grid.cell_status, grid.gene_content)
+
+    def read_packed(self, generation):
+        self._file.flush()
+        position = self._file.tell()
+        try:
+            return super().read_packed(generation)
+        finally:
+            self._file.seek(position)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(0, 2)
+        index_offset = self._file.tell()
+        index = np.array(self._index, dtype=np.uint64).reshape(-1, 3)
+        self._file.write(index.tobytes())
+        self._file.write(_FOOTER.pack(index_offset, len(self._index), END))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryReader(_TrajectoryFile):
+    """Random access to the generations of a trajectory file."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"'{self.path}' is not a trajectory file")
+        (length,) = struct.unpack("<I", self._file.read(4))
+        header = json.loads(self._file.read(length))
+        self.X, self.Y, self.G = header["X"], header["Y"], header["G"]
+        self.keyframe_interval = header["keyframe_interval"]
+        self._records_start = self._file.tell()
+        self._index = self._read_index()
+
+    def _read_index(self):
+        self._file.seek(0, 2)
+        end = self._file.tell()
+        if end - self._records_start >= _FOOTER.size:
+            self._file.seek(end - _FOOTER.size)
+            index_offset, n, magic = _FOOTER.unpack(self._file.read(_FOOTER.size))
+            if magic == END:
+                self._file.seek(index_offset)
+                index = np.frombuffer(self._file.read(n * 24), dtype=np.uint64)
+                return [tuple(int(v) for v in row) for row in index.reshape(-1, 3)]
+        return self._scan(end)
+
+    def _scan(self, end):
+        """Rebuild the index of an unclosed file from the record headers."""
+        index = []
+        offset = self._records_start
+        while offset + _RECORD_HEADER.size <= end:
+            self._file.seek(offset)
+            tag, kind, size = _RECORD_HEADER.unpack(self._file.read(_RECORD_HEADER.size))
+            if tag != RECORD or offset + _RECORD_HEADER.size + size > end:
+                break
+            index.append((offset, size, kind))
+            offset += _RECORD_HEADER.size + size
+        return index
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryHistory:
+    """
+    List-like [cell_status, gene_content, neighbours] history backed by a
+    trajectory file, usable in place of Interface.matrix_history.
+    Neighbour counts are recomputed from cell_status when read.
+    """
+
+    def __init__(self, path, X, Y, G, keyframe_interval=64):
+        self.writer = TrajectoryWriter(path, X, Y, G,
+                                       keyframe_interval=keyframe_interval)
+        self._last = (None, None)
+
+    def __len__(self):
+        return len(self.writer)
+
+    def append(self, entry):
+        self.writer.append(entry[0], entry[1])
+
+    def __getitem__(self, generation):
+        if generation < 0:
+            generation += len(self)
+        if self._last[0] != generation:
+            cell_status, gene_content = self.writer[generation]
+            neighbours = utils.adaptive_convolution(
+                cell_status, 1, self.writer.X, self.writer.Y, include_center=False
+            )
+            self._last = (generation, [cell_status, gene_content, neighbours])
+        return self._last[1]
+
+    def close(self):
+        self.writer.close()
@@ -1,57 +1,170 @@
+import hashlib
+import os
+import shutil
+import time
 import numpy as np
-from scipy.signal import convolve2d
 from functools import lru_cache
+from pathlib import Path
+
+import src.telemetry as telemetry
+
+
+def user_cache_dir():
+    """onecellwonder/ in the user cache directory (XDG_CACHE_HOME or ~/.cache)."""
+    cache = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache) / "onecellwonder"
+
+
+def kernel_cache_dir():
+    """
+    Directory of the compiled kernels. Numba only checks the file defining a
+    kernel to invalidate its cache, not the kernels it calls from other
+    modules (the fused row kernels are inlined by four engines), so the
+    directory is keyed by every source file of the package. The key hashes
+    their sizes and modification times rather than their contents, which
+    keeps it cheap on every import; a checkout that only touches files
+    recompiles once.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return user_cache_dir() / "numba" / digest.hexdigest()[:16]
+
+
+# Kernel caches of this many versions of the sources are kept, the most
+# recently used ones, so that checkouts at different revisions sharing the
+# cache do not delete each other's kernels.
+KERNEL_CACHE_VERSIONS = 4
+
+
+def prune_kernel_caches(keep, versions=KERNEL_CACHE_VERSIONS):
+    """
+    Delete the kernel cache directories next to `keep` but the `versions`
+    most recently used ones (directories are touched when they are loaded);
+    `keep` itself is never deleted.
+    """
+    keep = Path(keep)
+    others = [path for path in keep.parent.iterdir() if path.is_dir() and path != keep]
+    others.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in others[versions - 1:]:
+        shutil.rmtree(path, ignore_errors=True)
+
 
 try:
-    from numba import njit
-    NUMBA_AVAILABLE = True
+    from numba import njit as _njit, prange, config as numba_config
+    # NUMBA_DISABLE_JIT=1 runs the kernels as plain Python.
+    NUMBA_AVAILABLE = not numba_config.DISABLE_JIT
+    # Compiled kernels are cached on disk so that new processes load them
+    # instead of compiling (see src/warmup.py); OCW_NUMBA_CACHE=0 turns this
+    # off. NUMBA_CACHE_DIR, if set, is used as is; otherwise the kernels of
+    # this package go to KERNEL_CACHE_DIR, and the first run of new sources
+    # deletes the least recently used caches of other versions.
+    CACHE_KERNELS = NUMBA_AVAILABLE and os.environ.get("OCW_NUMBA_CACHE") != "0"
+    KERNEL_CACHE_DIR = None
+    if CACHE_KERNELS and not numba_config.CACHE_DIR:
+        KERNEL_CACHE_DIR = kernel_cache_dir()
+        if KERNEL_CACHE_DIR.exists():
+            os.utime(KERNEL_CACHE_DIR)   # mark as used for prune_kernel_caches
+        else:
+            KERNEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            prune_kernel_caches(KERNEL_CACHE_DIR)
+
+    def _decorate(decorator, function):
+        # Numba reads CACHE_DIR when a kernel is decorated: set it for the
+        # kernels of this package only, not for other numba code.
+        previous = numba_config.CACHE_DIR
+        if KERNEL_CACHE_DIR is not None:
+            numba_config.CACHE_DIR = str(KERNEL_CACHE_DIR)
+        try:
+            return decorator(function)
+        finally:
+            numba_config.CACHE_DIR = previous
+
+    def njit(*args, **kwargs):
+        """numba.njit, caching the compiled kernel on disk by default."""
+        kwargs.setdefault("cache", CACHE_KERNELS)
+        decorator = _njit(**kwargs)
+        if len(args) == 1 and callable(args[0]):
+            return _decorate(decorator, args[0])
+        return lambda function: _decorate(decorator, function)
 except ImportError:
     NUMBA_AVAILABLE = False
-    def njit(fn):
-        return fn
+    CACHE_KERNELS = False
+    KERNEL_CACHE_DIR = None
+    prange = range
+    def njit(*args, **kwargs):
+        # Supports both @njit and @njit(...) without numba.
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
 
 
 # ---------------------------------------------------------------------------
 # Mask construction — cached as int8 to avoid per-call astype copies
 # ---------------------------------------------------------------------------
 
+def _hex_distance_window(p, n):
+    """
+    Hex distances from the centre of a (2n + 1) square window centred on a
+    cell of a column of parity p. Even columns are shifted half a row down
+    (as renderer.hex_center draws them), so the axial row of cell (x, y) is
+    x - (y + (y & 1)) // 2 and hex distance is the axial distance.
+    """
+    i, j = np.mgrid[-n:n + 1, -n:n + 1]
+    q = p + j
+    dr = i - (q + (q & 1)) // 2 + (p + (p & 1)) // 2
+    return (np.abs(j) + np.abs(dr) + np.abs(j + dr)) // 2
+
+
 @lru_cache(maxsize=None)
 def makeMask(iseven, n, include_center=False):
-    meven = np.array([[1, 1, 1],[1, 0, 1],[0, 1, 0]])
-    modd  = np.array([[0, 1, 0],[1, 0, 1],[1, 1, 1]])
-    mask = np.zeros((n * 2 + 1, n * 2 + 1))
-    mask[n, n] = 1
-    for _ in range(n):
-        center    = meven if iseven else modd
-        notCenter = modd  if iseven else meven
-        out_even  = convolve2d(mask, center,    mode="same")
-        out_odd   = convolve2d(mask, notCenter, mode="same")
-        rows      = np.arange(mask.shape[0])[None, :]
-        mask      = np.where(rows % 2 == 0, out_even, out_odd)
-    mask = mask > 0
-    mask[n, n] = False
-    if include_center:
-        mask[n, n] = True
+    """
+    Boolean (2n + 1) square mask of the cells within hex distance n of the
+    centre. Column j of the mask lies in an even column of the grid when
+    j and iseven agree on parity (callers pass iseven = n % 2 == 0 for
+    sources in even columns). Built directly from the distance in O(n²).
+    """
+    p = n % 2 if iseven else 1 - n % 2   # parity of the centre column
+    mask = _hex_distance_window(p, n) <= n
+    mask[n, n] = include_center
     return mask
 
 
 @lru_cache(maxsize=None)
 def makeMask_int8(iseven, n, include_center=False):
-    """int8 version of makeMask. Gene values are binary so max accumulation
-    is the mask sum (7–37 for n=1–3), well within int8 range (max 127)."""
+    """int8 version of makeMask, the mask values multiplied in the kernels."""
     return makeMask(iseven, n, include_center).astype(np.int8)
 
 
+@lru_cache(maxsize=None)
+def count_dtype(n, include_center=True):
+    """
+    Accumulator of a radius-n convolution of binary cells: int8 as long as
+    the mask has at most 127 cells (radius 6), wider beyond so that sums of
+    overlapping masks never wrap around.
+    """
+    cells = int(makeMask(False, n, include_center).sum())
+    for dtype in (np.int8, np.int16, np.int32):
+        if cells <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
 # ---------------------------------------------------------------------------
 # Dense convolution
 # ---------------------------------------------------------------------------
 
 def dense_convolution(matrix, n, X, Y, include_center=True):
+    # scipy.signal takes most of the import time of the package: only
+    # loaded by the paths that use it.
+    from scipy.signal import convolve2d
     iseven   = n % 2 == 0
     maskEven = makeMask(iseven,     n, include_center=include_center)
     maskOdd  = makeMask(not iseven, n, include_center=include_center)
-    even = matrix.copy(); even[:, 1::2] = 0
-    odd  = matrix.copy(); odd[:, ::2]  = 0
+    dtype = np.result_type(matrix.dtype, count_dtype(n, include_center))
+    even = matrix.astype(dtype); even[:, 1::2] = 0
+    odd  = matrix.astype(dtype); odd[:, ::2]  = 0
     return (convolve2d(even, maskEven, mode="same") +
             convolve2d(odd,  maskOdd,  mode="same"))
 
@@ -60,27 +173,39 @@ def dense_convolution(matrix, n, X, Y, include_center=True):
 # Sparse convolution (Numba kernel + Python fallback)
 # ---------------------------------------------------------------------------
 
-@njit
-def _sparse_kernel(matrix, result, active_coords, mask_even, mask_odd, X, Y, n):
+# Up to this radius the offset lists are faster than the row runs.
+OFFSETS_MAX_RADIUS = 3
+
+
+@njit(nogil=True)
+def _sparse_kernel(matrix, result, active_coords, offsets, spans, X, Y, n):
     """
-    All arrays are int8. Gene values are binary so accumulation stays in range.
-    matrix, result  : int8
+    matrix          : int8
+    result          : count_dtype accumulator
     active_coords   : int32 (np.argwhere default) — no copy needed
+    offsets, spans  : mask_offsets / mask_spans of radius n
+
+    Small masks are stamped cell by cell from their offset list, larger
+    ones row run by row run.
     """
     for idx in range(len(active_coords)):
         x   = active_coords[idx, 0]
         y   = active_coords[idx, 1]
         val = matrix[x, y]
-        x_start = x - n if x - n > 0 else 0
-        x_end   = x + n + 1 if x + n + 1 < X else X
-        y_start = y - n if y - n > 0 else 0
-        y_end   = y + n + 1 if y + n + 1 < Y else Y
-        mx_start = n - (x - x_start);  mx_end = n + (x_end - x)
-        my_start = n - (y - y_start);  my_end = n + (y_end - y)
-        mask = mask_even if y % 2 == 0 else mask_odd
-        for i in range(x_end - x_start):
-            for j in range(y_end - y_start):
-                result[x_start + i, y_start + j] += val * mask[mx_start + i, my_start + j]
+        p   = y % 2
+        if n <= OFFSETS_MAX_RADIUS:
+            for k in range(offsets.shape[1]):
+                xi = x + offsets[p, k, 0]
+                yj = y + offsets[p, k, 1]
+                if 0 <= xi < X and 0 <= yj < Y:
+                    result[xi, yj] += val
+            continue
+        for i in range(max(0, x - n), min(X, x + n + 1)):
+            for r in range(2):
+                start = max(0, y + spans[p, i - x + n, r, 0])
+                stop  = min(Y, y + spans[p, i - x + n, r, 1])
+                for j in range(start, stop):
+                    result[i, j] += val
     return result
 
 
@@ -100,22 +225,25 @@ def sparse_convolution(matrix, n, X, Y, include_center=True, candidate_coords=No
     else:
         active_coords = np.argwhere(matrix != 0)
 
+    dtype = np.result_type(matrix.dtype, count_dtype(n, include_center))
     if len(active_coords) == 0:
-        return np.zeros((X, Y), dtype=np.int8)
-
-    iseven    = n % 2 == 0
-    mask_even = makeMask_int8(iseven,     n, include_center=include_center)
-    mask_odd  = makeMask_int8(not iseven, n, include_center=include_center)
+        return np.zeros((X, Y), dtype=dtype)
+    # np.argwhere may return Fortran-ordered coordinates, which would make
+    # numba compile a second specialisation of the kernel.
+    active_coords = np.ascontiguousarray(active_coords)
 
     if NUMBA_AVAILABLE:
-        result = np.zeros((X, Y), dtype=np.int8)
+        result = np.zeros((X, Y), dtype=dtype)
         return _sparse_kernel(
             matrix, result, active_coords,
-            mask_even, mask_odd,
+            mask_offsets(n, include_center), mask_spans(n, include_center),
             np.int64(X), np.int64(Y), np.int64(n),
         )
     else:
-        result = np.zeros((X, Y), dtype=np.int8)
+        iseven    = n % 2 == 0
+        mask_even = makeMask_int8(iseven,     n, include_center=include_center)
+        mask_odd  = makeMask_int8(not iseven, n, include_center=include_center)
+        result = np.zeros((X, Y), dtype=dtype)
         for x, y in active_coords:
             mask = mask_even if y % 2 == 0 else mask_odd
             x_start = max(0, x - n);  x_end = min(X, x + n + 1)
@@ -128,27 +256,374 @@ def sparse_convolution(matrix, n, X, Y, include_center=True, candidate_coords=No
         return result
 
 
+# ---------------------------------------------------------------------------
+# Dilation
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def mask_spans(n, include_center=True):
+    """
+    (2, 2n + 1, 2, 2) column runs [start, stop) of each row of the radius-n
+    masks of even and odd columns, as offsets from the centre. Hex masks
+    are convex, so a row is one run, or two around an excluded centre;
+    unused runs have start == stop.
+    """
+    iseven = n % 2 == 0
+    spans = np.zeros((2, 2 * n + 1, 2, 2), dtype=np.int64)
+    for p, mask in enumerate((makeMask(iseven, n, include_center),
+                              makeMask(not iseven, n, include_center))):
+        for i, row in enumerate(mask):
+            columns = np.flatnonzero(row)
+            runs = np.split(columns, np.flatnonzero(np.diff(columns) > 1) + 1)
+            for r, run in enumerate(run for run in runs if len(run)):
+                spans[p, i, r] = run[0] - n, run[-1] + 1 - n
+    return spans
+
+
+@lru_cache(maxsize=None)
+def mask_offsets(n, include_center=True):
+    """
+    (2, K, 2) offsets (dx, dy) of the K cells of the radius-n masks of even
+    and odd columns, for kernels that visit mask cells one by one instead
+    of scanning the zeros of the square mask.
+    """
+    iseven = n % 2 == 0
+    return np.stack([np.argwhere(makeMask(iseven, n, include_center)) - n,
+                     np.argwhere(makeMask(not iseven, n, include_center)) - n]).astype(np.int64)
+
+
+@njit(nogil=True)
+def _dilate_kernel(result, source, active_coords, spans, offsets, X, Y, n, skip_inner):
+    """
+    Set the mask of every active cell in the bool result, run by run of its
+    rows. With skip_inner (masks including their centre), a source whose
+    six neighbours are all sources is only marked itself: every cell its
+    mask reaches is at most n from one of them, hence from the nearest
+    source on the edge of the colony, which is stamped.
+    """
+    if skip_inner:
+        for idx in range(len(active_coords)):
+            source[active_coords[idx, 0], active_coords[idx, 1]] = True
+    for idx in range(len(active_coords)):
+        x = active_coords[idx, 0]
+        y = active_coords[idx, 1]
+        p = y % 2
+        if skip_inner:
+            inner = True
+            for k in range(offsets.shape[1]):
+                xi = x + offsets[p, k, 0]
+                yj = y + offsets[p, k, 1]
+                if xi < 0 or xi >= X or yj < 0 or yj >= Y or not source[xi, yj]:
+                    inner = False
+                    break
+            if inner:
+                result[x, y] = True
+                continue
+        for i in range(max(0, x - n), min(X, x + n + 1)):
+            for r in range(2):
+                start = max(0, y + spans[p, i - x + n, r, 0])
+                stop = min(Y, y + spans[p, i - x + n, r, 1])
+                for j in range(start, stop):
+                    result[i, j] = True
+    return result
+
+
+def dilate(matrix, n, include_center=True, candidate_coords=None):
+    """
+    Boolean mask of the cells within radius n of a nonzero cell of matrix,
+    the support of sparse_convolution computed without summing (so without
+    an accumulator that could wrap around): the runs of each mask row are
+    set, and sources inside the colony are skipped. candidate_coords
+    restricts the sources as in sparse_convolution.
+    """
+    X, Y = matrix.shape
+    if candidate_coords is not None and len(candidate_coords) > 0:
+        active = matrix[candidate_coords[:, 0], candidate_coords[:, 1]] != 0
+        active_coords = candidate_coords[active]
+    else:
+        active_coords = np.argwhere(matrix != 0)
+    spans = mask_spans(n, include_center)
+    result = np.zeros((X, Y), dtype=bool)
+    if NUMBA_AVAILABLE:
+        skip_inner = include_center and n >= 1
+        source = np.zeros((X, Y) if skip_inner else (1, 1), dtype=bool)
+        return _dilate_kernel(result, source,
+                              np.ascontiguousarray(active_coords, dtype=np.int64),
+                              spans, hex_offsets(), np.int64(X), np.int64(Y),
+                              np.int64(n), skip_inner)
+    for x, y in active_coords:
+        for i in range(max(0, x - n), min(X, x + n + 1)):
+            for start, stop in spans[y % 2, i - x + n]:
+                result[i, max(0, y + start):min(Y, y + stop)] = True
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Hex distance transform
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def hex_offsets():
+    """
+    (2, 6, 2) offsets of the neighbours of a cell in an even / odd column,
+    the radius-1 masks as sparse_convolution stamps them.
+    """
+    return mask_offsets(1, include_center=False)
+
+
+@njit(nogil=True)
+def _hex_distance_kernel(sources, dist, queue, max_distance, offsets):
+    """BFS from the (N, 2) source coordinates; dist holds max_distance + 1."""
+    X = dist.shape[0]
+    Y = dist.shape[1]
+    tail = 0
+    for s in range(sources.shape[0]):
+        x = sources[s, 0]
+        y = sources[s, 1]
+        if dist[x, y] != 0:
+            dist[x, y] = 0
+            queue[tail] = x * Y + y
+            tail += 1
+    head = 0
+    while head < tail:
+        x = queue[head] // Y
+        y = queue[head] % Y
+        head += 1
+        d = dist[x, y] + 1
+        if d > max_distance:
+            continue
+        p = y % 2
+        for k in range(offsets.shape[1]):
+            xi = x + offsets[p, k, 0]
+            yj = y + offsets[p, k, 1]
+            if 0 <= xi < X and 0 <= yj < Y and dist[xi, yj] > d:
+                dist[xi, yj] = d
+                queue[tail] = xi * Y + yj
+                tail += 1
+    return dist
+
+
+def hex_distance(matrix, max_distance, candidate_coords=None):
+    """
+    Hex distance from every cell to the nearest nonzero cell of `matrix`,
+    by breadth-first search from all of them at once; cells farther than
+    max_distance get max_distance + 1. `hex_distance(m, r) <= r` is the
+    mask inclusive_neigboor_mask stamps with radius r, for every r at once
+    and at a cost independent of r.
+
+    candidate_coords restricts the sources as in sparse_convolution.
+    """
+    X, Y = matrix.shape
+    if candidate_coords is not None and len(candidate_coords) > 0:
+        active = matrix[candidate_coords[:, 0], candidate_coords[:, 1]] != 0
+        sources = candidate_coords[active]
+    else:
+        sources = np.argwhere(matrix != 0)
+    dist = np.full((X, Y), max_distance + 1, dtype=np.int32)
+    if NUMBA_AVAILABLE:
+        queue = np.empty(X * Y, dtype=np.int64)
+        return _hex_distance_kernel(np.ascontiguousarray(sources, dtype=np.int64),
+                                    dist, queue, np.int64(max_distance), hex_offsets())
+    # Without numba: grow the reached region one ring at a time.
+    reached = np.zeros((X, Y), dtype=bool)
+    reached[sources[:, 0], sources[:, 1]] = True
+    dist[reached] = 0
+    for d in range(1, max_distance + 1):
+        ring = (dense_convolution(reached.astype(np.int8), 1, X, Y) > 0) & ~reached
+        if not ring.any():
+            break
+        dist[ring] = d
+        reached |= ring
+    return dist
+
+
+# ---------------------------------------------------------------------------
+# Active bounding box
+# ---------------------------------------------------------------------------
+
+@njit(nogil=True)
+def _active_box_kernel(status, planes, background):
+    X = status.shape[0]
+    Y = status.shape[1]
+    x0, x1, y0, y1 = X, 0, Y, 0
+    for x in range(X):
+        for y in range(Y):
+            differs = status[x, y] != 0
+            k = 0
+            while not differs and k < planes.shape[0]:
+                differs = planes[k, x, y] != background[k]
+                k += 1
+            if differs:
+                x0 = min(x0, x)
+                x1 = max(x1, x + 1)
+                y0 = min(y0, y)
+                y1 = max(y1, y + 1)
+    return x0, x1, y0, y1
+
+
+def active_box(status, planes, background):
+    """
+    Bounding box (x0, x1, y0, y1) of the cells that are alive or whose
+    planes (genes, or packed gene words) differ from `background`, None if
+    there are none.
+    """
+    if NUMBA_AVAILABLE:
+        x0, x1, y0, y1 = _active_box_kernel(status, planes, background)
+        return (x0, x1, y0, y1) if x0 < x1 else None
+    occupied = status != 0
+    for k in range(planes.shape[0]):
+        occupied |= planes[k] != background[k]
+    rows = np.flatnonzero(occupied.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(occupied.any(axis=0))
+    return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+
+# ---------------------------------------------------------------------------
+# FFT convolution
+# ---------------------------------------------------------------------------
+
+def fft_convolution(matrix, n, X, Y, include_center=True):
+    """
+    Same result as dense_convolution, with one FFT convolution per column
+    parity: the cost no longer grows with the mask area, which pays off for
+    large radii.
+    """
+    from scipy.signal import fftconvolve
+    iseven   = n % 2 == 0
+    maskEven = makeMask(iseven,     n, include_center=include_center).astype(np.float64)
+    maskOdd  = makeMask(not iseven, n, include_center=include_center).astype(np.float64)
+    even = matrix.astype(np.float64); even[:, 1::2] = 0
+    odd  = matrix.astype(np.float64); odd[:, ::2]  = 0
+    result = (fftconvolve(even, maskEven, mode="same") +
+              fftconvolve(odd,  maskOdd,  mode="same"))
+    dtype = np.result_type(matrix.dtype, count_dtype(n, include_center))
+    return np.rint(result).astype(np.int64).astype(dtype)
+
+
 # ---------------------------------------------------------------------------
 # Adaptive convolution
 # ---------------------------------------------------------------------------
 
-def adaptive_convolution(matrix, n, X, Y, include_center=True, threshold=0.1,
-                         candidate_coords=None):
+# Cost model, in seconds per elementary operation (fitted on a desktop CPU;
+# only the ratios matter):
+#   sparse : scan the candidate cells, then stamp the mask of each active one
+#   dense  : one direct convolution per parity over the whole grid
+#   fft    : one FFT convolution per parity over the padded grid
+# src/calibration.py refits these for the current machine; a saved model is
+# loaded on first use (see get_cost_model).
+SPARSE_SCAN  = 1.5e-9
+SPARSE_CELL  = 30e-9 if NUMBA_AVAILABLE else 5e-6
+SPARSE_STAMP = 1.2e-9 if NUMBA_AVAILABLE else 20e-9
+DENSE_TAP    = 1.7e-9
+FFT_POINT    = 2.5e-9
+CALL_COST    = {"sparse": 5e-5, "dense": 1e-4, "fft": 3e-4}
+
+# Coefficients of cost_features, per path.
+DEFAULT_COST_MODEL = {
+    "sparse": (CALL_COST["sparse"], SPARSE_SCAN, SPARSE_CELL, SPARSE_STAMP),
+    "dense": (CALL_COST["dense"], DENSE_TAP),
+    "fft": (CALL_COST["fft"], FFT_POINT),
+}
+cost_model = None
+
+
+def get_cost_model():
+    """The calibrated model if one is saved for this machine, else the default."""
+    global cost_model
+    if cost_model is None:
+        # Imported here: calibration depends on this module.
+        from src.calibration import startup_model
+        cost_model = startup_model() or DEFAULT_COST_MODEL
+    return cost_model
+
+
+def cost_features(n_active, n, X, Y, n_scanned=None):
+    """Per path, the operation counts the cost model coefficients multiply."""
+    taps = (2 * n + 1) ** 2
+    points = (X + 2 * n) * (Y + 2 * n)
+    if n_scanned is None:
+        n_scanned = X * Y
+    return {
+        "sparse": (1, n_scanned, n_active, n_active * taps),
+        "dense": (1, 2 * X * Y * taps),
+        "fft": (1, 2 * points * np.log2(points)),
+    }
+
+
+def convolution_costs(n_active, n, X, Y, n_scanned=None):
+    """
+    Estimated time of each convolution path for n_active nonzero cells,
+    radius n on an X by Y grid. n_scanned is the number of cells the sparse
+    path has to look at to find the active ones (default: the whole grid).
+    """
+    model = cost_model if cost_model is not None else get_cost_model()
+    features = cost_features(n_active, n, X, Y, n_scanned=n_scanned)
+    return {path: sum(c * f for c, f in zip(model[path], features[path]))
+            for path in features}
+
+
+def choose_convolution(n_active, n, X, Y, n_scanned=None):
+    """Name of the cheapest path: "sparse", "dense" or "fft"."""
+    costs = convolution_costs(n_active, n, X, Y, n_scanned=n_scanned)
+    return min(costs, key=costs.get)
+
+
+def adaptive_convolution(matrix, n, X, Y, include_center=True, threshold=None,
+                         candidate_coords=None, method=None):
     """
-    Choose sparse or dense convolution based on matrix occupancy.
+    Run the cheapest of the sparse, dense and FFT convolutions according to
+    the cost model above (occupancy, radius and grid size).
 
-    candidate_coords is passed through to sparse_convolution to avoid
-    redundant argwhere calls in the caller.
+    candidate_coords restricts the sources to these cells (all nonzero cells
+    if empty), and is passed through to sparse_convolution to avoid
+    redundant argwhere calls in the caller. A `threshold` on occupancy restores the plain
+    sparse/dense switch, and `method` forces a path.
     """
-    # If candidate_coords are provided, we already know the active cells —
-    # skip the occupancy scan and go straight to sparse.
-    if candidate_coords is not None:
+    restrict = candidate_coords is not None and len(candidate_coords) > 0
+    reason, costs = "forced", None
+    if method is None:
+        if restrict:
+            n_active = np.count_nonzero(matrix[candidate_coords[:, 0], candidate_coords[:, 1]])
+            n_scanned = len(candidate_coords)
+        else:
+            n_active = np.count_nonzero(matrix)
+            n_scanned = None
+        if threshold is not None:
+            reason = "threshold"
+            method = "sparse" if n_active / matrix.size < threshold else "dense"
+        else:
+            reason = "cost model"
+            costs = convolution_costs(n_active, n, X, Y, n_scanned=n_scanned)
+            method = min(costs, key=costs.get)
+
+    if telemetry.recorder is None:
+        return _convolve(method, matrix, n, X, Y, include_center, candidate_coords, restrict)
+    start = time.perf_counter()
+    result = _convolve(method, matrix, n, X, Y, include_center, candidate_coords, restrict)
+    telemetry.convolution(
+        method=method, reason=reason, costs=costs, threshold=threshold, n=int(n), X=int(X), Y=int(Y),
+        active=int(np.count_nonzero(matrix if not restrict else
+                                    matrix[candidate_coords[:, 0], candidate_coords[:, 1]])),
+        scanned=int(len(candidate_coords) if restrict else matrix.size),
+        seconds=time.perf_counter() - start)
+    return result
+
+
+def _convolve(method, matrix, n, X, Y, include_center, candidate_coords, restrict):
+    if method == "sparse":
         return sparse_convolution(matrix, n, X, Y,
                                   include_center=include_center,
                                   candidate_coords=candidate_coords)
-    occupancy = np.count_nonzero(matrix) / matrix.size
-    if occupancy < threshold:
-        return sparse_convolution(matrix, n, X, Y,
-                                  include_center=include_center)
-    else:
-        return dense_convolution(matrix, n, X, Y, include_center=include_center)
\ No newline at end of file
+    if restrict:
+        # Only the candidate cells are sources, as in sparse_convolution.
+        xs, ys = candidate_coords[:, 0], candidate_coords[:, 1]
+        sources = np.zeros_like(matrix)
+        sources[xs, ys] = matrix[xs, ys]
+        matrix = sources
+    if method == "dense":
+        return dense_convolution(matrix, n, X, Y, include_center=include_center)
+    if method == "fft":
+        return fft_convolution(matrix, n, X, Y, include_center=include_center)
+    raise ValueError(f"Unknown convolution method '{method}'")
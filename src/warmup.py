@@ -0,0 +1,101 @@
+"""
+Kernel warm-up.
+
+Numba compiles a kernel on its first call, once per combination of
+argument types, which costs more than short simulations themselves. The
+kernels are cached on disk (utils.kernel_cache_dir), so a new process only
+loads the ones compiled before; warm_up() calls every kernel of some
+engines on tiny inputs, which compiles them in this process and fills the
+cache ahead of time for the next ones:
+
+    python -m src.warmup                  # every engine
+    python -m src.warmup --engine fused   # the engines a sweep will use
+
+Sweep workers warm up the engines of their runs when they start.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+import src.utils as utils
+from src.parse_cells import Cell
+from src.parse_rules import parse_rule_line
+
+
+def warm_up_convolutions():
+    """Compile the utils kernels the CellGrid engines dispatch to."""
+    matrix = np.zeros((16, 16), dtype=np.int8)
+    matrix[4:7, 4:7] = 1
+    # Radii on both sides of utils.OFFSETS_MAX_RADIUS, and wide enough for
+    # int16 accumulators (utils.count_dtype).
+    for n in (1, 7):
+        for include_center in (True, False):
+            utils.adaptive_convolution(matrix, n, 16, 16, include_center=include_center,
+                                       method="sparse")
+            utils.dilate(matrix, n, include_center=include_center)
+    utils.hex_distance(matrix, 3)
+
+
+def _tiny_rules():
+    genes_rules = (parse_rule_line("[0,n(1)]1 || [not(1)]0", 0)
+                   + parse_rule_line("[0,n(0)]2", 1))
+    alive_rules = parse_rule_line("[0] || [1,n(2)]", -1)
+    return genes_rules, alive_rules
+
+
+def warm_up(engine="dense"):
+    """Compile the kernels of an engine by stepping a tiny grid."""
+    genes_rules, alive_rules = _tiny_rules()
+    grid = cellStatus.get_engine(engine)(8, 8, 2, genes_rules, alive_rules,
+                                         initial_cells=[Cell(4, 4, np.array([0]))])
+    for _ in range(2):
+        grid.update_grid()
+
+
+def warm_up_batch():
+    """Compile the kernel of CellGridBatch (src/batch.py)."""
+    from src.batch import CellGridBatch
+    genes_rules, alive_rules = _tiny_rules()
+    batch = CellGridBatch(8, 8, 2, genes_rules, alive_rules,
+                          [[Cell(4, 4, np.array([0]))], [Cell(2, 5, np.array([0, 1]))]])
+    for _ in range(2):
+        batch.update_grid()
+
+
+def warm_up_all(engines=None):
+    """
+    Warm up the convolutions and `engines`, by default every engine and
+    CellGridBatch. Returns the seconds each took.
+    """
+    steps = [("convolutions", warm_up_convolutions)]
+    for engine in engines if engines is not None else sorted(cellStatus.ENGINES):
+        steps.append((engine, lambda engine=engine: warm_up(engine)))
+    if engines is None:
+        steps.append(("batch", warm_up_batch))
+    seconds = {}
+    for name, function in steps:
+        start = time.perf_counter()
+        function()
+        seconds[name] = time.perf_counter() - start
+    return seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile and cache the kernels of the engines")
+    parser.add_argument("--engine", nargs="+", choices=sorted(cellStatus.ENGINES), default=None,
+                        help="engines to warm up (default: all, and CellGridBatch)")
+    args = parser.parse_args(argv)
+
+    if not utils.CACHE_KERNELS:
+        print("kernel cache disabled (no numba, NUMBA_DISABLE_JIT or OCW_NUMBA_CACHE=0): "
+              "compiling for this process only")
+    for name, seconds in warm_up_all(args.engine).items():
+        print(f"{name:>12}: {seconds:.2f}s")
+    if utils.CACHE_KERNELS:
+        print(f"kernels cached in {utils.KERNEL_CACHE_DIR or utils.numba_config.CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
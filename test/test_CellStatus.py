@@ -1,39 +1,120 @@
+import tempfile
 import unittest
-import cellStatus
-import parse_rules 
+from pathlib import Path
 
-class TestParseRules(unittest.TestCase):\
+import numpy as np
+
+import src.cellStatus as cellStatus
+import src.parse_rules as parse_rules
+from src.parse_cells import Cell
+
+
+class TestParseRules(unittest.TestCase):
     def testParseAndRule(self):
-        test_1 = "[0]"
-        output = parse_rules.parse_and_rule(test_1):
-        self.assertisinstance(output,parse_rules.AndRule)
-        self.assertequal()
+        output = parse_rules.parse_and_rule("[1,2,not(3),n(6)]7", 4)
+        self.assertIsInstance(output, parse_rules.AndRule)
+        np.testing.assert_array_equal(output.positive_genes, [1, 2])
+        np.testing.assert_array_equal(output.negative_genes, [3])
+        self.assertEqual(output.n_neighboor, 6)
+        self.assertEqual(output.propagation, 7)
+        self.assertEqual(output.active_gene, 4)
+
+    def testParseAndRuleDefaults(self):
+        output = parse_rules.parse_and_rule("[0] # comment", 1)
+        self.assertIsNone(output.n_neighboor)
+        self.assertEqual(output.propagation, 0)
+        with self.assertRaises(ValueError):
+            parse_rules.parse_and_rule("[a]", 0)
 
     def testParseRuleLine(self):
+        output = parse_rules.parse_rule_line("[1,2,not(3),n(6)]7 || [1]5", 0)
+        self.assertEqual(len(output), 2)
+        self.assertEqual([rule.propagation for rule in output], [7, 5])
 
     def testReadRulesFile(self):
-        pass
-        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "rules.txt"
+            path.write_text("# genes\n[0]1\n[not(0),1]2 || [n(1)]\n[0,n(2)]\n")
+            gene_rules, alive_rules, ngene = parse_rules.read_rules_file(path)
+        self.assertEqual(ngene, 2)
+        self.assertEqual([rule.active_gene for rule in gene_rules], [0, 1, 1])
+        self.assertEqual([rule.active_gene for rule in alive_rules], [-1])
 
 
+class TestCellGrid(unittest.TestCase):
+    def setUp(self):
+        self.grid = cellStatus.CellGrid(X=5, Y=5, G=2,
+                                        genes_rules=parse_rules.parse_rule_line("[1]", 1),
+                                        alive_rules=[],
+                                        initial_cells=[Cell(2, 3, np.array([1]))])
 
+    def test_init(self):
+        self.assertEqual(self.grid.cell_status.shape, (5, 5))
+        self.assertEqual(self.grid.gene_content.shape, (2, 5, 5))
+        self.assertEqual(self.grid.cell_status.sum(), 1)
+        self.assertEqual(self.grid.cell_status[2, 3], 1)
+        self.assertEqual(self.grid.gene_content[1, 2, 3], 1)
+        self.assertEqual(self.grid.gene_content.sum(), 1)
+        self.assertEqual(self.grid.gene_names, ["gene_0", "gene_1"])
 
+    def test_no_alive_rules(self):
+        status = self.grid.cell_status.copy()
+        self.grid.update_grid()
+        np.testing.assert_array_equal(self.grid.cell_status, status)
 
+    def test_neighbors(self):
+        neighbours = self.grid.get_neighbors()
+        self.assertEqual(neighbours[2, 3], 0)
+        self.assertEqual(neighbours.sum(), 6)
 
 
 
+class TestActiveWindow(unittest.TestCase):
+    """Stepping the active window must give the same grid as stepping it all."""
+    CONFS = Path(__file__).resolve().parent.parent / "confs"
 
-class TestCellGrid(unittest.TestCase):
-    def setUp(self):
-        CellGrid(X=5,
-                 Y=5,
-                 G=0,
-                 genes_rules='',
-                 alive_rules='',
-                 initial_cells='')
-
-    def test_init():
-        
-class CellGrid:
-
-    def __init__(self, X, Y, G, genes_rules,alive_rules,initial_cells=None, gene_names=None):
+    def grids(self, name, X, Y, dx, dy, engine="dense"):
+        genes_rules, alive_rules, G = parse_rules.read_rules_file(self.CONFS / name / "rules.txt")
+        cells = [Cell(cell.x + dx, cell.y + dy, cell.active_genes)
+                 for cell in cellStatus.parse_cell_conf(self.CONFS / name / "initial_cell.txt")]
+        cls = cellStatus.get_engine(engine)
+        grid = cls(X, Y, G, genes_rules, alive_rules, initial_cells=cells)
+
+        class Full(cls):
+            def active_window(self):
+                return cellStatus.Window(0, self.X, 0, self.Y, None)
+
+        full = Full(X, Y, G, genes_rules, alive_rules, initial_cells=cells)
+        return grid, full
+
+    def test_matches_full_grid(self):
+        # Seeds in the middle, against the borders and in the corner (0, 0).
+        for name, (dx, dy) in [("firework", (60, 60)), ("firework", (-50, -49)),
+                               ("Test_dentrite", (70, 10)), ("2CT", (-20, 60)),
+                               ("test_propagation", (40, 40)), ("default", (0, -40))]:
+            for engine in ("dense", "packed"):
+                grid, full = self.grids(name, 160, 150, dx, dy, engine)
+                for step in range(15):
+                    with self.subTest(conf=name, shift=(dx, dy), engine=engine, step=step):
+                        np.testing.assert_array_equal(grid.cell_status, full.cell_status)
+                        np.testing.assert_array_equal(grid.gene_content, full.gene_content)
+                    grid.update_grid()
+                    full.update_grid()
+
+    def test_window(self):
+        grid, _ = self.grids("2CT", 300, 300, 100, 100)
+        window = grid.active_window()
+        occupied = np.argwhere(grid.cell_status | grid.gene_content.any(axis=0))
+        margin = grid.gene_program.max_propagation + 2
+        self.assertEqual(window.x0, occupied[:, 0].min() - margin)
+        self.assertEqual(window.x1, occupied[:, 0].max() + 1 + margin)
+        self.assertEqual(window.y0 % 2, 0)
+        self.assertLess((window.x1 - window.x0) * (window.y1 - window.y0), 300 * 300 // 10)
+        # A background that is born fills the grid.
+        grid.alive_rules = parse_rules.parse_rule_line("[n(0)]", -1)
+        grid.alive_program = cellStatus.compile_rules(grid.alive_rules, grid.G)
+        self.assertEqual(grid.active_window(), (0, 300, 0, 300, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
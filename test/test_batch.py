@@ -0,0 +1,50 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+from src.batch import CellGridBatch, initialise_batch
+from src.parse_cells import Cell
+
+ROOT = Path(__file__).resolve().parent.parent
+CONF = ROOT / "confs" / "2CT"
+
+
+class TestCellGridBatch(unittest.TestCase):
+
+    def test_matches_cellgrid(self):
+        genes_rules, alive_rules, G = cellStatus.read_rules_file(CONF / "rules.txt")
+        rng = np.random.default_rng(0)
+        seeds = [[Cell(int(rng.integers(30)), int(rng.integers(30)),
+                       np.array([int(rng.integers(G))])) for _ in range(3)]
+                 for _ in range(6)]
+        seeds.append([])
+        batch = CellGridBatch(30, 30, G, genes_rules, alive_rules, seeds)
+        grids = [cellStatus.CellGrid(30, 30, G, genes_rules, alive_rules, initial_cells=cells)
+                 for cells in seeds]
+        for step in range(10):
+            for b, grid in enumerate(grids):
+                with self.subTest(member=b, step=step):
+                    np.testing.assert_array_equal(batch.cell_status[b], grid.cell_status)
+                    np.testing.assert_array_equal(batch.gene_content[b], grid.gene_content)
+            batch.update_grid()
+            for grid in grids:
+                grid.update_grid()
+        np.testing.assert_array_equal(batch.alive_counts(),
+                                      [np.count_nonzero(g.cell_status) for g in grids])
+
+    def test_initialise_batch(self):
+        cells = CONF / "initial_cell.txt"
+        batch = initialise_batch(CONF / "rules.txt", [cells, cells], 60, 60)
+        ref = cellStatus.initialise_grid(CONF / "rules.txt", cells, 60, 60)
+        for _ in range(3):
+            batch.update_grid()
+            ref.update_grid()
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch.gene_counts().shape, (2, ref.G))
+        np.testing.assert_array_equal(batch.gene_content[1], ref.gene_content)
+
+
+if __name__ == "__main__":
+    unittest.main()
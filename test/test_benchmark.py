@@ -0,0 +1,52 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import src.benchmark as benchmark
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run_and_compare(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "bench.json"
+            benchmark.main(["--confs", str(ROOT / "confs" / "2CT"), "--size", "60x60",
+                            "-n", "2", "--engine", "dense", "--synthetic-size", "30",
+                            "--occupancy", "0.1", "--genes", "3", "--radius", "2",
+                            "--out", str(out)])
+            results = json.loads(out.read_text())
+        self.assertIn("commit", results["meta"])
+        rows = {row["name"]: row for row in results["results"]}
+        self.assertEqual(set(rows), {
+            "conf/2CT/60x60/dense", "synthetic/30x30/p0.1/g3/r2/dense",
+            *(f"convolution/{m}/30x30/p0.1/r2" for m in ("sparse", "dense", "fft", "auto"))})
+        self.assertTrue(all(row["error"] == "" for row in rows.values()))
+        step = rows["conf/2CT/60x60/dense"]
+        self.assertEqual(set(step["phases"]), {"create_alive_cell", "propagate_genes"})
+        self.assertGreater(step["steps_per_sec"], 0)
+
+        compared = benchmark.compare(results, results)
+        self.assertEqual(len(compared), len(rows))
+        self.assertTrue(all(old == new for _, _, old, new in compared))
+
+    def test_startup(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "bench.json"
+            benchmark.main(["--only", "startup", "--size", "60x60", "--engine", "dense",
+                            "--out", str(out)])
+            results = json.loads(out.read_text())
+        rows = {row["name"]: row for row in results["results"]}
+        self.assertEqual(set(rows), {"startup/cold/firework/60x60/dense",
+                                     "startup/cached/firework/60x60/dense"})
+        for row in rows.values():
+            self.assertEqual(row["error"], "")
+            self.assertAlmostEqual(row["seconds"], row["import_seconds"] + row["init_seconds"]
+                                   + row["first_step_seconds"])
+            self.assertLess(row["cache_key_seconds"], row["import_seconds"])
+
+
+if __name__ == "__main__":
+    unittest.main()
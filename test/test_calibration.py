@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import src.calibration as calibration
+import src.utils as utils
+
+SMALL = dict(sizes=(32, 64), radii=(1, 3), occupancies=(0.01, 0.2))
+
+
+class TestCalibration(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = utils.cost_model
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "model.json"
+
+    def tearDown(self):
+        utils.cost_model = self.previous
+        self.tmp.cleanup()
+
+    def test_fit_recovers_a_linear_model(self):
+        truth = {"sparse": (1e-5, 2e-9, 3e-8, 1e-9), "dense": (1e-4, 2e-9), "fft": (2e-4, 3e-9)}
+        rows = []
+        for path, coefficients in truth.items():
+            for n_active, n, X in [(10, 1, 50), (500, 3, 100), (4000, 6, 300), (20000, 2, 500),
+                                   (100, 8, 200)]:
+                features = utils.cost_features(n_active, n, X, X)[path]
+                rows.append((path, n_active, n, X, X, sum(c * f for c, f in zip(coefficients, features))))
+        model = calibration.fit(rows)
+        for path in truth:
+            for fitted, true in zip(model[path], truth[path]):
+                self.assertAlmostEqual(fitted / true, 1, places=4)
+
+    def test_save_and_load(self):
+        model = calibration.calibrate(**SMALL)
+        self.assertEqual(set(model), {"sparse", "dense", "fft"})
+        calibration.save_model(model, self.path)
+        loaded = calibration.load_model(self.path)
+        self.assertEqual(loaded, model)
+
+        data = json.loads(self.path.read_text())
+        data["version"] = 0
+        self.path.write_text(json.dumps(data))
+        self.assertIsNone(calibration.load_model(self.path))
+        self.assertIsNone(calibration.load_model(Path(self.tmp.name) / "missing.json"))
+
+    def test_dispatch_follows_the_model(self):
+        utils.cost_model = {"sparse": (1, 0, 0, 0), "dense": (0, 1e-12), "fft": (1, 0)}
+        self.assertEqual(utils.choose_convolution(10, 1, 300, 300), "dense")
+        utils.cost_model = utils.DEFAULT_COST_MODEL
+        self.assertEqual(utils.choose_convolution(10, 1, 300, 300), "sparse")
+
+    def test_autotune_on_first_use(self):
+        env = {"OCW_COST_MODEL": str(self.path), "OCW_AUTOTUNE": "1"}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch.object(calibration, "calibrate",
+                                  lambda: calibration.fit(calibration.measure(**SMALL))):
+            utils.cost_model = None
+            model = utils.get_cost_model()
+            self.assertTrue(self.path.exists())
+            self.assertEqual(calibration.load_model(), model)
+        with mock.patch.dict(os.environ, {"OCW_COST_MODEL": str(Path(self.tmp.name) / "none.json")}):
+            utils.cost_model = None
+            self.assertIs(utils.get_cost_model(), utils.DEFAULT_COST_MODEL)
+
+
+if __name__ == "__main__":
+    unittest.main()
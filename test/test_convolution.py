@@ -0,0 +1,145 @@
+import unittest
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+import src.utils as utils
+from src.fused import FusedCellGrid
+from src.parse_cells import Cell
+from src.parse_rules import parse_rule_line
+
+
+class TestConvolutionPaths(unittest.TestCase):
+
+    def test_paths_agree(self):
+        rng = np.random.default_rng(0)
+        for X, Y in [(50, 61), (33, 80)]:
+            for n in (1, 2, 7, 12):
+                for occupancy in (0.02, 0.9):
+                    matrix = (rng.random((X, Y)) < occupancy).astype(np.int8)
+                    dense = utils.dense_convolution(matrix, n, X, Y)
+                    with self.subTest(X=X, Y=Y, n=n, occupancy=occupancy):
+                        np.testing.assert_array_equal(
+                            utils.fft_convolution(matrix, n, X, Y), dense)
+                        np.testing.assert_array_equal(
+                            utils.sparse_convolution(matrix, n, X, Y), dense)
+
+    def test_candidates_restrict_sources(self):
+        rng = np.random.default_rng(1)
+        matrix = (rng.random((40, 40)) < 0.5).astype(np.int8)
+        candidates = np.argwhere(rng.random((40, 40)) < 0.3)
+        expected = utils.sparse_convolution(matrix, 3, 40, 40,
+                                            candidate_coords=candidates)
+        for method in ("dense", "fft"):
+            with self.subTest(method=method):
+                np.testing.assert_array_equal(
+                    utils.adaptive_convolution(matrix, 3, 40, 40,
+                                               candidate_coords=candidates,
+                                               method=method),
+                    expected)
+
+    def test_wide_accumulator(self):
+        # Radius 7 masks have 169 cells: a full colony overflows int8.
+        matrix = np.ones((40, 40), dtype=np.int8)
+        for n, dtype in ((6, np.int8), (7, np.int16)):
+            self.assertEqual(utils.count_dtype(n), dtype)
+            for method in ("sparse", "dense", "fft"):
+                with self.subTest(n=n, method=method):
+                    counts = utils.adaptive_convolution(matrix, n, 40, 40, method=method)
+                    self.assertEqual(counts.dtype, dtype)
+                    self.assertEqual(counts.max(), 3 * n * (n + 1) + 1)
+
+    def test_cost_model(self):
+        self.assertEqual(utils.choose_convolution(10, 1, 300, 300), "sparse")
+        self.assertEqual(utils.choose_convolution(45000, 12, 300, 300), "fft")
+        costs = utils.convolution_costs(1000, 3, 100, 100)
+        self.assertEqual(set(costs), {"sparse", "dense", "fft"})
+
+
+class TestMasks(unittest.TestCase):
+
+    def test_masks_are_hex_balls(self):
+        # Closed-form masks against a breadth-first walk over neighbours.
+        for p in (0, 1):
+            matrix = np.zeros((41, 42), dtype=np.int8)
+            matrix[20, 20 + p] = 1
+            distance = utils.hex_distance(matrix, 20)
+            for n in range(16):
+                with self.subTest(parity=p, n=n):
+                    ball = distance[20 - n:21 + n, 20 + p - n:21 + p + n] <= n
+                    mask = utils.makeMask((p - n) % 2 == 0, n, include_center=True)
+                    np.testing.assert_array_equal(mask, ball)
+                    self.assertEqual(mask.sum(), 3 * n * (n + 1) + 1)
+                    self.assertFalse(utils.makeMask((p - n) % 2 == 0, n)[n, n])
+
+                    offsets = utils.mask_offsets(n)[p]
+                    stamped = np.zeros_like(ball)
+                    stamped[offsets[:, 0] + n, offsets[:, 1] + n] = True
+                    np.testing.assert_array_equal(stamped, ball)
+
+
+class TestDilate(unittest.TestCase):
+
+    def test_matches_stamped_masks(self):
+        rng = np.random.default_rng(4)
+        yy, xx = np.mgrid[:40, :41]
+        disc = ((xx - 20) ** 2 + (yy - 18) ** 2 < 120).astype(np.int8)
+        for name, matrix in [("sparse", (rng.random((40, 41)) < 0.02).astype(np.int8)),
+                             ("dense", (rng.random((40, 41)) < 0.7).astype(np.int8)),
+                             ("disc", disc)]:
+            for n in (0, 1, 2, 7, 9):
+                for include_center in (True, False):
+                    with self.subTest(matrix=name, n=n, include_center=include_center):
+                        stamped = utils.sparse_convolution(matrix, n, 40, 41,
+                                                           include_center=include_center) > 0
+                        np.testing.assert_array_equal(
+                            utils.dilate(matrix, n, include_center=include_center), stamped)
+
+    def test_candidates_restrict_sources(self):
+        matrix = np.zeros((20, 20), dtype=np.int8)
+        matrix[5, 5] = matrix[15, 15] = 1
+        reach = utils.dilate(matrix, 3, candidate_coords=np.array([[5, 5]]))
+        np.testing.assert_array_equal(reach, utils.hex_distance(matrix, 3, np.array([[5, 5]])) <= 3)
+        self.assertFalse(reach[15, 15])
+
+    def test_neighbour_mask_does_not_wrap(self):
+        grid = cellStatus.CellGrid(30, 30, 1, [], [])
+        applicable = np.ones((30, 30), dtype=np.int8)
+        self.assertTrue(grid.neigboor_mask(applicable, 9).all())
+
+
+class TestHexDistance(unittest.TestCase):
+
+    def test_threshold_is_stamped_mask(self):
+        rng = np.random.default_rng(2)
+        matrix = (rng.random((40, 41)) < 0.01).astype(np.int8)
+        distance = utils.hex_distance(matrix, 9)
+        for n in range(1, 10):
+            with self.subTest(n=n):
+                stamped = utils.sparse_convolution(matrix, n, 40, 41) > 0
+                np.testing.assert_array_equal(distance <= n, stamped)
+        self.assertEqual(distance.max(), 10)
+
+    def test_candidates_restrict_sources(self):
+        matrix = np.zeros((20, 20), dtype=np.int8)
+        matrix[5, 5] = matrix[15, 15] = 1
+        distance = utils.hex_distance(matrix, 3, candidate_coords=np.array([[5, 5]]))
+        self.assertEqual(distance[5, 5], 0)
+        self.assertEqual(distance[15, 15], 4)
+
+    def test_large_radius_does_not_wrap(self):
+        # A dense colony with a radius 9 rule: an int8 sum of the overlapping
+        # masks wraps around, a distance field does not.
+        rng = np.random.default_rng(3)
+        cells = [Cell(int(x), int(y), np.array([0]))
+                 for x, y in zip(*np.nonzero(rng.random((50, 50)) < 0.95))]
+        genes_rules = parse_rule_line("[0]9", 1)
+        alive_rules = parse_rule_line("[1,n(7)]", -1)
+        grid = cellStatus.CellGrid(50, 50, 2, genes_rules, alive_rules, initial_cells=cells)
+        fused = FusedCellGrid(50, 50, 2, genes_rules, alive_rules, initial_cells=cells)
+        self.assertTrue(grid.gene_content[1].all())
+        np.testing.assert_array_equal(grid.gene_content, fused.gene_content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import src.runner as runner
+import src.sweep as sweep
+from src.cycles import CycleDetector
+
+ROOT = Path(__file__).resolve().parent.parent
+CONF = ROOT / "confs" / "2CT"
+
+
+class TestCycleDetector(unittest.TestCase):
+
+    @staticmethod
+    def state(i):
+        genes = np.zeros((1, 1, 5), dtype=np.int8)
+        genes[0, 0, i] = 1
+        return np.zeros((1, 5), dtype=np.int8), genes
+
+    def test_synthetic_cycle(self):
+        detector = CycleDetector(max_period=4)
+        found = [detector.observe(*self.state(i)) for i in [0, 1, 2, 3, 4, 2]]
+        self.assertEqual(found[:5], [None] * 5)
+        self.assertEqual(found[5], (2, 3))
+        np.testing.assert_array_equal(detector.state_at(9)[1], self.state(3)[1])
+
+    def test_period_longer_than_window(self):
+        detector = CycleDetector(max_period=2)
+        for i in [0, 1, 2, 0, 1, 2]:
+            detector.observe(*self.state(i))
+        self.assertIsNone(detector.cycle)
+
+    def test_runner_stops_and_state_at_matches(self):
+        grid = runner.load_folder(CONF, 60, 60)
+        r = runner.Runner(grid, max_period=8, stop_on_cycle=True)
+        r.run(400)
+        self.assertIsNotNone(r.cycle)
+        start, period = r.cycle
+        self.assertEqual(r.generation, start + period)
+        self.assertEqual(r.history[-1]["generation"], r.generation)
+
+        ref = runner.load_folder(CONF, 60, 60)
+        for _ in range(r.generation + 7):
+            ref.update_grid()
+        status, genes = r.detector.state_at(r.generation + 7)
+        np.testing.assert_array_equal(status, ref.cell_status)
+        np.testing.assert_array_equal(genes, ref.gene_content)
+
+    def test_sweep_rows_unchanged_by_early_stop(self):
+        spec = sweep.folder_specs([CONF], [(60, 60)], 300)[0]
+        early = sweep.run_one(spec, max_period=8)
+        full = sweep.run_one(spec, max_period=0)
+        self.assertLess(early["stepped"], full["stepped"])
+        self.assertNotEqual(early["period"], "")
+        for key in ("alive", "genes", "state_hash"):
+            self.assertEqual(early[key], full[key])
+
+
+if __name__ == "__main__":
+    unittest.main()
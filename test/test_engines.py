@@ -0,0 +1,297 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+import src.bitpack as bitpack
+from src.cellStatus import get_engine
+from src.parse_cells import Cell
+
+ROOT = Path(__file__).resolve().parent.parent
+CONFS = ["test_config", "firework", "2CT", "ocillator", "test_propagation"]
+
+
+def conf_files(name):
+    folder = ROOT / "test" / name if name == "test_config" else ROOT / "confs" / name
+    return folder / "rules.txt", folder / "initial_cell.txt"
+
+
+class EngineEquivalence:
+    """Mixin: an engine must reproduce CellGrid.update_grid exactly."""
+    engine = None
+    size = (80, 80)
+    steps = 12
+
+    def test_matches_dense(self):
+        for name in CONFS:
+            rules, cells = conf_files(name)
+            ref = cellStatus.initialise_grid(rules, cells, *self.size)
+            grid = cellStatus.initialise_grid(rules, cells, *self.size,
+                                              engine=self.engine)
+            for step in range(self.steps):
+                with self.subTest(conf=name, step=step):
+                    np.testing.assert_array_equal(grid.cell_status, ref.cell_status)
+                    np.testing.assert_array_equal(grid.gene_content, ref.gene_content)
+                ref.update_grid()
+                grid.update_grid()
+
+
+class TestPackedEngine(EngineEquivalence, unittest.TestCase):
+    engine = "packed"
+
+    def test_gene_content_edits(self):
+        rules, cells = conf_files("2CT")
+        grid = cellStatus.initialise_grid(rules, cells, *self.size, engine="packed")
+        with self.assertRaises(ValueError):
+            grid.gene_content[0, 10, 10] = 1
+        genes = grid.gene_content.copy()
+        genes[0, 10, 10] = 1
+        grid.gene_content = genes
+        self.assertEqual(grid.gene_content[0, 10, 10], 1)
+
+
+class TestFusedEngine(EngineEquivalence, unittest.TestCase):
+    engine = "fused"
+
+    def test_buffers_reused(self):
+        rules, cells = conf_files("firework")
+        grid = cellStatus.initialise_grid(rules, cells, 60, 60, engine="fused")
+        grid.update_grid()
+        first = grid.gene_content
+        grid.update_grid()
+        grid.update_grid()
+        self.assertIs(grid.gene_content, first)
+
+    def test_rejects_unknown_gene(self):
+        rules, cells = conf_files("three_genes")
+        with self.assertRaises(ValueError):
+            cellStatus.initialise_grid(rules, cells, 20, 20, engine="fused")
+
+
+class TestParallelEngine(EngineEquivalence, unittest.TestCase):
+    engine = "parallel"
+
+    def test_many_tiles(self):
+        from src.parallel import ParallelCellGrid
+        for name in CONFS:
+            rules, cells = conf_files(name)
+            genes_rules, alive_rules, G = cellStatus.read_rules_file(rules)
+            initial = cellStatus.parse_cell_conf(cells)
+            ref = cellStatus.CellGrid(*self.size, G, genes_rules, alive_rules,
+                                      initial_cells=initial)
+            grid = ParallelCellGrid(*self.size, G, genes_rules, alive_rules,
+                                    initial_cells=initial, n_tiles=9)
+            self.assertEqual(len(grid.bounds), 10)
+            for step in range(self.steps):
+                ref.update_grid()
+                grid.update_grid()
+            with self.subTest(conf=name):
+                np.testing.assert_array_equal(grid.cell_status, ref.cell_status)
+                np.testing.assert_array_equal(grid.gene_content, ref.gene_content)
+
+
+class TestIncrementalEngine(EngineEquivalence, unittest.TestCase):
+    engine = "incremental"
+
+    def test_reset_after_edit(self):
+        rules, cells = conf_files("2CT")
+        ref = cellStatus.initialise_grid(rules, cells, *self.size)
+        grid = cellStatus.initialise_grid(rules, cells, *self.size,
+                                          engine="incremental")
+        for _ in range(3):
+            ref.update_grid()
+            grid.update_grid()
+        self.assertLess(grid.n_dirty, self.size[0] * self.size[1])
+        for g in (ref, grid):
+            g.cell_status[60, 60] = 1
+            g.gene_content[0, 60, 60] = 1
+        grid.reset()
+        for _ in range(5):
+            ref.update_grid()
+            grid.update_grid()
+        np.testing.assert_array_equal(grid.cell_status, ref.cell_status)
+        np.testing.assert_array_equal(grid.gene_content, ref.gene_content)
+
+
+class TestHashlifeEngine(EngineEquivalence, unittest.TestCase):
+    engine = "hashlife"
+
+    def test_jumps_match_steps(self):
+        for name in ("firework", "ocillator"):
+            rules, cells = conf_files(name)
+            ref = cellStatus.initialise_grid(rules, cells, *self.size)
+            grid = cellStatus.initialise_grid(rules, cells, *self.size,
+                                              engine="hashlife")
+            for _ in range(45):
+                ref.update_grid()
+            grid.advance(45)
+            with self.subTest(conf=name):
+                np.testing.assert_array_equal(grid.cell_status, ref.cell_status)
+                np.testing.assert_array_equal(grid.gene_content, ref.gene_content)
+
+    def test_reset_after_edit(self):
+        from src.hashlife import HashlifeCellGrid
+        rules, cells = conf_files("2CT")
+        genes_rules, alive_rules, G = cellStatus.read_rules_file(rules)
+        initial = cellStatus.parse_cell_conf(cells)
+        ref = cellStatus.CellGrid(*self.size, G, genes_rules, alive_rules,
+                                  initial_cells=initial)
+        grid = HashlifeCellGrid(*self.size, G, genes_rules, alive_rules,
+                                initial_cells=initial, leaf_size=32)
+        for g in (ref, grid):
+            g.update_grid()
+            g.cell_status[60, 60] = 1
+            g.gene_content[0, 60, 60] = 1
+        grid.reset()
+        for _ in range(5):
+            ref.update_grid()
+            grid.update_grid()
+        np.testing.assert_array_equal(grid.cell_status, ref.cell_status)
+        np.testing.assert_array_equal(grid.gene_content, ref.gene_content)
+
+
+class TestChunkedEngine(unittest.TestCase):
+    """The unbounded world must match a bounded grid its growth never reaches."""
+    size = (60, 60)
+    margin = 40   # even: shifting columns by it keeps the hex parity
+    steps = 12
+
+    def grids(self, name, chunk_size=16):
+        from src.chunked import ChunkedCellGrid
+        rules, cells = conf_files(name)
+        genes_rules, alive_rules, G = cellStatus.read_rules_file(rules)
+        initial = cellStatus.parse_cell_conf(cells)
+        m = self.margin
+        shifted = [Cell(cell.x + m, cell.y + m, cell.active_genes) for cell in initial]
+        ref = get_engine("fused")(self.size[0] + 2 * m, self.size[1] + 2 * m, G,
+                                  genes_rules, alive_rules, initial_cells=shifted)
+        grid = ChunkedCellGrid(*self.size, G, genes_rules, alive_rules,
+                               initial_cells=initial, chunk_size=chunk_size)
+        return ref, grid
+
+    def assert_same_world(self, grid, ref):
+        m = self.margin
+        status, genes = grid.region(-m, -m, self.size[0] + m, self.size[1] + m)
+        np.testing.assert_array_equal(status, ref.cell_status)
+        np.testing.assert_array_equal(genes, ref.gene_content)
+        np.testing.assert_array_equal(grid.cell_status, ref.cell_status[m:-m, m:-m])
+        # The bounded reference never reached its border.
+        self.assertFalse(ref.cell_status[[0, -1]].any() or ref.cell_status[:, [0, -1]].any())
+
+    def test_matches_bounded_grid(self):
+        for name in CONFS:
+            ref, grid = self.grids(name)
+            for step in range(self.steps):
+                with self.subTest(conf=name, step=step):
+                    self.assert_same_world(grid, ref)
+                ref.update_grid()
+                grid.update_grid()
+
+    def test_grows_beyond_window(self):
+        ref, grid = self.grids("firework")
+        for _ in range(25):
+            grid.update_grid()
+        x0, y0, x1, y1 = grid.bounds()
+        self.assertGreater(x1, self.size[0])
+        self.assertGreater(y1, self.size[1])
+        status, _ = grid.region(x0, y0, x1, y1)
+        self.assertGreater(status.sum(), grid.cell_status.sum())
+        # Only chunks the colony reaches are stored.
+        self.assertLess(grid.n_chunks, (x1 - x0) * (y1 - y0) // grid.chunk_size ** 2)
+
+    def test_background(self):
+        # firework gives gene 1 to every isolated cell, the infinite world included.
+        ref, grid = self.grids("firework")
+        status, genes = grid.background
+        self.assertEqual(status, 0)
+        self.assertEqual(genes.tolist(), [0, 1, 0])
+        far = grid.region(1000, -1000, 1002, -998)
+        np.testing.assert_array_equal(far[1][1], 1)
+
+    def test_window_edits_and_freed_chunks(self):
+        ref, grid = self.grids("2CT")
+        grid.cell_status = np.zeros(self.size, dtype=np.int8)
+        grid.gene_content = np.zeros((grid.G,) + self.size, dtype=np.int8)
+        self.assertEqual(grid.n_chunks, 0)
+        self.assertIsNone(grid.bounds())
+
+        grid.cell_status[30, 30] = 1
+        grid.gene_content[0, 30, 30] = 1
+        grid.reset()
+        self.assertEqual(grid.n_chunks, 1)
+        for g in (ref,):
+            g.cell_status[:] = 0
+            g.gene_content[:] = 0
+            g.cell_status[30 + self.margin, 30 + self.margin] = 1
+            g.gene_content[0, 30 + self.margin, 30 + self.margin] = 1
+        for _ in range(5):
+            ref.update_grid()
+            grid.update_grid()
+        self.assert_same_world(grid, ref)
+
+    def test_cycles_see_the_whole_world(self):
+        # A small window away from the seed stays the same while the colony
+        # grows beyond it: only the window looks like a fixed point.
+        from src.chunked import ChunkedCellGrid
+        from src.cycles import CycleDetector
+        rules, cells = conf_files("firework")
+        genes_rules, alive_rules, G = cellStatus.read_rules_file(rules)
+        grid = ChunkedCellGrid(20, 20, G, genes_rules, alive_rules,
+                               initial_cells=cellStatus.parse_cell_conf(cells), chunk_size=16)
+        world, window = CycleDetector(max_period=4), CycleDetector(max_period=4)
+        world.observe_grid(grid)
+        window.observe(grid.cell_status, grid.gene_content)
+        alive = []
+        for _ in range(8):
+            grid.update_grid()
+            world.observe_grid(grid)
+            window.observe(grid.cell_status, grid.gene_content)
+            x0, y0, x1, y1 = grid.bounds()
+            alive.append(int(grid.region(x0, y0, x1, y1)[0].sum()))
+        self.assertEqual(window.cycle, (0, 1))
+        self.assertIsNone(world.cycle)
+        self.assertLess(alive[0], alive[-1])
+
+    def test_cycle_states(self):
+        # Births need gene 1, expressed within 3 of the seeds only: the
+        # colony, partly outside the window, stops growing at generation 7.
+        from src.chunked import ChunkedCellGrid
+        from src.cycles import CycleDetector
+        from src.parse_rules import parse_rule_line
+        grid = ChunkedCellGrid(20, 20, 2,
+                               parse_rule_line("[0]0", 0) + parse_rule_line("[0]3", 1),
+                               parse_rule_line("[1,n(2)]", -1),
+                               initial_cells=[Cell(1, 1, np.array([0])), Cell(1, 2, np.array([0]))],
+                               chunk_size=16)
+        detector = CycleDetector(max_period=4)
+        detector.observe_grid(grid)
+        states = [(grid.cell_status.copy(), grid.gene_content.copy())]
+        while detector.cycle is None and len(states) < 30:
+            grid.update_grid()
+            detector.observe_grid(grid)
+            states.append((grid.cell_status.copy(), grid.gene_content.copy()))
+        self.assertEqual(detector.cycle, (7, 1))
+        x0, y0, x1, y1 = grid.bounds()
+        self.assertGreater(grid.region(x0, y0, x1, y1)[0].sum(), grid.cell_status.sum())
+        for _ in range(3):
+            grid.update_grid()
+        for generation, (status, genes) in [(7, states[7]), (10, (grid.cell_status, grid.gene_content))]:
+            with self.subTest(generation=generation):
+                cycle_status, cycle_genes = detector.state_at(generation)
+                np.testing.assert_array_equal(cycle_status, status)
+                np.testing.assert_array_equal(cycle_genes, genes)
+
+
+class TestBitpack(unittest.TestCase):
+
+    def test_roundtrip(self):
+        rng = np.random.default_rng(0)
+        genes = (rng.random((130, 7, 5)) < 0.3).astype(np.int8)
+        words = bitpack.pack_genes(genes)
+        self.assertEqual(words.shape, (3, 7, 5))
+        np.testing.assert_array_equal(bitpack.unpack_genes(words, 130), genes)
+
+
+if __name__ == "__main__":
+    unittest.main()
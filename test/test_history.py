@@ -0,0 +1,65 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+from src.history import History
+
+ROOT = Path(__file__).resolve().parent.parent
+CONF = ROOT / "confs" / "2CT"
+
+
+def simulate(steps, X=60, Y=60):
+    grid = cellStatus.initialise_grid(CONF / "rules.txt", CONF / "initial_cell.txt", X, Y)
+    states = [(grid.cell_status.copy(), grid.gene_content.copy())]
+    for _ in range(steps):
+        grid.update_grid()
+        states.append((grid.cell_status.copy(), grid.gene_content.copy()))
+    return grid, states
+
+
+class TestHistory(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.grid, cls.states = simulate(100)
+
+    def fill(self, **kwargs):
+        history = History(self.grid, keyframe_interval=8, **kwargs)
+        for status, genes in self.states:
+            history.append([status, genes])
+        return history
+
+    def assert_states(self, history, generations):
+        for g in generations:
+            status, genes, neighbours = history[g]
+            np.testing.assert_array_equal(status, self.states[g][0])
+            np.testing.assert_array_equal(genes, self.states[g][1])
+
+    def test_everything_kept_within_budget(self):
+        history = self.fill()
+        self.assertEqual(len(history), len(self.states))
+        self.assert_states(history, range(len(self.states)))
+        self.assertIsNone(history._replica)
+
+    def test_evicted_generations_are_replayed(self):
+        history = self.fill(budget=1_500, window=4)
+        self.assertLessEqual(history.nbytes, 1_500)
+        self.assertLess(len(history._keys), len(self.states) // 8)
+        self.assertEqual(history._keys[0], 0)
+        # Backwards, as when scrubbing, then at random.
+        self.assert_states(history, range(len(self.states) - 1, -1, -1))
+        self.assert_states(history, np.random.default_rng(0).permutation(len(self.states)))
+        self.assertIsNotNone(history._replica)
+
+    def test_neighbours(self):
+        history = self.fill()
+        grid = cellStatus.initialise_grid(CONF / "rules.txt", CONF / "initial_cell.txt", 60, 60)
+        grid.cell_status = self.states[7][0]
+        np.testing.assert_array_equal(history[7][2], grid.get_neighbors())
+        self.assertIs(history[-1][0], history[len(self.states) - 1][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import unittest
+
+import numpy as np
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+
+from src.renderer import (HexRenderer, hex_center, palette_indices, pixel_to_cell,
+                          point_in_polygon, polygon_points)
+
+
+class TestRenderer(unittest.TestCase):
+
+    X, Y = 12, 17
+
+    def setUp(self):
+        self.cell_size = 300 / (3.5 * self.X) * 0.98
+        self.size = (int(300 * self.Y / self.X) + 1, 300)
+        self.renderer = HexRenderer(self.X, self.Y, self.cell_size, self.size)
+        self.rng = np.random.default_rng(0)
+
+    def pixel(self, surface, i, j):
+        x, y = hex_center(i, j, self.cell_size)
+        return tuple(surface.get_at((int(x), int(y))))[:3]
+
+    def random_colors(self):
+        return self.rng.integers(0, 256, (self.X, self.Y, 3)).astype(np.uint8)
+
+    def test_every_cell_is_visible(self):
+        colors = self.random_colors()
+        surface = self.renderer.render(colors)
+        for i in range(self.X):
+            for j in range(self.Y):
+                self.assertEqual(self.pixel(surface, i, j), tuple(colors[i, j]))
+
+    def test_dirty_cells_match_full_redraw(self):
+        colors = self.random_colors()
+        self.renderer.render(colors)
+        colors[3, 4] = (1, 2, 3)
+        colors[self.X - 1, :] = (9, 9, 9)
+        incremental = pygame.surfarray.array3d(self.renderer.render(colors))
+
+        full = HexRenderer(self.X, self.Y, self.cell_size, self.size)
+        np.testing.assert_array_equal(incremental, pygame.surfarray.array3d(full.render(colors)))
+
+    def test_palette_indices(self):
+        cell_status = self.rng.integers(0, 2, (self.X, self.Y)).astype(np.int8)
+        gene_content = self.rng.integers(0, 2, (70, self.X, self.Y)).astype(np.int8)
+        indices, vectors = palette_indices(cell_status, gene_content)
+        self.assertTrue((indices[cell_status == 0] == -1).all())
+        self.assertEqual(len(np.unique(vectors, axis=0)), len(vectors))
+        for i, j in zip(*np.nonzero(cell_status)):
+            np.testing.assert_array_equal(vectors[indices[i, j]], gene_content[:, i, j])
+
+
+class TestPicking(unittest.TestCase):
+
+    X, Y, cell_size = 6, 7, 5.3
+
+    def walk(self, point):
+        """Reference: the first hexagon, in drawing order, containing point."""
+        for i in range(self.X):
+            for j in range(self.Y):
+                center = hex_center(i, j, self.cell_size)
+                if point_in_polygon(point, polygon_points(center, self.cell_size)):
+                    return (i, j)
+        return None
+
+    def pick(self, point):
+        i, j = pixel_to_cell(point[0], point[1], self.cell_size)
+        if 0 <= i < self.X and 0 <= j < self.Y:
+            return (int(i), int(j))
+        return None
+
+    def edge_points(self, center):
+        corners = polygon_points(center, self.cell_size)
+        midpoints = [((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+                     for a, b in zip(corners, corners[1:] + corners[:1])]
+        return corners + midpoints
+
+    def test_centres_and_edges(self):
+        for i in range(self.X):
+            for j in range(self.Y):
+                center = hex_center(i, j, self.cell_size)
+                with self.subTest(cell=(i, j)):
+                    self.assertEqual(self.pick(center), (i, j))
+                    self.assertEqual(self.walk(center), (i, j))
+                    for x, y in self.edge_points(center):
+                        # Just inside the edge: unambiguous.
+                        inside = (x + 1e-6 * (center[0] - x), y + 1e-6 * (center[1] - y))
+                        self.assertEqual(self.pick(inside), self.walk(inside))
+                        # On the edge: shared by neighbours, the pick must be one of them.
+                        on_edge = self.pick((x, y))
+                        if on_edge is not None:
+                            other = hex_center(*on_edge, self.cell_size)
+                            distance = np.hypot(x - other[0], y - other[1])
+                            self.assertLessEqual(distance, 2 * self.cell_size + 1e-9)
+
+    def test_random_points(self):
+        rng = np.random.default_rng(0)
+        corner = hex_center(self.X, self.Y, self.cell_size)
+        for point in rng.uniform(0, 1, (500, 2)) * corner:
+            self.assertEqual(self.pick(point), self.walk(point))
+
+    def test_outside_the_grid(self):
+        self.assertIsNone(self.pick((0, 0)))
+        corner = hex_center(self.X - 1, self.Y - 1, self.cell_size)
+        self.assertIsNone(self.pick((corner[0] + 3 * self.cell_size, corner[1])))
+
+    def test_arrays(self):
+        i, j = np.meshgrid(np.arange(self.X), np.arange(self.Y), indexing="ij")
+        x, y = hex_center(i, j, self.cell_size)
+        picked_i, picked_j = pixel_to_cell(x, y, self.cell_size)
+        np.testing.assert_array_equal(picked_i, i)
+        np.testing.assert_array_equal(picked_j, j)
+
+
+if __name__ == "__main__":
+    unittest.main()
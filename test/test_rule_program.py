@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+import src.bitpack as bitpack
+from src.parse_rules import parse_rule_line
+from src.rule_program import compile_rules, NO_NEIGHBOOR
+
+
+class TestRuleProgram(unittest.TestCase):
+
+    def test_groups_share_target_and_radius(self):
+        rules = (parse_rule_line("[0,n(1)]2 || [0,n(2)]2 || [1]3", 0)
+                 + parse_rule_line("[0,n(1)]2", 1))
+        program = compile_rules(rules, 2)
+        self.assertEqual(len(program), 3)
+        targets = {(g.active_gene, g.propagation): len(g.conditions)
+                   for g in program.groups}
+        self.assertEqual(targets, {(0, 2): 2, (0, 3): 1, (1, 2): 1})
+        self.assertEqual(program.max_propagation, 3)
+        self.assertFalse(program.needs_isolated)
+
+    def test_match(self):
+        rules = parse_rule_line("[0,not(1),n(2)] || [1] || [0,not(0)]", 0)
+        program = compile_rules(rules, 2)
+        genes = np.array([[1, 1, 0, 1],
+                          [0, 1, 1, 0]], dtype=np.int8)
+        neighbours = np.array([2, 2, 0, 1])
+        potential = np.array([True, True, True, False])
+        ok = program.match(bitpack.pack_genes(genes), neighbours, potential)
+        np.testing.assert_array_equal(ok, [[True, False, False, False],
+                                           [False, True, True, False],
+                                           [False, False, False, False]])
+        self.assertEqual(program.n_neighboor[1], NO_NEIGHBOOR)
+
+
+if __name__ == "__main__":
+    unittest.main()
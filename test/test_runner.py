@@ -0,0 +1,44 @@
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import src.runner as runner
+
+ROOT = Path(__file__).resolve().parent.parent
+CONF = ROOT / "test" / "test_config"
+
+
+class TestRunner(unittest.TestCase):
+
+    def test_run_records_every_interval(self):
+        grid = runner.load_folder(CONF, 40, 40)
+        history = runner.Runner(grid, every=2).run(5)
+        self.assertEqual([row["generation"] for row in history], [0, 2, 4, 5])
+        self.assertEqual(len(history[0]["genes"]), grid.G)
+
+    def test_outputs_written(self):
+        grid = runner.load_folder(CONF, 40, 40)
+        with tempfile.TemporaryDirectory() as tmp:
+            r = runner.Runner(grid, out_dir=tmp, every=3)
+            r.run(3)
+            r.close()
+            lines = (Path(tmp) / "stats.csv").read_text().splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertTrue((Path(tmp) / "snapshots" / "gen_000003.npz").exists())
+
+    def test_missing_files(self):
+        with self.assertRaises(FileNotFoundError):
+            runner.load_folder(ROOT / "confs" / "boudin")
+
+    def test_headless_does_not_import_pygame(self):
+        code = ("import sys, src.runner as r;"
+                f"r.main([{str(CONF)!r}, '-x', '40', '-y', '40', '-n', '2']);"
+                "assert 'pygame' not in sys.modules")
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                       capture_output=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+from src.simulation import Simulation
+
+ROOT = Path(__file__).resolve().parent.parent
+CONF = ROOT / "confs" / "2CT"
+
+
+def make_grid():
+    return cellStatus.initialise_grid(CONF / "rules.txt", CONF / "initial_cell.txt", 60, 60,
+                                      engine="fused")
+
+
+def snapshot(grid):
+    return grid.cell_status.copy(), grid.gene_content.copy()
+
+
+class TestSimulation(unittest.TestCase):
+
+    def test_same_generations_as_stepping(self):
+        grid = make_grid()
+        simulation = Simulation(grid.update_grid, lambda: snapshot(grid), capacity=4).start()
+        reference = make_grid()
+        try:
+            for _ in range(12):
+                status, genes = simulation.get(timeout=30)
+                reference.update_grid()
+                np.testing.assert_array_equal(status, reference.cell_status)
+                np.testing.assert_array_equal(genes, reference.gene_content)
+        finally:
+            simulation.stop()
+
+    def test_runs_ahead_at_most_capacity(self):
+        steps = []
+        simulation = Simulation(lambda: steps.append(1), lambda: len(steps), capacity=5).start()
+        try:
+            deadline = time.monotonic() + 10
+            while simulation.ready() < 5 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.05)
+            self.assertEqual(simulation.ready(), 5)
+            self.assertEqual(len(steps), 5)
+            self.assertEqual(simulation.get(), 1)
+            self.assertEqual(simulation.get(timeout=10), 2)
+        finally:
+            simulation.stop()
+        self.assertLessEqual(len(steps), 7)
+
+    def test_get_does_not_wait_with_zero_timeout(self):
+        simulation = Simulation(lambda: time.sleep(0.5), lambda: None, capacity=1).start()
+        try:
+            start = time.monotonic()
+            self.assertIsNone(simulation.get(timeout=0))
+            self.assertLess(time.monotonic() - start, 0.25)
+        finally:
+            simulation.stop()
+
+    def test_errors_are_raised_after_the_generations_before_them(self):
+        steps = []
+
+        def step():
+            steps.append(1)
+            if len(steps) == 3:
+                raise ValueError("boom")
+
+        simulation = Simulation(step, lambda: len(steps)).start()
+        self.assertEqual([simulation.get(timeout=10) for _ in range(2)], [1, 2])
+        with self.assertRaises(ValueError):
+            simulation.get(timeout=10)
+        simulation.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
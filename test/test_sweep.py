@@ -0,0 +1,86 @@
+import csv
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import src.sweep as sweep
+
+ROOT = Path(__file__).resolve().parent.parent
+CONF = ROOT / "test" / "test_config"
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_expand(self):
+        specs = sweep.expand(["a", "b"], ["c"], [(10, 10), (20, 30)], 5)
+        self.assertEqual(len(specs), 4)
+        self.assertEqual(len({spec.run_id for spec in specs}), 4)
+        self.assertEqual(specs[0].run_id, sweep.expand(["a"], ["c"], [(10, 10)], 5)[0].run_id)
+
+    def test_run_one(self):
+        spec = sweep.folder_specs([CONF], [(40, 40)], 3)[0]
+        row = sweep.run_one(spec)
+        self.assertEqual(row["error"], "")
+        self.assertEqual(row, {**row, "run_id": spec.run_id, "X": 40})
+        self.assertEqual(len(row["state_hash"]), 40)
+
+    def test_errors_are_recorded(self):
+        spec = sweep.folder_specs([CONF], [(10, 10)], 3)[0]
+        self.assertIn("IndexError", sweep.run_one(spec)["error"])
+
+    def test_resume(self):
+        specs = sweep.folder_specs([CONF], [(40, 40), (50, 50)], 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "sweep.csv"
+            first = sweep.sweep(specs[:1], out, workers=1)
+            second = sweep.sweep(specs, out, workers=1)
+            self.assertEqual(len(first), 1)
+            self.assertEqual([row["run_id"] for row in second], [specs[1].run_id])
+            with open(out, newline="") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual({row["run_id"] for row in rows},
+                             {spec.run_id for spec in specs})
+
+    def test_rerun_edited_and_failed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            conf = Path(tmp) / "conf"
+            shutil.copytree(CONF, conf)
+            out = Path(tmp) / "sweep.csv"
+            specs = sweep.folder_specs([conf], [(40, 40), (10, 10)], 2)
+            self.assertEqual(len(sweep.sweep(specs, out, workers=1)), 2)
+            # The 10x10 run fails (its cells are outside) and is retried.
+            second = sweep.sweep(specs, out, workers=1)
+            self.assertEqual([row["X"] for row in second], [10])
+            self.assertTrue(second[0]["error"])
+
+            rules = conf / "rules.txt"
+            rules.write_text(rules.read_text() + "\n")
+            edited = sweep.folder_specs([conf], [(40, 40)], 2)
+            self.assertNotEqual(edited[0].run_id, specs[0].run_id)
+            self.assertEqual(len(sweep.sweep(edited, out, workers=1)), 1)
+
+    def test_older_tables(self):
+        specs = sweep.folder_specs([CONF], [(40, 40)], 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "sweep.csv"
+            old = [f for f in sweep.FIELDS if f not in ("transient", "period", "stepped")]
+            with open(out, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=old)
+                writer.writeheader()
+                writer.writerow({**dict.fromkeys(old, ""), "run_id": "0" * 16, "X": 7})
+            sweep.sweep(specs, out, workers=1)
+            with open(out, newline="") as f:
+                reader = csv.DictReader(f)
+                rows = list(reader)
+            self.assertEqual(reader.fieldnames, sweep.FIELDS)
+            self.assertEqual([row["X"] for row in rows], ["7", "40"])
+            self.assertEqual(rows[0]["period"], "")
+
+            out.write_text("name,value\na,1\n")
+            with self.assertRaises(ValueError):
+                sweep.sweep(specs, out, workers=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
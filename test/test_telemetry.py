@@ -0,0 +1,88 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+import src.telemetry as telemetry
+import src.utils as utils
+
+ROOT = Path(__file__).resolve().parent.parent
+CONF = ROOT / "confs" / "firework"
+
+
+def make_grid(engine="dense"):
+    return cellStatus.initialise_grid(CONF / "rules.txt", CONF / "initial_cell.txt", 100, 100,
+                                      engine=engine)
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def tearDown(self):
+        telemetry.stop()
+
+    def test_generation_events(self):
+        grid = make_grid()
+        events = []
+        with telemetry.recording(events.append):
+            for _ in range(3):
+                before = int(np.count_nonzero(grid.cell_status))
+                grid.update_grid()
+                event = events[-1]
+                self.assertEqual(event["births"], event["alive"] - before)
+        self.assertEqual([event["generation"] for event in events], [1, 2, 3])
+
+        event = events[-1]
+        self.assertEqual(event["engine"], "CellGrid")
+        self.assertEqual(event["alive"], np.count_nonzero(grid.cell_status))
+        for name in ("create_alive_cell", "create_alive_cell.neighbours", "create_alive_cell.match",
+                     "propagate_genes", "propagate_genes.distance", "propagate_genes.express"):
+            self.assertIn(name, event["phases"])
+        self.assertLessEqual(event["phases"]["propagate_genes.express"],
+                             event["phases"]["propagate_genes"])
+        self.assertTrue(event["rules"])
+        self.assertEqual(set(event["rules"][0]),
+                         {"gene", "radius", "sources", "distance_seconds", "express_seconds"})
+        convolution = event["convolutions"][0]
+        self.assertEqual(convolution["reason"], "cost model")
+        self.assertEqual(convolution["method"], min(convolution["costs"], key=convolution["costs"].get))
+        json.dumps(events)
+
+    def test_other_engines(self):
+        grid = make_grid("fused")
+        events = []
+        with telemetry.recording(events.append):
+            grid.update_grid()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["engine"], "FusedCellGrid")
+        self.assertEqual(events[0]["alive"], np.count_nonzero(grid.cell_status))
+
+    def test_convolutions_outside_generations(self):
+        matrix = np.zeros((20, 20), dtype=np.int8)
+        matrix[5, 5] = 1
+        events = []
+        with telemetry.recording(events.append):
+            utils.adaptive_convolution(matrix, 2, 20, 20, threshold=0.5)
+            utils.adaptive_convolution(matrix, 2, 20, 20, method="fft")
+        self.assertEqual([(e["event"], e["method"], e["reason"]) for e in events],
+                         [("convolution", "sparse", "threshold"), ("convolution", "fft", "forced")])
+        self.assertEqual(events[0]["active"], 1)
+
+    def test_jsonl_and_disabled(self):
+        grid = make_grid()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "steps.jsonl"
+            with telemetry.recording(path, allocations=True):
+                grid.update_grid()
+                grid.update_grid()
+            grid.update_grid()
+            lines = path.read_text().splitlines()
+        self.assertIsNone(telemetry.recorder)
+        self.assertEqual(len(lines), 2)
+        self.assertGreater(json.loads(lines[0])["peak_bytes"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
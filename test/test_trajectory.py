@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import src.cellStatus as cellStatus
+from src.trajectory import TrajectoryWriter, TrajectoryReader, TrajectoryHistory
+
+ROOT = Path(__file__).resolve().parent.parent
+CONF = ROOT / "confs" / "2CT"
+
+
+def simulate(steps, X=60, Y=60):
+    grid = cellStatus.initialise_grid(CONF / "rules.txt", CONF / "initial_cell.txt", X, Y)
+    states = [(grid.cell_status.copy(), grid.gene_content.copy())]
+    for _ in range(steps):
+        grid.update_grid()
+        states.append((grid.cell_status.copy(), grid.gene_content.copy()))
+    return grid, states
+
+
+class TestTrajectory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "run.traj"
+        self.grid, self.states = simulate(20)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, close=True):
+        writer = TrajectoryWriter(self.path, self.grid.X, self.grid.Y, self.grid.G,
+                                  keyframe_interval=8)
+        for status, genes in self.states:
+            writer.append(status, genes)
+        if close:
+            writer.close()
+        return writer
+
+    def assertSameStates(self, trajectory):
+        self.assertEqual(len(trajectory), len(self.states))
+        for generation in (13, 0, 20, 7, 8, -1):
+            status, genes = trajectory[generation]
+            np.testing.assert_array_equal(status, self.states[generation][0])
+            np.testing.assert_array_equal(genes, self.states[generation][1])
+
+    def test_roundtrip(self):
+        self.write()
+        with TrajectoryReader(self.path) as reader:
+            self.assertSameStates(reader)
+
+    def test_read_while_writing(self):
+        writer = self.write(close=False)
+        self.assertSameStates(writer)
+        writer.close()
+
+    def test_unclosed_file(self):
+        writer = self.write(close=False)
+        writer._file.flush()
+        with TrajectoryReader(self.path) as reader:
+            self.assertSameStates(reader)
+        writer.close()
+
+    def test_smaller_than_raw(self):
+        self.write()
+        raw = sum(s.nbytes + g.nbytes for s, g in self.states)
+        self.assertLess(self.path.stat().st_size, raw / 8)
+
+    def test_history(self):
+        history = TrajectoryHistory(self.path, self.grid.X, self.grid.Y, self.grid.G)
+        for status, genes in self.states:
+            history.append([status, genes, None])
+        status, genes, neighbours = history[5]
+        np.testing.assert_array_equal(genes, self.states[5][1])
+        self.assertEqual(neighbours.shape, status.shape)
+        history.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
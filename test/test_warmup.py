@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import src.utils as utils
+import src.warmup as warmup
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class TestWarmUp(unittest.TestCase):
+
+    def test_warm_up_engines(self):
+        seconds = warmup.warm_up_all(["dense", "fused"])
+        self.assertEqual(list(seconds), ["convolutions", "dense", "fused"])
+
+    @unittest.skipUnless(utils.CACHE_KERNELS, "kernel cache disabled")
+    def test_kernels_are_cached(self):
+        if utils.KERNEL_CACHE_DIR is not None:
+            cache = Path(utils._sparse_kernel._cache.cache_path)
+            self.assertTrue(cache.is_relative_to(utils.KERNEL_CACHE_DIR))
+            # Other numba code of the process keeps its own setting.
+            self.assertEqual(utils.numba_config.CACHE_DIR, "")
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, "NUMBA_CACHE_DIR": tmp}
+            subprocess.run([sys.executable, "-m", "src.warmup", "--engine", "packed"],
+                           cwd=ROOT, env=env, capture_output=True, check=True)
+            self.assertTrue(any(Path(tmp).rglob("*.nbi")))
+
+    def test_prune_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            names = ["current", "old1", "old2", "old3", "old4", "old5"]
+            for age, name in enumerate(names):
+                path = Path(tmp) / name
+                (path / "src").mkdir(parents=True)
+                os.utime(path, (1000 - age, 1000 - age))
+            os.utime(Path(tmp) / "current", (0, 0))
+            utils.prune_kernel_caches(Path(tmp) / "current", versions=3)
+            self.assertEqual(sorted(path.name for path in Path(tmp).iterdir()),
+                             ["current", "old1", "old2"])
+
+    def test_lazy_scipy(self):
+        # numba imports the scipy package itself, which is cheap.
+        code = ("import sys, src.cellStatus, src.calibration; "
+                "print('scipy.signal' in sys.modules or 'scipy.optimize' in sys.modules)")
+        child = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+        self.assertEqual(child.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()